@@ -0,0 +1,60 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from cassandra import ConsistencyLevel
+from cassandra.encoder import Encoder
+
+from cqlmapper import ConnectionInterface
+
+
+class FakeCluster(object):
+    protocol_version = 4
+
+
+class FakeSession(object):
+    """
+    In-process stand-in for a driver ``Session``: SELECT statements return
+    the canned rows registered for their table, other statements return no
+    rows.
+
+    :param rows: the rows returned per table name, as lists of dicts
+    :type rows: dict
+    """
+
+    keyspace = 'benchmarks'
+    default_consistency_level = ConsistencyLevel.LOCAL_ONE
+
+    def __init__(self, rows=None):
+        self.cluster = FakeCluster()
+        self.encoder = Encoder()
+        self.rows = rows or {}
+        self.executed = 0
+
+    def execute(self, statement, params=None, timeout=None, trace=False):
+        self.executed += 1
+        query_string = statement.query_string
+        if not query_string.startswith('SELECT'):
+            return []
+        for table, rows in self.rows.items():
+            if table in query_string:
+                # rows are mutated while constructing instances
+                return [dict(row) for row in rows]
+        return []
+
+
+class NullConnection(ConnectionInterface):
+    """Connection discarding every query, for batches."""
+
+    def execute(self, query, *args, **kwargs):
+        return []
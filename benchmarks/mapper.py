@@ -0,0 +1,253 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Benchmarks of the core paths of the mapper.
+
+Each benchmark is a function registered with :func:`benchmark`, which sets
+up its data and returns the operation to time, called without arguments.
+"""
+
+from collections import OrderedDict
+from datetime import datetime
+from uuid import UUID
+
+from cqlmapper import columns
+from cqlmapper.batch import Batch
+from cqlmapper.connection import Connection
+from cqlmapper.models import Model
+from cqlmapper.operators import EqualsOperator
+from cqlmapper.statements import (
+    ListUpdateClause,
+    MapUpdateClause,
+    SetUpdateClause,
+    UpdateStatement,
+)
+
+from benchmarks.fake import FakeSession, NullConnection
+
+BENCHMARKS = OrderedDict()
+
+
+def benchmark(fn):
+    BENCHMARKS[fn.__name__] = fn
+    return fn
+
+
+class Narrow(Model):
+    __table_name__ = 'narrow'
+    id = columns.Integer(primary_key=True)
+    name = columns.Text()
+
+
+class Wide(Model):
+    __table_name__ = 'wide'
+    owner = columns.UUID(partition_key=True)
+    created = columns.DateTime(primary_key=True, clustering_order='DESC')
+    seq = columns.Integer(primary_key=True)
+    title = columns.Text()
+    body = columns.Text()
+    score = columns.Double()
+    views = columns.BigInt()
+    active = columns.Boolean()
+    tags = columns.Set(columns.Text)
+    history = columns.List(columns.Integer)
+    attrs = columns.Map(columns.Text, columns.Text)
+    c01 = columns.Integer()
+    c02 = columns.Integer()
+    c03 = columns.Integer()
+    c04 = columns.Integer()
+    c05 = columns.Integer()
+    c06 = columns.Text()
+    c07 = columns.Text()
+    c08 = columns.Text()
+    c09 = columns.Text()
+    c10 = columns.Text()
+
+
+OWNER = UUID(int=42)
+CREATED = datetime(2016, 1, 1)
+
+NARROW_ROW = {'id': 1, 'name': 'narrow'}
+WIDE_ROW = dict(
+    owner=OWNER,
+    created=CREATED,
+    seq=1,
+    title='title',
+    body='body ' * 20,
+    score=1.5,
+    views=1000,
+    active=True,
+    tags=set(['a', 'b', 'c']),
+    history=list(range(10)),
+    attrs=dict(('k%d' % i, 'v%d' % i) for i in range(5)),
+    c01=1, c02=2, c03=3, c04=4, c05=5,
+    c06='6', c07='7', c08='8', c09='9', c10='10',
+)
+
+
+def _wide_queryset():
+    return Wide.objects.filter(
+        owner=OWNER,
+        created__gte=CREATED,
+    ).filter(seq__in=[1, 2, 3]).limit(100)
+
+
+@benchmark
+def queryset_chaining():
+    def op():
+        Wide.objects.filter(owner=OWNER).filter(
+            created__gte=CREATED,
+        ).order_by('-created').limit(10).only(['title', 'score'])
+    return op
+
+
+@benchmark
+def filter_parsing():
+    queryset = Wide.objects.all()
+
+    def op():
+        queryset.filter(
+            owner=OWNER,
+            created__gte=CREATED,
+            created__lt=CREATED,
+            seq__in=[1, 2, 3],
+        )
+    return op
+
+
+@benchmark
+def select_statement_build():
+    queryset = _wide_queryset()
+    return queryset._select_query
+
+
+@benchmark
+def select_statement_render():
+    statement = _wide_queryset()._select_query()
+    return statement.__unicode__
+
+
+@benchmark
+def select_get_context():
+    statement = _wide_queryset()._select_query()
+    return statement.get_context
+
+
+def _update_statement():
+    statement = UpdateStatement(Wide.column_family_name())
+    for name in ('title', 'body', 'score', 'views', 'c01', 'c06'):
+        statement.add_update(Wide._columns[name], WIDE_ROW[name])
+    statement.add_where(Wide._columns['owner'], EqualsOperator(), OWNER)
+    statement.add_where(Wide._columns['created'], EqualsOperator(), CREATED)
+    statement.add_where(Wide._columns['seq'], EqualsOperator(), 1)
+    return statement
+
+
+@benchmark
+def update_statement_render():
+    statement = _update_statement()
+    return statement.__unicode__
+
+
+@benchmark
+def update_get_context():
+    statement = _update_statement()
+    return statement.get_context
+
+
+@benchmark
+def hydrate_narrow():
+    construct = Narrow._construct_instance
+
+    def op():
+        construct(dict(NARROW_ROW))
+    return op
+
+
+@benchmark
+def hydrate_wide():
+    construct = Wide._construct_instance
+
+    def op():
+        construct(dict(WIDE_ROW))
+    return op
+
+
+def _diff(clause_class, value, previous):
+    def op():
+        clause = clause_class('field', value, previous=previous)
+        clause.set_context_id(0)
+        clause.update_context({})
+        clause.__unicode__()
+    return op
+
+
+@benchmark
+def list_diff_append():
+    previous = list(range(100))
+    return _diff(ListUpdateClause, previous + [100, 101], previous)
+
+
+@benchmark
+def list_diff_index_updates():
+    previous = list(range(100))
+    value = list(previous)
+    value[10] = -1
+    value[50] = -1
+    return _diff(ListUpdateClause, value, previous)
+
+
+@benchmark
+def set_diff():
+    previous = set(range(100))
+    return _diff(SetUpdateClause, (previous - set([1, 2])) | set([-1]),
+                 previous)
+
+
+@benchmark
+def map_diff():
+    previous = dict((i, str(i)) for i in range(100))
+    value = dict(previous)
+    value[1] = 'changed'
+    value[-1] = 'added'
+    del value[2]
+    return _diff(MapUpdateClause, value, previous)
+
+
+@benchmark
+def batch_prepare():
+    batch = Batch(NullConnection())
+    for _ in range(20):
+        batch.execute(_update_statement())
+
+    return batch._prepare
+
+
+@benchmark
+def model_save_roundtrip():
+    conn = Connection(FakeSession())
+
+    def op():
+        Narrow(id=1, name='narrow').save(conn)
+    return op
+
+
+@benchmark
+def queryset_roundtrip_wide():
+    conn = Connection(FakeSession({'wide': [WIDE_ROW] * 10}))
+
+    def op():
+        list(_wide_queryset().iter(conn))
+    return op
@@ -0,0 +1,157 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Runs the mapper benchmarks against an in-process fake session.
+
+.. code-block:: bash
+
+    python -m benchmarks.run
+    python -m benchmarks.run --filter hydrate --save baseline.json
+    python -m benchmarks.run --compare baseline.json --max-regression 0.1
+
+Every benchmark reports its throughput (best of ``--repeat`` runs of at
+least ``--min-time`` seconds) and the peak memory it allocates per
+operation, measured with :mod:`tracemalloc` when it is available.
+"""
+
+from __future__ import print_function
+
+import argparse
+import gc
+import json
+import sys
+from timeit import default_timer
+
+try:
+    import tracemalloc
+except ImportError:  # Python 2
+    tracemalloc = None
+
+from benchmarks.mapper import BENCHMARKS
+
+ALLOCATION_SAMPLES = 20
+
+
+def _time(op, min_time):
+    """Returns the number of operations per second."""
+    loops = 1
+    while True:
+        start = default_timer()
+        for _ in range(loops):
+            op()
+        elapsed = default_timer() - start
+        if elapsed >= min_time:
+            return loops / elapsed
+        if elapsed < min_time / 10:
+            loops *= 10
+        else:
+            loops = int(loops * min_time * 1.1 / elapsed) + 1
+
+
+def _allocated(op):
+    """Returns the peak number of bytes allocated by an operation."""
+    if tracemalloc is None or not hasattr(tracemalloc, 'reset_peak'):
+        return None
+    op()
+    tracemalloc.start()
+    try:
+        peaks = []
+        for _ in range(ALLOCATION_SAMPLES):
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            op()
+            peaks.append(tracemalloc.get_traced_memory()[1] - current)
+    finally:
+        tracemalloc.stop()
+    return sorted(peaks)[len(peaks) // 2]
+
+
+def run_benchmark(name, min_time=0.2, repeat=3, allocations=True):
+    """Runs a benchmark, returns its ops/s and allocated bytes per op."""
+    op = BENCHMARKS[name]()
+    gc.collect()
+    ops = max(_time(op, min_time) for _ in range(repeat))
+    result = {'ops': ops}
+    if allocations:
+        result['bytes'] = _allocated(op)
+    return result
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--filter', default='',
+                        help='only run the benchmarks containing this text')
+    parser.add_argument('--min-time', type=float, default=0.2,
+                        help='minimum duration of a run, in seconds')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='number of runs, the best is kept')
+    parser.add_argument('--no-allocations', action='store_true',
+                        help="don't measure allocations")
+    parser.add_argument('--save', help='save the results to a JSON file')
+    parser.add_argument('--compare',
+                        help='compare with results saved to a JSON file')
+    parser.add_argument('--max-regression', type=float, default=None,
+                        help='fail if a benchmark is slower than the '
+                             'compared results by more than this fraction')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    baseline = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    results = {}
+    regressions = []
+    print('{0:<28} {1:>14} {2:>12} {3:>12} {4:>9}'.format(
+        'benchmark', 'ops/s', 'us/op', 'bytes/op', 'change'))
+    for name in BENCHMARKS:
+        if args.filter not in name:
+            continue
+        result = results[name] = run_benchmark(
+            name,
+            min_time=args.min_time,
+            repeat=args.repeat,
+            allocations=not args.no_allocations,
+        )
+        change = ''
+        if name in baseline:
+            ratio = result['ops'] / baseline[name]['ops'] - 1
+            change = '{0:+.1%}'.format(ratio)
+            if (args.max_regression is not None and
+                    -ratio > args.max_regression):
+                regressions.append(name)
+        allocated = result.get('bytes')
+        print('{0:<28} {1:>14,.0f} {2:>12.2f} {3:>12} {4:>9}'.format(
+            name,
+            result['ops'],
+            1e6 / result['ops'],
+            '-' if allocated is None else '{0:,}'.format(allocated),
+            change,
+        ))
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    if regressions:
+        print('Regressions: ' + ', '.join(regressions), file=sys.stderr)
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -59,3 +59,6 @@ class UnicodeMixin(object):
         __str__ = lambda x: x.__unicode__()
     else:
         __str__ = lambda x: six.text_type(x).encode('utf-8')
+
+
+from cqlmapper.profiler import profile  # noqa
@@ -1,4 +1,5 @@
 
+from concurrent.futures import Future, ThreadPoolExecutor
 import time
 from datetime import datetime, timedelta
 
@@ -56,6 +57,7 @@ class Batch(ConnectionInterface):
         self._executed = False
         self._context_entered = False
         self.queries = []
+        self._models = []
         self.batch_type = batch_type
         if timestamp is not None and not isinstance(timestamp, (datetime, timedelta)):
             raise CQLEngineException(
@@ -73,9 +75,9 @@ class Batch(ConnectionInterface):
     def execute(self, query, *a, **kw):
         if isinstance(query, DMLQuery):
             if query.statement:
-                self._add_query(query.statement)
+                self._add_query(query.statement, query.model)
             if query.cleanup_statement:
-                self._add_query(query.cleanup_statement)
+                self._add_query(query.cleanup_statement, query.model)
         elif isinstance(query, BaseCQLStatement):
             batch_statement_types = (
                 InsertStatement,
@@ -87,14 +89,15 @@ class Batch(ConnectionInterface):
                     "Only inserts, updates, and deletes are available in "
                     "batch mode"
                 )
-            return self._add_query(query)
+            return self._add_query(query, kw.get('model'))
 
-    def _add_query(self, query):
+    def _add_query(self, query, model=None):
         if not isinstance(query, BaseCQLStatement):
             raise CQLEngineException(
                 'only BaseCQLStatements can be added to a batch query'
             )
         self.queries.append(query)
+        self._models.append(model)
 
     def add_callback(self, fn, *args, **kwargs):
         """Add a function and arguments to be passed to it to be executed
@@ -119,23 +122,25 @@ class Batch(ConnectionInterface):
             )
         self._callbacks.append((fn, args, kwargs))
 
+    def _timestamp_normalized(self):
+        """Returns the timestamp of the batch in microseconds, or None."""
+        if not self.timestamp:
+            return None
+        if isinstance(self.timestamp, six.integer_types):
+            return self.timestamp
+        elif isinstance(self.timestamp, (datetime, timedelta)):
+            ts = self.timestamp
+            if isinstance(self.timestamp, timedelta):
+                ts += datetime.now()  # Apply timedelta
+            return int(time.mktime(ts.timetuple()) * 1e+6 + ts.microsecond)
+        raise ValueError("Batch expects a long, a timedelta, or a datetime")
+
     def _prepare(self):
         opener = 'BEGIN ' + (
             self.batch_type + ' ' if self.batch_type else ''
         ) + ' BATCH'
-        if self.timestamp:
-            if isinstance(self.timestamp, six.integer_types):
-                ts = self.timestamp
-            elif isinstance(self.timestamp, (datetime, timedelta)):
-                ts = self.timestamp
-                if isinstance(self.timestamp, timedelta):
-                    ts += datetime.now()  # Apply timedelta
-                ts = int(time.mktime(ts.timetuple()) * 1e+6 + ts.microsecond)
-            else:
-                raise ValueError(
-                    "Batch expects a long, a timedelta, or a datetime"
-                )
-
+        ts = self._timestamp_normalized()
+        if ts:
             opener += ' USING TIMESTAMP {0}'.format(ts)
 
         query_list = [opener]
@@ -174,16 +179,32 @@ class Batch(ConnectionInterface):
                 self._cleanup()
             return
 
+        execute_batch_statements = getattr(
+            self.conn,
+            'execute_batch_statements',
+            None,
+        )
+        if execute_batch_statements is not None:
+            # connections applying the statements themselves, like
+            # cqlmapper.memory.MemoryConnection
+            execute_batch_statements(self)
+            return
+
         batch_args = self._prepare()
         if batch_args:
             statement, params, consistency, timeout = batch_args
+            models = set(self._models)
             res = self.conn.execute(
                 statement,
                 params=params,
                 consistency_level=consistency,
                 timeout=timeout,
                 verify_applied=True,
+                model=models.pop() if len(models) == 1 else None,
             )
+            tombstone_stats = getattr(self.conn, 'tombstone_stats', None)
+            if tombstone_stats is not None:
+                tombstone_stats.record(self.queries, self._models)
 
     def _execute_callbacks(self):
         for callback, args, kwargs in self._callbacks:
@@ -191,6 +212,7 @@ class Batch(ConnectionInterface):
 
     def _cleanup(self):
         self.queries = []
+        self._models = []
         self._context_entered = False
         self._execute_callbacks()
 
@@ -205,3 +227,51 @@ class Batch(ConnectionInterface):
         self.execute_batch()
         self._cleanup()
 
+
+def _run_batch(batch):
+    batch.execute_batch()
+    batch._execute_callbacks()
+
+
+def execute_batches(batches, concurrency=4, on_error=None):
+    """Executes batches concurrently, along with their callbacks.
+
+    Every batch is executed even if some of them fail. Unless ``on_error``
+    is given, the first error encountered is raised once all of them have
+    completed.
+
+    :param batches: the :class:`Batch` objects to execute
+    :type batches: list
+    :param concurrency: maximum number of batches in flight
+    :type concurrency: int
+    :param on_error: (optional) called with the failed batch and the
+        exception for every batch that could not be executed, errors are
+        not raised when it is given
+    :type on_error: callable
+    """
+    batches = [b for b in batches if b.queries]
+    if concurrency <= 1 or len(batches) <= 1:
+        futures = []
+        for batch in batches:
+            future = Future()
+            try:
+                future.set_result(_run_batch(batch))
+            except Exception as e:
+                future.set_exception(e)
+            futures.append(future)
+    else:
+        workers = min(concurrency, len(batches))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            futures = [executor.submit(_run_batch, b) for b in batches]
+
+    first_error = None
+    for batch, future in zip(batches, futures):
+        error = future.exception()
+        if error is None:
+            continue
+        if on_error is not None:
+            on_error(batch, error)
+        elif first_error is None:
+            first_error = future
+    if first_error is not None:
+        first_error.result()
@@ -0,0 +1,538 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import atexit
+from collections import OrderedDict
+import logging
+import threading
+import time
+
+from cqlmapper import CQLEngineException, ConnectionInterface, columns
+from cqlmapper.batch import Batch, execute_batches
+from cqlmapper.operators import EqualsOperator
+from cqlmapper.query import BatchType, DMLQuery
+from cqlmapper.statements import (
+    AssignmentClause,
+    AssignmentStatement,
+    CounterUpdateClause,
+    DeleteStatement,
+    InsertStatement,
+    UpdateStatement,
+)
+
+log = logging.getLogger(__name__)
+
+
+class BufferException(CQLEngineException):
+    pass
+
+
+class BufferFull(BufferException):
+    pass
+
+
+class BufferClosed(BufferException):
+    pass
+
+
+class _TimestampGenerator(object):
+    """Returns strictly increasing timestamps in microseconds."""
+
+    def __init__(self, timer=time.time):
+        self.timer = timer
+        self._last = 0
+        self._lock = threading.Lock()
+
+    def __call__(self):
+        with self._lock:
+            self._last = max(self._last + 1, int(self.timer() * 1e6))
+            return self._last
+
+
+def _log_error(exc, statements):
+    log.error(
+        "Failed to write %d buffered statement(s): %s",
+        len(statements),
+        exc,
+    )
+
+
+class _Flusher(object):
+    """
+    Base class of the buffers, runs ``_flush`` from a daemon thread every
+    ``flush_interval`` seconds, when ``_should_flush`` returns True, and
+    once more when the buffer is closed.
+
+    Subclasses hold their pending writes under ``self._cond``.
+    """
+
+    def __init__(self, flush_interval):
+        if flush_interval is not None and flush_interval <= 0:
+            raise ValueError("flush_interval must be greater than 0")
+        self.flush_interval = flush_interval
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run,
+            name='{0}-flusher'.format(self.__class__.__name__),
+        )
+        self._thread.daemon = True
+        self._thread.start()
+        atexit.register(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def closed(self):
+        return self._closed
+
+    def _should_flush(self):
+        return False
+
+    def _run(self):
+        while True:
+            with self._cond:
+                deadline = (
+                    time.time() + self.flush_interval
+                    if self.flush_interval is not None else None
+                )
+                while not self._closed and not self._should_flush():
+                    timeout = (
+                        deadline - time.time()
+                        if deadline is not None else None
+                    )
+                    if timeout is not None and timeout <= 0:
+                        break
+                    self._cond.wait(timeout)
+                closed = self._closed
+            try:
+                self._flush()
+            except Exception:
+                log.exception("Error while flushing %r", self)
+            if closed:
+                return
+
+    def _flush(self):
+        raise NotImplementedError
+
+    def flush(self):
+        """Writes every pending change from the calling thread."""
+        self._flush()
+
+    def close(self):
+        """Stops the flusher thread once every pending change is written.
+
+        Closing is idempotent, writing to a closed buffer raises
+        :class:`BufferClosed`.
+        """
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+        if self._thread is not threading.current_thread():
+            self._thread.join()
+
+    def _check_open(self):
+        if self._closed:
+            raise BufferClosed(
+                "Cannot write to a closed {0}".format(self.__class__.__name__)
+            )
+
+
+class WriteBehindBuffer(_Flusher, ConnectionInterface):
+    """
+    Queues model writes in memory and sends them to Cassandra from a
+    background thread.
+
+    Use the buffer in place of a connection for models whose writes can be
+    eventually durable, such as metrics or activity logs. Saves, updates
+    and deletes then return as soon as their statements are queued:
+
+    .. code-block:: python
+
+        buffer = WriteBehindBuffer(conn, flush_size=500, flush_interval=1)
+        PageView(page=page, user=user).save(buffer)
+        ...
+        buffer.close()
+
+    Every queued statement is given an explicit write timestamp, so the
+    latest write to a column wins regardless of how the statements are
+    batched. Writes to a primary key which are fully overwritten by a later
+    write are dropped before being sent. Pending statements are grouped by
+    partition into unlogged batches.
+
+    A flush happens when ``flush_size`` statements are pending, every
+    ``flush_interval`` seconds, and when the buffer is closed (explicitly,
+    when leaving a ``with`` block, or at interpreter exit). Writes block
+    while ``max_pending`` statements are queued or being written.
+
+    Lightweight transactions and counter updates are not supported, as
+    neither can be retried or reordered safely.
+
+    :param conn: cqlmapper.connection.Connection object used to execute
+        the batches.
+    :param flush_size: number of pending statements triggering a flush
+    :type flush_size: int
+    :param flush_interval: (optional) maximum number of seconds a statement
+        stays in the buffer
+    :type flush_interval: float or None
+    :param max_pending: (optional) maximum number of statements queued or
+        being written, writes block once it is reached
+    :type max_pending: int or None
+    :param put_timeout: (optional) number of seconds a write waits for room
+        in the buffer before raising :class:`BufferFull`
+    :type put_timeout: float or None
+    :param max_batch_size: maximum number of statements sent in one batch
+    :type max_batch_size: int
+    :param concurrency: maximum number of batches sent concurrently
+    :type concurrency: int
+    :param on_error: (optional) called with the exception and the list of
+        statements that could not be written, errors are logged by default
+    :type on_error: callable
+    """
+
+    def __init__(self, conn, flush_size=100, flush_interval=1.0,
+                 max_pending=None, put_timeout=None, max_batch_size=100,
+                 concurrency=4, on_error=None):
+        if flush_size < 1:
+            raise ValueError("flush_size must be greater than 0")
+        if max_pending is not None and max_pending < flush_size:
+            raise ValueError("max_pending must not be lower than flush_size")
+        self.conn = conn
+        self.flush_size = flush_size
+        self.max_pending = max_pending
+        self.put_timeout = put_timeout
+        self.max_batch_size = max_batch_size
+        self.concurrency = concurrency
+        self.on_error = on_error or _log_error
+        self.timestamp = _TimestampGenerator()
+        self.coalesced = 0
+        self._pending = OrderedDict()
+        self._pending_count = 0
+        self._in_flight = 0
+        self._callbacks = []
+        super(WriteBehindBuffer, self).__init__(flush_interval)
+
+    def __len__(self):
+        return self._pending_count
+
+    def _should_flush(self):
+        return self._pending_count >= self.flush_size
+
+    def execute(self, query, *args, **kwargs):
+        if not isinstance(query, DMLQuery):
+            raise BufferException(
+                "Only model saves, updates and deletes can be buffered"
+            )
+        if query.check_applied:
+            raise BufferException(
+                "Lightweight transactions cannot be buffered"
+            )
+        if query.model._has_counter:
+            raise BufferException(
+                "Counter updates cannot be buffered by a WriteBehindBuffer"
+            )
+        statements = [
+            s for s in (query.statement, query.cleanup_statement)
+            if s is not None
+        ]
+        if not statements:
+            return
+        partition = (query.column_family_name,) + tuple(
+            col.to_database(getattr(query.instance, name))
+            for name, col in query.model._partition_keys.items()
+        )
+        row = tuple(
+            col.to_database(getattr(query.instance, name))
+            for name, col in query.model._primary_keys.items()
+        )
+        timestamp = self.timestamp()
+        for statement in statements:
+            if not statement.timestamp:
+                statement.timestamp = timestamp
+
+        with self._cond:
+            self._check_open()
+            self._wait_for_room(len(statements))
+            entries = self._pending.setdefault(partition, [])
+            for statement in statements:
+                self._add(entries, row, statement)
+            if self._should_flush():
+                self._cond.notify_all()
+
+    def add_callback(self, fn, *args, **kwargs):
+        """Adds a function to be called once the statements currently
+        pending have been written, whether they succeeded or not.
+        """
+        with self._cond:
+            self._callbacks.append((fn, args, kwargs))
+
+    def _wait_for_room(self, count):
+        if self.max_pending is None:
+            return
+        deadline = (
+            time.time() + self.put_timeout
+            if self.put_timeout is not None else None
+        )
+        while self._pending_count + self._in_flight + count > self.max_pending:
+            self._cond.notify_all()
+            timeout = deadline - time.time() if deadline is not None else None
+            if timeout is not None and timeout <= 0:
+                raise BufferFull(
+                    "{0} statements are already pending".format(
+                        self._pending_count + self._in_flight
+                    )
+                )
+            self._cond.wait(timeout)
+            self._check_open()
+
+    @staticmethod
+    def _overwrites(earlier, later):
+        """Returns True if ``later`` makes ``earlier`` redundant, both
+        statements targeting the same row and ``later`` being more recent.
+        """
+        if isinstance(later, DeleteStatement) and not later.fields:
+            return True
+        if not isinstance(earlier, AssignmentStatement):
+            return False
+        if not isinstance(later, AssignmentStatement):
+            return False
+        if isinstance(earlier, InsertStatement) and \
+                not isinstance(later, InsertStatement):
+            # an insert also writes the row marker
+            return False
+        if not all(type(c) is AssignmentClause for c in earlier.assignments):
+            return False
+        written = set(c.field for c in later.assignments)
+        return all(c.field in written for c in earlier.assignments)
+
+    def _add(self, entries, row, statement):
+        kept = []
+        for entry in entries:
+            if entry[0] == row and self._overwrites(entry[1], statement):
+                self.coalesced += 1
+                self._pending_count -= 1
+            else:
+                kept.append(entry)
+        kept.append((row, statement))
+        entries[:] = kept
+        self._pending_count += 1
+
+    def _flush(self):
+        with self._cond:
+            pending, self._pending = self._pending, OrderedDict()
+            count, self._pending_count = self._pending_count, 0
+            callbacks, self._callbacks = self._callbacks, []
+            self._in_flight += count
+        try:
+            if pending:
+                self._write(pending)
+        finally:
+            with self._cond:
+                self._in_flight -= count
+                self._cond.notify_all()
+            for fn, args, kwargs in callbacks:
+                fn(*args, **kwargs)
+
+    def _write(self, pending):
+        batches = []
+        for entries in pending.values():
+            statements = [statement for _, statement in entries]
+            for i in range(0, len(statements), self.max_batch_size):
+                batch = Batch(self.conn, batch_type=BatchType.Unlogged)
+                for statement in statements[i:i + self.max_batch_size]:
+                    batch.execute(statement)
+                batches.append(batch)
+
+        def failed(batch, exc):
+            self.on_error(exc, batch.queries)
+
+        execute_batches(batches, self.concurrency, on_error=failed)
+
+
+class CounterBuffer(_Flusher):
+    """
+    Sums counter increments of a model in memory and writes the totals
+    periodically, from a background thread.
+
+    .. code-block:: python
+
+        page_views = CounterBuffer(PageViews, flush_interval=1)
+        page_views.incr(conn, {'page': page}, 'views')
+        ...
+        page_views.close()
+
+    Increments are accumulated per primary key and column, so a hot counter
+    costs one write per flush instead of one per increment. The totals are
+    written as counter batches grouped by partition, every
+    ``flush_interval`` seconds, when ``flush_size`` counters are pending,
+    and once when the buffer is closed (explicitly, when leaving a ``with``
+    block, or at interpreter exit).
+
+    Counter updates are not idempotent, so failed writes are never retried,
+    their deltas are passed to ``on_error`` instead.
+
+    :param model: the counter model to update
+    :param flush_interval: (optional) maximum number of seconds an
+        increment stays in the buffer
+    :type flush_interval: float or None
+    :param flush_size: (optional) number of distinct pending counters
+        triggering a flush
+    :type flush_size: int or None
+    :param max_batch_size: maximum number of statements sent in one batch
+    :type max_batch_size: int
+    :param concurrency: maximum number of batches sent concurrently
+    :type concurrency: int
+    :param on_error: (optional) called with the exception and the list of
+        statements that could not be written, errors are logged by default
+    :type on_error: callable
+    """
+
+    def __init__(self, model, flush_interval=1.0, flush_size=None,
+                 max_batch_size=100, concurrency=4, on_error=None):
+        if not model._has_counter:
+            raise BufferException(
+                "{0} has no counter column".format(model.__name__)
+            )
+        self.model = model
+        self.flush_size = flush_size
+        self.max_batch_size = max_batch_size
+        self.concurrency = concurrency
+        self.on_error = on_error or _log_error
+        self.increments = 0
+        self._pending = OrderedDict()
+        self._pending_count = 0
+        super(CounterBuffer, self).__init__(flush_interval)
+
+    def __len__(self):
+        return self._pending_count
+
+    def _should_flush(self):
+        return (
+            self.flush_size is not None and
+            self._pending_count >= self.flush_size
+        )
+
+    def _key_values(self, key):
+        missing = set(self.model._primary_keys) - set(key)
+        unknown = set(key) - set(self.model._primary_keys)
+        if missing or unknown:
+            raise BufferException(
+                "The key of {0} must hold exactly the primary key columns "
+                "{1}".format(self.model.__name__, list(self.model._primary_keys))
+            )
+        return tuple(
+            col.validate(key[name])
+            for name, col in self.model._primary_keys.items()
+        )
+
+    def incr(self, conn, key, column, delta=1):
+        """Adds ``delta`` to a counter.
+
+        :param conn: cqlmapper.connection.Connection object the total will
+            be written to
+        :param key: the primary key values of the row
+        :type key: dict
+        :param column: name of the counter column
+        :type column: str
+        :param delta: the value to add, may be negative
+        :type delta: int
+        """
+        col = self.model._columns.get(column)
+        if not isinstance(col, columns.Counter):
+            raise BufferException(
+                "{0} is not a counter column of {1}".format(
+                    column,
+                    self.model.__name__,
+                )
+            )
+        delta = col.validate(delta)
+        row = self._key_values(key)
+        partition = row[:len(self.model._partition_keys)]
+        with self._cond:
+            self._check_open()
+            rows = self._pending.setdefault((conn, partition), OrderedDict())
+            deltas = rows.setdefault(row, {})
+            if column not in deltas:
+                deltas[column] = 0
+                self._pending_count += 1
+            deltas[column] += delta
+            self.increments += 1
+            if self._should_flush():
+                self._cond.notify_all()
+
+    def decr(self, conn, key, column, delta=1):
+        """Subtracts ``delta`` from a counter."""
+        self.incr(conn, key, column, -delta)
+
+    def _statement(self, row, deltas):
+        statement = UpdateStatement(self.model.column_family_name())
+        for name, delta in deltas.items():
+            if delta:
+                col = self.model._columns[name]
+                statement._add_assignment_clause(
+                    CounterUpdateClause(col.db_field_name, delta, 0)
+                )
+        if statement.is_empty:
+            return None
+        for (name, col), value in zip(self.model._primary_keys.items(), row):
+            statement.add_where(col, EqualsOperator(), value)
+        return statement
+
+    def _flush(self):
+        with self._cond:
+            pending, self._pending = self._pending, OrderedDict()
+            self._pending_count = 0
+        if not pending:
+            return
+
+        batches = []
+        for (conn, _), rows in pending.items():
+            statements = [
+                s for s in (
+                    self._statement(row, deltas)
+                    for row, deltas in rows.items()
+                ) if s is not None
+            ]
+            for i in range(0, len(statements), self.max_batch_size):
+                batch = Batch(conn, batch_type=BatchType.Counter)
+                for statement in statements[i:i + self.max_batch_size]:
+                    batch.execute(statement)
+                batches.append(batch)
+
+        def failed(batch, exc):
+            self.on_error(exc, batch.queries)
+
+        try:
+            execute_batches(batches, self.concurrency, on_error=failed)
+        finally:
+            self._invalidate_caches(pending)
+
+    def _invalidate_caches(self, pending):
+        query_cache = self.model.__query_cache__
+        if query_cache is not None:
+            query_cache.invalidate_table(self.model.column_family_name())
+        cache = self.model.__cache__
+        if cache is not None:
+            for rows in pending.values():
+                for row in rows:
+                    cache.invalidate(tuple(
+                        col.to_database(value) for col, value in
+                        zip(self.model._primary_keys.values(), row)
+                    ))
@@ -0,0 +1,320 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import OrderedDict
+from datetime import date, datetime
+import sys
+import threading
+import time
+from uuid import UUID
+
+import six
+
+
+class _Missing(object):
+
+    def __repr__(self):
+        return 'MISSING'
+
+
+MISSING = _Missing()
+"""
+Sentinel stored in a cache to remember that a key does not exist in the
+database (a negative entry).
+"""
+
+
+class LRUCache(object):
+    """
+    A thread safe, size bounded, least recently used cache with optional
+    expiry of entries.
+
+    Attach an instance to a model to serve primary key lookups from memory:
+
+    .. code-block:: python
+
+        class Country(Model):
+            __cache__ = LRUCache(maxsize=100000, ttl=30)
+
+            code = columns.Text(primary_key=True)
+            name = columns.Text()
+
+    :param maxsize: maximum number of entries kept in the cache, the least
+        recently used entry is evicted once it is reached
+    :type maxsize: int
+    :param ttl: (optional) number of seconds an entry stays valid
+    :type ttl: float or None
+    :param timer: (optional) function returning the current time in seconds,
+        defaults to :func:`time.time`
+    """
+
+    def __init__(self, maxsize=1024, ttl=None, timer=time.time):
+        if maxsize < 1:
+            raise ValueError("maxsize must be greater than 0")
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.timer = timer
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()
+        # invalidations per key, and of the whole cache, used to drop the
+        # values read before a write which invalidated them
+        self._generations = {}
+        self._epoch = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return self.get(key, MISSING, record=False) is not MISSING
+
+    def get(self, key, default=None, record=True):
+        """
+        Returns the value stored for ``key``, or ``default`` if there is
+        no valid entry.
+
+        Negative entries are returned as :data:`MISSING`, so callers can
+        tell them apart from a cache miss by passing another default.
+        """
+        with self._lock:
+            try:
+                expires, value = self._entries.pop(key)
+            except KeyError:
+                if record:
+                    self.misses += 1
+                return default
+            if expires is not None and expires <= self.timer():
+                if record:
+                    self.misses += 1
+                    self.evictions += 1
+                return default
+            self._entries[key] = (expires, value)
+            if record:
+                self.hits += 1
+            return value
+
+    def generation(self, key):
+        """
+        Returns the generation of ``key``, which changes whenever the key is
+        invalidated. Read it before fetching a value and pass it to
+        :meth:`set` so that a value fetched before a concurrent write isn't
+        stored after the write invalidated the key.
+        """
+        with self._lock:
+            return self._epoch, self._generations.get(key, 0)
+
+    def set(self, key, value, generation=None):
+        """
+        Stores ``value`` for ``key``, evicting old entries if needed.
+        Returns False, without storing the value, if ``generation`` isn't
+        the current generation of the key.
+        """
+        expires = self.timer() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if generation is not None and generation != (
+                    self._epoch, self._generations.get(key, 0)):
+                return False
+            self._entries.pop(key, None)
+            self._entries[key] = (expires, value)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+        return True
+
+    def invalidate(self, key):
+        """Drops the entry stored for ``key``, if any."""
+        with self._lock:
+            self._entries.pop(key, None)
+            if len(self._generations) >= self.maxsize:
+                # bounds the generations kept, changing the epoch
+                # invalidates every generation handed out
+                self._generations.clear()
+                self._epoch += 1
+            else:
+                self._generations[key] = self._generations.get(key, 0) + 1
+
+    def clear(self):
+        """Drops every entry, counters are left untouched."""
+        with self._lock:
+            self._entries.clear()
+            self._generations.clear()
+            self._epoch += 1
+
+    def stats(self):
+        """
+        Returns a dict with the ``hits``, ``misses``, ``evictions`` and
+        current ``size`` of the cache.
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'size': len(self._entries),
+        }
+
+    def reset_stats(self):
+        self.hits = self.misses = self.evictions = 0
+
+
+def estimate_size(value):
+    """
+    Returns a rough estimate of the number of bytes needed to hold ``value``
+    as a result row value, recursing into collections.
+    """
+    if value is None:
+        return 1
+    if isinstance(value, (six.binary_type, six.text_type, bytearray)):
+        return len(value)
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (six.integer_types, float)):
+        return 8
+    if isinstance(value, UUID):
+        return 16
+    if isinstance(value, (datetime, date)):
+        return 8
+    if isinstance(value, dict):
+        return sum(
+            estimate_size(k) + estimate_size(v) for k, v in value.items()
+        ) + 8
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sum(estimate_size(v) for v in value) + 8
+    return sys.getsizeof(value)
+
+
+class QueryCache(object):
+    """
+    A thread safe cache of query results bounded by an estimated memory
+    budget, keyed by query fingerprint.
+
+    Attach an instance to one or more models to serve their queryset reads
+    (including ``count()``, ``distinct()`` and ``values_list()``) from
+    memory:
+
+    .. code-block:: python
+
+        dashboard_cache = QueryCache(ttl=5, max_bytes=64 * 1024 * 1024)
+
+        class Metric(Model):
+            __query_cache__ = dashboard_cache
+
+            ...
+
+    Entries are grouped by table, writes going through the mapper drop every
+    cached result of the table they modify.
+
+    :param ttl: (optional) number of seconds an entry stays valid
+    :type ttl: float or None
+    :param max_bytes: estimated memory budget of the cached rows, least
+        recently used entries are evicted once it is exceeded. Results
+        larger than the budget are not cached.
+    :type max_bytes: int
+    :param timer: (optional) function returning the current time in seconds,
+        defaults to :func:`time.time`
+    """
+
+    def __init__(self, ttl=None, max_bytes=16 * 1024 * 1024,
+                 timer=time.time):
+        if max_bytes < 1:
+            raise ValueError("max_bytes must be greater than 0")
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.timer = timer
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.size = 0
+        self._entries = OrderedDict()
+        self._tables = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get(self, key, default=None):
+        """Returns the rows cached for ``key`` or ``default``."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return default
+            table, expires, size, rows = entry
+            if expires is not None and expires <= self.timer():
+                self._remove(key)
+                self.misses += 1
+                self.evictions += 1
+                return default
+            del self._entries[key]
+            self._entries[key] = entry
+            self.hits += 1
+            return rows
+
+    def set(self, table, key, rows):
+        """
+        Stores the result ``rows`` of a query on ``table``. Returns False if
+        the result doesn't fit in the memory budget.
+        """
+        size = estimate_size(rows)
+        if size > self.max_bytes:
+            return False
+        expires = self.timer() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (table, expires, size, rows)
+            self._tables.setdefault(table, set()).add(key)
+            self.size += size
+            while self.size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return True
+
+    def _remove(self, key):
+        table, _, size, _ = self._entries.pop(key)
+        self.size -= size
+        keys = self._tables[table]
+        keys.discard(key)
+        if not keys:
+            del self._tables[table]
+
+    def invalidate_table(self, table):
+        """Drops every result cached for ``table``."""
+        with self._lock:
+            for key in list(self._tables.get(table, ())):
+                self._remove(key)
+
+    def clear(self):
+        """Drops every entry, counters are left untouched."""
+        with self._lock:
+            self._entries.clear()
+            self._tables.clear()
+            self.size = 0
+
+    def stats(self):
+        """
+        Returns a dict with the ``hits``, ``misses``, ``evictions``, number
+        of ``entries`` and estimated ``bytes`` held by the cache.
+        """
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'entries': len(self._entries),
+            'bytes': self.size,
+        }
+
+    def reset_stats(self):
+        self.hits = self.misses = self.evictions = 0
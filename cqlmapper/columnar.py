@@ -0,0 +1,166 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Columnar export of query results to NumPy arrays, see
+:meth:`cqlmapper.query_set.ModelQuerySet.to_columns`.
+
+Values are appended, as rows are paged in, to a typed buffer per column,
+without constructing model instances. NumPy is only needed to build the
+arrays once every row was read.
+"""
+
+from array import array
+import datetime
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+from cqlmapper import columns, CQLEngineException
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+
+
+class ColumnarException(CQLEngineException):
+    pass
+
+
+def _milliseconds(value):
+    if value.tzinfo is not None:
+        value = value.replace(tzinfo=None) - value.utcoffset()
+    delta = value - _EPOCH
+    return (
+        (delta.days * 86400 + delta.seconds) * 1000 +
+        delta.microseconds // 1000
+    )
+
+
+# (column class, array typecode, numpy dtype, conversion), subclasses
+# first, columns of other types are kept in object arrays
+_TYPED = [
+    (columns.Counter, 'q', 'int64', None),
+    (columns.BigInt, 'q', 'int64', None),
+    (columns.TinyInt, 'b', 'int8', None),
+    (columns.SmallInt, 'h', 'int16', None),
+    (columns.Integer, 'i', 'int32', None),
+    (columns.Double, 'd', 'float64', None),
+    (columns.Float, 'f', 'float32', None),
+    (columns.Boolean, 'B', 'bool', None),
+    (columns.DateTime, 'q', 'datetime64[ms]', _milliseconds),
+]
+
+
+class ColumnBuffer(object):
+    """
+    Accumulates the values of a column, in a typed :class:`array.array`
+    when the column type maps to a NumPy dtype, in a list otherwise.
+
+    Null values of typed columns are stored as zeros and recorded in a
+    mask.
+    """
+
+    def __init__(self, column):
+        self.column = column
+        self.typecode = None
+        self.dtype = object
+        self.convert = None
+        for column_class, typecode, dtype, convert in _TYPED:
+            if isinstance(column, column_class):
+                self.typecode = typecode
+                self.dtype = dtype
+                self.convert = convert
+                break
+        if self.typecode is None:
+            self.values = []
+        else:
+            self.values = array(self.typecode)
+        self.nulls = None
+
+    def __len__(self):
+        return len(self.values)
+
+    def append(self, value):
+        if self.typecode is None:
+            self.values.append(value)
+            return
+        if value is None:
+            if self.nulls is None:
+                self.nulls = []
+            self.nulls.append(len(self.values))
+            value = 0
+        elif self.convert is not None:
+            value = self.convert(value)
+        self.values.append(value)
+
+    def to_array(self):
+        """
+        Returns the values as a NumPy array. Nulls of float and datetime
+        columns are NaN and NaT, nulls of other typed columns make the
+        array a masked array.
+        """
+        if self.typecode is None:
+            result = numpy.empty(len(self.values), dtype=object)
+            for i, value in enumerate(self.values):
+                result[i] = value
+            return result
+        result = numpy.frombuffer(self.values, dtype=self.dtype).copy()
+        if not self.nulls:
+            return result
+        if result.dtype.kind == 'f':
+            result[self.nulls] = numpy.nan
+        elif result.dtype.kind == 'M':
+            result[self.nulls] = numpy.datetime64('NaT')
+        else:
+            mask = numpy.zeros(len(result), dtype=bool)
+            mask[self.nulls] = True
+            result = numpy.ma.MaskedArray(result, mask=mask)
+        return result
+
+
+def _require_numpy():
+    if numpy is None:
+        raise ColumnarException(
+            "NumPy is required to export results to arrays, install "
+            "cqlmapper[numpy]"
+        )
+
+
+def to_columns(names, buffers):
+    """Returns a dict of the arrays of the buffers, by column name."""
+    _require_numpy()
+    return dict((name, b.to_array()) for name, b in zip(names, buffers))
+
+
+def to_structured(names, buffers):
+    """
+    Returns a structured array of the buffers, masked when one of its
+    integer or boolean fields has nulls.
+    """
+    _require_numpy()
+    arrays = [b.to_array() for b in buffers]
+    dtype = [(str(name), a.dtype) for name, a in zip(names, arrays)]
+    size = len(arrays[0]) if arrays else 0
+    result = numpy.empty(size, dtype=dtype)
+    masked = False
+    for name, values in zip(names, arrays):
+        result[name] = values
+        masked = masked or isinstance(values, numpy.ma.MaskedArray)
+    if not masked:
+        return result
+    result = numpy.ma.MaskedArray(result)
+    for name, values in zip(names, arrays):
+        result.mask[name] = numpy.ma.getmaskarray(values)
+    return result
@@ -28,6 +28,10 @@ log = logging.getLogger(__name__)
 
 class BaseValueManager(object):
 
+    # changes recorded since the value was persisted, see
+    # ContainerValueManager
+    mutations = None
+
     def __init__(self, instance, column, value):
         self.instance = instance
         self.column = column
@@ -72,6 +76,377 @@ class BaseValueManager(object):
             return property(_get, _set)
 
 
+class TrackedSet(set):
+    """
+    A set recording the elements added and removed since it was loaded,
+    so an update only sends the difference.
+    """
+
+    def __init__(self, *args):
+        super(TrackedSet, self).__init__(*args)
+        self._reset()
+
+    def __reduce__(self):
+        return self.__class__, (set(self),), self.__dict__
+
+    def _reset(self):
+        self._added = set()
+        self._removed = set()
+
+    def _track_add(self, item):
+        if item in self._removed:
+            self._removed.discard(item)
+        else:
+            self._added.add(item)
+
+    def _track_remove(self, item):
+        if item in self._added:
+            self._added.discard(item)
+        else:
+            self._removed.add(item)
+
+    def _changed(self):
+        return bool(self._added or self._removed)
+
+    def _original(self):
+        return (set(self) - self._added) | self._removed
+
+    def _mutations(self):
+        return set(self._added), set(self._removed)
+
+    def add(self, item):
+        if item not in self:
+            self._track_add(item)
+            super(TrackedSet, self).add(item)
+
+    def remove(self, item):
+        super(TrackedSet, self).remove(item)
+        self._track_remove(item)
+
+    def discard(self, item):
+        if item in self:
+            self.remove(item)
+
+    def pop(self):
+        item = super(TrackedSet, self).pop()
+        self._track_remove(item)
+        return item
+
+    def clear(self):
+        for item in self:
+            self._track_remove(item)
+        super(TrackedSet, self).clear()
+
+    def update(self, *others):
+        for other in others:
+            for item in other:
+                self.add(item)
+
+    def difference_update(self, *others):
+        for other in others:
+            for item in other:
+                self.discard(item)
+
+    def intersection_update(self, *others):
+        kept = set(self).intersection(*others)
+        for item in list(self):
+            if item not in kept:
+                self.remove(item)
+
+    def symmetric_difference_update(self, other):
+        for item in set(other):
+            if item in self:
+                self.remove(item)
+            else:
+                self.add(item)
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
+
+    def __iand__(self, other):
+        self.intersection_update(other)
+        return self
+
+    def __isub__(self, other):
+        self.difference_update(other)
+        return self
+
+    def __ixor__(self, other):
+        self.symmetric_difference_update(other)
+        return self
+
+
+class TrackedList(list):
+    """
+    A list recording the elements prepended and appended since it was
+    loaded, so an update only sends them.
+
+    Any other change (setting, inserting in the middle, removing, sorting,
+    ...) takes a snapshot of the list as it was loaded, which is then
+    diffed against the new value on save.
+    """
+
+    def __init__(self, *args):
+        super(TrackedList, self).__init__(*args)
+        self._reset()
+
+    def __reduce__(self):
+        return self.__class__, (list(self),), self.__dict__
+
+    def _reset(self):
+        self._prepended = []
+        self._appended = []
+        self._snapshot = None
+
+    def _mark_dirty(self):
+        if self._snapshot is None:
+            self._snapshot = self._original()
+
+    def _changed(self):
+        if self._snapshot is not None:
+            return list(self) != self._snapshot
+        return bool(self._prepended or self._appended)
+
+    def _original(self):
+        if self._snapshot is not None:
+            return list(self._snapshot)
+        end = len(self) - len(self._appended)
+        return list(self[len(self._prepended):end])
+
+    def _mutations(self):
+        if self._snapshot is not None:
+            return None
+        return list(self._prepended), list(self._appended)
+
+    def append(self, item):
+        if self._snapshot is None:
+            self._appended.append(item)
+        super(TrackedList, self).append(item)
+
+    def extend(self, items):
+        items = list(items)
+        if self._snapshot is None:
+            self._appended.extend(items)
+        super(TrackedList, self).extend(items)
+
+    def __iadd__(self, items):
+        self.extend(items)
+        return self
+
+    def insert(self, index, item):
+        size = len(self)
+        if index < 0:
+            index = max(size + index, 0)
+        if self._snapshot is None and index == 0:
+            self._prepended.insert(0, item)
+        elif self._snapshot is None and index >= size:
+            self._appended.append(item)
+        else:
+            self._mark_dirty()
+        super(TrackedList, self).insert(index, item)
+
+    def __setitem__(self, index, value):
+        self._mark_dirty()
+        super(TrackedList, self).__setitem__(index, value)
+
+    def __delitem__(self, index):
+        self._mark_dirty()
+        super(TrackedList, self).__delitem__(index)
+
+    def __imul__(self, n):
+        self._mark_dirty()
+        return super(TrackedList, self).__imul__(n)
+
+    def remove(self, item):
+        self._mark_dirty()
+        super(TrackedList, self).remove(item)
+
+    def pop(self, *args):
+        self._mark_dirty()
+        return super(TrackedList, self).pop(*args)
+
+    def sort(self, *args, **kwargs):
+        self._mark_dirty()
+        super(TrackedList, self).sort(*args, **kwargs)
+
+    def reverse(self):
+        self._mark_dirty()
+        super(TrackedList, self).reverse()
+
+    def clear(self):
+        self._mark_dirty()
+        del self[:]
+
+    if six.PY2:
+        def __setslice__(self, i, j, values):
+            self._mark_dirty()
+            super(TrackedList, self).__setslice__(i, j, values)
+
+        def __delslice__(self, i, j):
+            self._mark_dirty()
+            super(TrackedList, self).__delslice__(i, j)
+
+
+_ABSENT = object()
+
+
+class TrackedMap(dict):
+    """
+    A dict recording the keys set and deleted since it was loaded, so an
+    update only sends the changed entries.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super(TrackedMap, self).__init__(*args, **kwargs)
+        self._reset()
+
+    def __reduce__(self):
+        return self.__class__, (dict(self),), self.__dict__
+
+    def _reset(self):
+        # original value of every key changed since the last reset
+        self._originals = {}
+
+    def _touch(self, key):
+        if key not in self._originals:
+            self._originals[key] = dict.get(self, key, _ABSENT)
+
+    def _changes(self):
+        for key, original in self._originals.items():
+            value = dict.get(self, key, _ABSENT)
+            if value is _ABSENT:
+                if original is not _ABSENT:
+                    yield key, _ABSENT
+            elif value != original:
+                yield key, value
+
+    def _changed(self):
+        return any(True for _ in self._changes())
+
+    def _original(self):
+        original = dict(self)
+        for key, value in self._originals.items():
+            if value is _ABSENT:
+                original.pop(key, None)
+            else:
+                original[key] = value
+        return original
+
+    def _mutations(self):
+        updates = {}
+        removals = set()
+        for key, value in self._changes():
+            if value is _ABSENT:
+                removals.add(key)
+            else:
+                updates[key] = value
+        return updates, removals
+
+    def __setitem__(self, key, value):
+        self._touch(key)
+        super(TrackedMap, self).__setitem__(key, value)
+
+    def __delitem__(self, key):
+        if key in self:
+            self._touch(key)
+        super(TrackedMap, self).__delitem__(key)
+
+    def pop(self, key, *default):
+        if key in self:
+            self._touch(key)
+        return super(TrackedMap, self).pop(key, *default)
+
+    def popitem(self):
+        key, value = super(TrackedMap, self).popitem()
+        self._originals.setdefault(key, value)
+        return key, value
+
+    def clear(self):
+        for key in self:
+            self._touch(key)
+        super(TrackedMap, self).clear()
+
+    def update(self, *args, **kwargs):
+        for key, value in dict(*args, **kwargs).items():
+            self[key] = value
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+
+_TRACKED_TYPES = (TrackedSet, TrackedList, TrackedMap)
+
+
+class ContainerValueManager(BaseValueManager):
+    """
+    Value manager of the Set, List and Map columns.
+
+    Once an instance is persisted, the container it holds records the
+    changes made to it, instead of keeping a deep copy of it to diff on
+    save. The previous value is only rebuilt when it is asked for.
+    """
+
+    _tracking = None
+    _previous = None
+
+    @property
+    def previous_value(self):
+        if self._tracking is not None:
+            return self._tracking._original()
+        return self._previous
+
+    @previous_value.setter
+    def previous_value(self, value):
+        self._tracking = None
+        self._previous = value
+
+    @property
+    def _tracked(self):
+        return self._tracking is not None and self.value is self._tracking
+
+    @property
+    def deleted(self):
+        return self.column._val_is_null(self.value) and (
+            self.explicit or
+            self._tracking is not None or
+            self._previous is not None
+        )
+
+    @property
+    def changed(self):
+        if self._tracked:
+            return self._tracking._changed()
+        return self.value != self.previous_value
+
+    @property
+    def mutations(self):
+        """
+        The changes recorded by the container since the instance was
+        persisted, or None if they are not known.
+        """
+        if self._tracked:
+            return self._tracking._mutations()
+        return None
+
+    def reset_previous_value(self):
+        if isinstance(self.value, _TRACKED_TYPES):
+            self.value._reset()
+            self._tracking = self.value
+            self._previous = None
+        else:
+            self.previous_value = deepcopy(self.value)
+
+    def setval(self, val):
+        # keep recording changes if an equal container is assigned, as
+        # done by Model.validate
+        if val is not self.value and self._tracked and val == self.value:
+            return
+        self.value = val
+
+
 class Column(object):
 
     # the cassandra type this column maps to
@@ -782,7 +1157,15 @@ class Tuple(BaseCollectionColumn):
 
 
 class BaseContainerColumn(BaseCollectionColumn):
-    pass
+
+    value_manager = ContainerValueManager
+
+    def _trackable(self):
+        return not any(isinstance(t, BaseCollectionColumn) for t in self.types)
+
+    def mutations_to_database(self, mutations):
+        """Converts the changes recorded by a tracked container."""
+        return tuple(self.to_database(m) for m in mutations)
 
 
 class Set(BaseContainerColumn):
@@ -826,8 +1209,9 @@ class Set(BaseContainerColumn):
 
     def to_python(self, value):
         if value is None:
-            return set()
-        return set(self.value_col.to_python(v) for v in value)
+            value = ()
+        values = (self.value_col.to_python(v) for v in value)
+        return TrackedSet(values) if self._trackable() else set(values)
 
     def to_database(self, value):
         if value is None:
@@ -864,8 +1248,9 @@ class List(BaseContainerColumn):
 
     def to_python(self, value):
         if value is None:
-            return []
-        return [self.value_col.to_python(v) for v in value]
+            value = ()
+        values = (self.value_col.to_python(v) for v in value)
+        return TrackedList(values) if self._trackable() else list(values)
 
     def to_database(self, value):
         if value is None:
@@ -910,15 +1295,25 @@ class Map(BaseContainerColumn):
 
     def to_python(self, value):
         if value is None:
-            return {}
-        if value is not None:
-            return dict((self.key_col.to_python(k), self.value_col.to_python(v)) for k, v in value.items())
+            value = {}
+        items = (
+            (self.key_col.to_python(k), self.value_col.to_python(v))
+            for k, v in value.items()
+        )
+        return TrackedMap(items) if self._trackable() else dict(items)
 
     def to_database(self, value):
         if value is None:
             return None
         return dict((self.key_col.to_database(k), self.value_col.to_database(v)) for k, v in value.items())
 
+    def mutations_to_database(self, mutations):
+        updates, removals = mutations
+        return (
+            self.to_database(updates),
+            set(self.key_col.to_database(k) for k in removals),
+        )
+
 
 class _PartitionKeysToken(Column):
     """
@@ -12,7 +12,10 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
 import logging
+from timeit import default_timer
+
 import six
 
 from cassandra.query import SimpleStatement, dict_factory
@@ -24,8 +27,18 @@ from cqlmapper import (
     TIMEOUT_NOT_SET,
 )
 from cqlmapper.batch import Batch
+from cqlmapper.middleware import (
+    ExecutionContext,
+    scoped_middleware,
+    statement_operation,
+)
 from cqlmapper.query import DMLQuery
-from cqlmapper.statements import BaseCQLStatement
+from cqlmapper.singleflight import SingleFlight
+from cqlmapper.statements import (
+    BaseCQLStatement,
+    SelectStatement,
+    freeze_context,
+)
 
 
 log = logging.getLogger(__name__)
@@ -57,9 +70,34 @@ class Connection(ConnectionInterface):
     retry_connect = False
     lazy_connect_lock = None
     cluster_options = None
+    tombstone_stats = None
 
     def __init__(self, conn, consistency=None, retry_connect=False,
-                 cluster_options=None):
+                 cluster_options=None, coalesce_reads=False,
+                 tombstone_stats=None, middleware=None, slow_query_log=None):
+        """
+        :param conn: cassandra.cluster.Session used to execute queries
+        :param consistency: (optional) default consistency level of the
+            session
+        :param coalesce_reads: (Defaults to False) When True, identical
+            SELECT statements (same text, bound values and consistency)
+            executed concurrently from several threads share a single
+            request to the cluster. Only results fitting in one page are
+            shared, the callers waiting on a paged result execute their
+            own statement. The caller which executed the statement gets
+            its ResultSet, the others a copy of its rows.
+        :type coalesce_reads: bool
+        :param tombstone_stats: (optional) counts the tombstones generated
+            by the writes executed through this connection, and through
+            the batches using it
+        :type tombstone_stats: cqlmapper.tombstones.TombstoneStats
+        :param middleware: (optional) callables wrapping the execution of
+            every statement, see :meth:`add_middleware`
+        :type middleware: list
+        :param slow_query_log: (optional) logs slow statements and traces a
+            sample of them, runs before the other middlewares
+        :type slow_query_log: cqlmapper.slowlog.SlowQueryLog
+        """
         self.consistency = consistency
         self.retry_connect = retry_connect
         self.cluster_options = cluster_options if cluster_options else {}
@@ -71,14 +109,44 @@ class Connection(ConnectionInterface):
         self.session.row_factory = dict_factory
         enc = self.session.encoder
         enc.mapping[tuple] = enc.cql_encode_tuple
+        self._inflight = SingleFlight() if coalesce_reads else None
+        self.tombstone_stats = tombstone_stats
+        self.middleware = list(middleware or [])
+        if slow_query_log is not None:
+            self.middleware.insert(0, slow_query_log)
+
+    def add_middleware(self, middleware):
+        """Adds a middleware to the end of the chain.
+
+        A middleware is called as ``middleware(context, call_next)`` for
+        every statement executed through the connection, ``context`` being
+        a :class:`cqlmapper.middleware.ExecutionContext`. It must return the
+        result of ``call_next(context)``, which executes the statement
+        through the rest of the chain.
 
-    def _prepare_query_statement(self, query, query_statement):
+        .. code-block:: python
+
+            def timing(context, call_next):
+                start = time.time()
+                try:
+                    return call_next(context)
+                finally:
+                    histogram(context.operation).observe(time.time() - start)
+
+            conn.add_middleware(timing)
+        """
+        self.middleware.append(middleware)
+
+    def _prepare_query_statement(self, query, query_statement, context):
+        start = default_timer()
         params = query_statement.get_context()
+        bound = default_timer()
         statement = SimpleStatement(
             str(query_statement),
             consistency_level=query.consistency,
             fetch_size=query_statement.fetch_size,
         )
+        rendered = default_timer()
         if query.model._partition_key_index:
             key_values = query_statement.partition_key_values(
                 query.model._partition_key_index
@@ -90,42 +158,85 @@ class Connection(ConnectionInterface):
                 )
                 statement.routing_key = parts
                 statement.keyspace = self.keyspace
+        context.timings['render'] += rendered - bound
+        context.timings['bind'] += bound - start + default_timer() - rendered
         return statement, params
 
     def _excecute_dml_query(self, query):
         result = None
-        if query.statement:
-            statement, params = self._prepare_query_statement(
-                query,
-                query.statement
+        for statement in (query.statement, query.cleanup_statement):
+            if not statement:
+                continue
+            context = ExecutionContext(
+                model=query.model,
+                operation=statement_operation(statement),
+                source=statement,
             )
-            result = self.execute(
+            if statement is query.statement:
+                context.timings['statement'] = query.prepare_time
+            prepared, params = self._prepare_query_statement(
+                query,
                 statement,
+                context,
+            )
+            statement_result = self.execute(
+                prepared,
                 params=params,
                 timeout=query.timeout,
                 verify_applied=query.check_applied,
+                context=context,
             )
-        if query.cleanup_statement:
-            c_statement, c_params = self._prepare_query_statement(
-                query,
-                query.cleanup_statement
-            )
-            self.execute(
-                c_statement,
-                params=c_params,
-                timeout=query.timeout,
-                verify_applied=query.check_applied,
+            if statement is query.statement:
+                result = statement_result
+        if self.tombstone_stats is not None:
+            statements = [
+                s for s in (query.statement, query.cleanup_statement) if s
+            ]
+            self.tombstone_stats.record(
+                statements,
+                [query.model] * len(statements),
             )
         return result
 
     def execute(self, statement_or_query, params=None, consistency_level=None,
-                timeout=TIMEOUT_NOT_SET, verify_applied=False):
+                timeout=TIMEOUT_NOT_SET, verify_applied=False, model=None,
+                context=None):
+        """Executes a query, statement or CQL string.
+
+        :param model: (optional) the model class the statement was built
+            for
+        :param context: (optional) the context passed through the
+            middleware chain, created when not given
+        :type context: cqlmapper.middleware.ExecutionContext
+        """
         if isinstance(statement_or_query, DMLQuery):
             return self._excecute_dml_query(statement_or_query)
-        elif isinstance(statement_or_query, SimpleStatement):
+
+        if context is None:
+            context = ExecutionContext(model=model)
+        elif context.model is None:
+            context.model = model
+        if context.operation is None:
+            context.operation = statement_operation(statement_or_query)
+        if context.source is None:
+            context.source = statement_or_query
+
+        coalesce = False
+        written = None
+        start = default_timer()
+        if isinstance(statement_or_query, SimpleStatement):
             pass
         elif isinstance(statement_or_query, BaseCQLStatement):
+            coalesce = (
+                self._inflight is not None and
+                isinstance(statement_or_query, SelectStatement)
+            )
+            if not isinstance(statement_or_query, SelectStatement):
+                written = statement_or_query
             params = statement_or_query.get_context()
+            bound = default_timer()
+            context.timings['bind'] += bound - start
+            start = bound
             statement_or_query = SimpleStatement(
                 str(statement_or_query),
                 consistency_level=consistency_level,
@@ -140,15 +251,104 @@ class Connection(ConnectionInterface):
             raise ValueError(
                 "Unexpected query type %s", type(statement_or_query)
             )
+        context.timings['render'] += default_timer() - start
 
-        log.debug(statement_or_query.query_string)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug(statement_or_query.query_string)
 
-        result = self.session.execute(
-            statement_or_query,
-            params,
-            timeout=timeout,
-        )
-        if verify_applied:
-            check_applied(result)
+        context.statement = statement_or_query
+        context.params = params
+        context.timeout = timeout
+        context.session = self.session
+        try:
+            result = context.result = self._call_middleware(
+                context,
+                coalesce,
+            )
+            if verify_applied:
+                check_applied(result)
+        except Exception as e:
+            context.error = e
+            raise
+        finally:
+            context.finish()
+
+        if written is not None and self.tombstone_stats is not None:
+            self.tombstone_stats.record([written], [context.model])
         return result
 
+    def _call_middleware(self, context, coalesce):
+        middleware = self.middleware + list(scoped_middleware())
+
+        def call(index, context):
+            if index == len(middleware):
+                return self._send(context, coalesce)
+            return middleware[index](context, lambda c: call(index + 1, c))
+
+        return call(0, context)
+
+    def _send(self, context, coalesce):
+        start = default_timer()
+        try:
+            if context.trace:
+                return context.session.execute(
+                    context.statement,
+                    context.params,
+                    timeout=context.timeout,
+                    trace=True,
+                )
+            if coalesce:
+                return self._execute_coalesced(
+                    context.session,
+                    context.statement,
+                    context.params,
+                    context.timeout,
+                )
+            return context.session.execute(
+                context.statement,
+                context.params,
+                timeout=context.timeout,
+            )
+        finally:
+            context.timings['execute'] += default_timer() - start
+
+    def _execute_coalesced(self, session, statement, params, timeout):
+        try:
+            key = (
+                id(session),
+                statement.query_string,
+                statement.consistency_level,
+                statement.fetch_size,
+                freeze_context(params),
+            )
+        except TypeError:
+            # unhashable bound values, don't try to share the request
+            return session.execute(statement, params, timeout=timeout)
+        executed = []
+
+        def fetch():
+            executed.append(True)
+            return self._fetch_first_page(session, statement, params, timeout)
+
+        (result, rows), _ = self._inflight.do(key, fetch)
+        if executed:
+            return result
+        if rows is None:
+            # the result has more pages, which can't be shared
+            return session.execute(statement, params, timeout=timeout)
+        # every caller gets its own rows, results are mutated while
+        # constructing model instances
+        return copy.deepcopy(rows)
+
+    def _fetch_first_page(self, session, statement, params, timeout):
+        """
+        Executes a statement, returns its result and a copy of its rows
+        to share with the other callers, None if it has more pages.
+        """
+        result = session.execute(statement, params, timeout=timeout)
+        if getattr(result, 'has_more_pages', False):
+            return result, None
+        rows = getattr(result, 'current_rows', None)
+        if rows is None:
+            result = rows = list(result)
+        return result, copy.deepcopy(list(rows))
@@ -0,0 +1,436 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Export of table scans to column files which can be memory-mapped.
+
+.. code-block:: python
+
+    export_table(conn, Reading, '/data/readings', splits=256, concurrency=8)
+
+    export = Export('/data/readings')
+    values = export.array('value')      # a read-only numpy.memmap
+    labels = export.values('label')     # decoded on access
+
+The export directory holds a ``schema.json`` file describing the columns
+and, per column:
+
+* ``<name>.data``: fixed width values, or the concatenated encoded values
+  of variable length columns,
+* ``<name>.offsets``: for variable length columns, ``rows + 1`` int64
+  offsets of the values in the data file,
+* ``<name>.nulls``: a byte per row, 1 for null values.
+
+Fixed width columns are those mapped to NumPy dtypes by
+:mod:`cqlmapper.columnar`, plus ``UUID``/``TimeUUID`` (16 bytes), ``Date``
+and ``Time``. ``Text``, ``Ascii``, ``Inet``, ``VarInt`` and ``Decimal``
+values are stored as UTF-8 text, ``Blob`` values as is, and collections
+and tuples as JSON. Rows are written in the order their token ranges are
+read, which isn't the token order when ranges are read concurrently.
+
+Writing only needs the standard library, reading needs NumPy.
+"""
+
+from array import array
+import json
+import os
+import sys
+import tempfile
+import threading
+
+import six
+
+from cqlmapper import columnar, columns, CQLEngineException
+from cqlmapper.columnar import _TYPED, _require_numpy
+from cqlmapper.scan import iter_range_rows, scan_ranges, split_ring
+
+FORMAT = 'cqlmapper-export'
+VERSION = 1
+SCHEMA = 'schema.json'
+
+# rows buffered per token range before being appended to the files
+CHUNK_ROWS = 1000
+
+_BYTE_ORDER = '<' if sys.byteorder == 'little' else '>'
+
+_NUMPY_TYPES = {
+    'int8': 'i1',
+    'int16': 'i2',
+    'int32': 'i4',
+    'int64': 'i8',
+    'float32': 'f4',
+    'float64': 'f8',
+    'datetime64[ms]': 'M8[ms]',
+}
+
+
+class ExportException(CQLEngineException):
+    pass
+
+
+def _jsonable(value):
+    if isinstance(value, dict):
+        return dict(
+            (six.text_type(k), _jsonable(v)) for k, v in value.items()
+        )
+    if isinstance(value, (set, frozenset, list, tuple)) or (
+            hasattr(value, '__iter__') and
+            not isinstance(value, (six.string_types, six.binary_type))):
+        return [_jsonable(v) for v in value]
+    if value is None or isinstance(value, (bool, float) + six.integer_types):
+        return value
+    return six.text_type(value)
+
+
+def _text(value):
+    return six.text_type(value).encode('utf-8')
+
+
+def _json(value):
+    return json.dumps(_jsonable(value), sort_keys=True).encode('utf-8')
+
+
+class _FixedWriter(object):
+
+    def __init__(self, path, typecode, dtype, convert):
+        self.typecode = typecode
+        self.dtype = dtype
+        self.convert = convert
+        self.data = open(path + '.data', 'wb')
+        self.nulls = open(path + '.nulls', 'wb')
+
+    def schema(self):
+        return {'kind': 'fixed', 'dtype': self.dtype}
+
+    def write(self, values):
+        data = array(self.typecode)
+        nulls = bytearray(len(values))
+        for i, value in enumerate(values):
+            if value is None:
+                nulls[i] = 1
+                value = 0
+            elif self.convert is not None:
+                value = self.convert(value)
+            data.append(value)
+        data.tofile(self.data)
+        self.nulls.write(nulls)
+
+    def close(self):
+        self.data.close()
+        self.nulls.close()
+
+
+class _BytesWriter(_FixedWriter):
+    """Fixed width byte strings, like UUIDs."""
+
+    def __init__(self, path, width, convert):
+        self.width = width
+        self.convert = convert
+        self.data = open(path + '.data', 'wb')
+        self.nulls = open(path + '.nulls', 'wb')
+
+    def schema(self):
+        return {'kind': 'fixed', 'dtype': 'V{0}'.format(self.width)}
+
+    def write(self, values):
+        data = bytearray()
+        nulls = bytearray(len(values))
+        empty = b'\0' * self.width
+        for i, value in enumerate(values):
+            if value is None:
+                nulls[i] = 1
+                data += empty
+            else:
+                data += self.convert(value)
+        self.data.write(data)
+        self.nulls.write(nulls)
+
+
+class _VariableWriter(object):
+
+    def __init__(self, path, encoding, encode):
+        self.encoding = encoding
+        self.encode = encode
+        self.position = 0
+        self.data = open(path + '.data', 'wb')
+        self.offsets = open(path + '.offsets', 'wb')
+        self.nulls = open(path + '.nulls', 'wb')
+        array('q', [0]).tofile(self.offsets)
+
+    def schema(self):
+        return {
+            'kind': 'variable',
+            'encoding': self.encoding,
+            'offsets_dtype': _BYTE_ORDER + 'i8',
+        }
+
+    def write(self, values):
+        data = bytearray()
+        offsets = array('q')
+        nulls = bytearray(len(values))
+        for i, value in enumerate(values):
+            if value is None:
+                nulls[i] = 1
+            else:
+                data += value if self.encode is None else self.encode(value)
+            offsets.append(self.position + len(data))
+        self.position += len(data)
+        self.data.write(data)
+        offsets.tofile(self.offsets)
+        self.nulls.write(nulls)
+
+    def close(self):
+        self.data.close()
+        self.offsets.close()
+        self.nulls.close()
+
+
+def _writer(column, path):
+    for column_class, typecode, dtype, convert in _TYPED:
+        if isinstance(column, column_class):
+            if dtype == 'bool':
+                dtype = 'b1'
+            else:
+                dtype = _BYTE_ORDER + _NUMPY_TYPES[dtype]
+            return _FixedWriter(path, typecode, dtype, convert)
+    if isinstance(column, columns.UUID):
+        return _BytesWriter(path, 16, lambda value: value.bytes)
+    if isinstance(column, columns.Date):
+        return _FixedWriter(
+            path,
+            'q',
+            _BYTE_ORDER + 'M8[D]',
+            lambda value: value.days_from_epoch,
+        )
+    if isinstance(column, columns.Time):
+        return _FixedWriter(
+            path,
+            'q',
+            _BYTE_ORDER + 'm8[ns]',
+            lambda value: value.nanosecond_time,
+        )
+    if isinstance(column, columns.Blob):
+        return _VariableWriter(path, 'binary', bytes)
+    if isinstance(column, (columns.Text, columns.Inet, columns.VarInt,
+                           columns.Decimal)):
+        return _VariableWriter(path, 'utf-8', _text)
+    return _VariableWriter(path, 'json', _json)
+
+
+def _write_schema(path, schema):
+    # replaced atomically, an export is complete once its schema exists
+    fd, tmp = tempfile.mkstemp(dir=path, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(schema, f, indent=2, sort_keys=True)
+        os.rename(tmp, os.path.join(path, SCHEMA))
+    except Exception:
+        os.unlink(tmp)
+        raise
+
+
+def export_table(conn, queryset, path, splits=64, concurrency=4):
+    """
+    Scans a table by token ranges and writes the selected columns of its
+    rows to column files in the ``path`` directory.
+
+    :param conn: the connection reading the table
+    :param queryset: the model or the queryset to export, use ``only()``
+        or ``values_list()`` to export a subset of the columns
+    :param path: the export directory, created if needed
+    :type path: str
+    :param splits: the number of token ranges the ring is split in
+    :type splits: int
+    :param concurrency: the number of token ranges read at once
+    :type concurrency: int
+    :returns: the schema of the export
+    :rtype: dict
+    """
+    if not hasattr(queryset, '_iter_rows'):
+        queryset = queryset.objects.all()
+    model = queryset.model
+    names = list(queryset._only_fields) or list(model._columns)
+    model_columns = [model._columns[name] for name in names]
+    if not os.path.isdir(path):
+        os.makedirs(path)
+    if os.path.exists(os.path.join(path, SCHEMA)):
+        os.unlink(os.path.join(path, SCHEMA))
+
+    writers = [
+        _writer(column, os.path.join(path, name))
+        for name, column in zip(names, model_columns)
+    ]
+    fields = [column.db_field_name for column in model_columns]
+    lock = threading.Lock()
+    state = {'rows': 0}
+
+    def write(rows):
+        if not rows:
+            return
+        with lock:
+            for field, writer in zip(fields, writers):
+                writer.write([row.get(field) for row in rows])
+            state['rows'] += len(rows)
+
+    def export_range(token_range):
+        rows = []
+        for row in iter_range_rows(conn, queryset, token_range):
+            rows.append(row)
+            if len(rows) >= CHUNK_ROWS:
+                write(rows)
+                rows = []
+        write(rows)
+
+    try:
+        for _ in scan_ranges(export_range, split_ring(splits), concurrency):
+            pass
+    finally:
+        for writer in writers:
+            writer.close()
+
+    column_schemas = []
+    for name, column, writer in zip(names, model_columns, writers):
+        schema = writer.schema()
+        schema.update({
+            'name': name,
+            'db_field': column.db_field_name,
+            'cql_type': column.db_type,
+        })
+        column_schemas.append(schema)
+    schema = {
+        'format': FORMAT,
+        'version': VERSION,
+        'model': model.__name__,
+        'table': model.column_family_name(),
+        'rows': state['rows'],
+        'columns': column_schemas,
+    }
+    _write_schema(path, schema)
+    return schema
+
+
+class VariableColumn(object):
+    """
+    Values of a variable length column, decoded on access from the
+    memory-mapped offsets and data files.
+    """
+
+    def __init__(self, offsets, data, nulls, encoding):
+        self.offsets = offsets
+        self.data = data
+        self.nulls = nulls
+        self.encoding = encoding
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def __getitem__(self, i):
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        if self.nulls[i]:
+            return None
+        value = self.data[self.offsets[i]:self.offsets[i + 1]].tobytes()
+        if self.encoding == 'binary':
+            return value
+        value = value.decode('utf-8')
+        if self.encoding == 'json':
+            return json.loads(value)
+        return value
+
+    def __iter__(self):
+        for i in range(len(self)):
+            yield self[i]
+
+
+class Export(object):
+    """
+    Reads an export written by :func:`export_table`.
+
+    :param path: the export directory
+    :type path: str
+    """
+
+    def __init__(self, path):
+        _require_numpy()
+        self.path = path
+        try:
+            with open(os.path.join(path, SCHEMA)) as f:
+                self.schema = json.load(f)
+        except (IOError, OSError):
+            raise ExportException(
+                "{0} has no schema, the export is missing or "
+                "incomplete".format(path)
+            )
+        if (self.schema.get('format') != FORMAT or
+                self.schema.get('version', 0) > VERSION):
+            raise ExportException(
+                "Unsupported export format in {0}".format(path)
+            )
+        self.columns = dict((c['name'], c) for c in self.schema['columns'])
+        self.names = [c['name'] for c in self.schema['columns']]
+
+    def __len__(self):
+        return self.schema['rows']
+
+    def _map(self, name, suffix, dtype, length):
+        numpy = columnar.numpy
+        if length == 0:
+            return numpy.empty(0, dtype=dtype)
+        return numpy.memmap(
+            os.path.join(self.path, name + suffix),
+            dtype=dtype,
+            mode='r',
+            shape=(length,),
+        )
+
+    def _column(self, name):
+        try:
+            return self.columns[name]
+        except KeyError:
+            raise ExportException("No column {0} in the export".format(name))
+
+    def nulls(self, name):
+        """Returns a boolean array, True for the null values of a column."""
+        self._column(name)
+        return self._map(name, '.nulls', 'b1', len(self))
+
+    def array(self, name):
+        """Returns the memory-mapped values of a fixed width column."""
+        column = self._column(name)
+        if column['kind'] != 'fixed':
+            raise ExportException(
+                "{0} is a variable length column, use values()".format(name)
+            )
+        return self._map(name, '.data', column['dtype'], len(self))
+
+    def values(self, name):
+        """Returns the values of a variable length column."""
+        column = self._column(name)
+        if column['kind'] != 'variable':
+            return self.array(name)
+        offsets = self._map(
+            name,
+            '.offsets',
+            column['offsets_dtype'],
+            len(self) + 1,
+        )
+        data_size = int(offsets[-1])
+        return VariableColumn(
+            offsets,
+            self._map(name, '.data', 'u1', data_size),
+            self.nulls(name),
+            column['encoding'],
+        )
@@ -0,0 +1,446 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Bulk loading of CSV and newline-delimited JSON files into a model's table.
+
+.. code-block:: python
+
+    loader = BulkLoader(
+        conn,
+        User,
+        concurrency=64,
+        dead_letter='/data/users.failed.jsonl',
+        checkpoint='/data/users.checkpoint',
+    )
+    result = loader.load('/data/users.csv')
+
+Records are matched to the columns of the model by ``db_field_name`` (or
+attribute name), validated, and saved concurrently. Records which can't be
+validated or written are appended to the dead-letter file with their
+error. The checkpoint holds the number of leading records of the file
+which were processed, loading the same file again resumes after them.
+"""
+
+import binascii
+import csv
+import datetime
+import io
+import json
+import logging
+import os
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from timeit import default_timer
+
+import six
+
+from cqlmapper import columns, CQLEngineException
+from cqlmapper.slowlog import JsonLinesSink
+
+log = logging.getLogger(__name__)
+
+CSV = 'csv'
+JSON_LINES = 'jsonl'
+
+_FORMATS = {
+    '.csv': CSV,
+    '.json': JSON_LINES,
+    '.jsonl': JSON_LINES,
+    '.ndjson': JSON_LINES,
+}
+
+_DATETIME_FORMATS = (
+    '%Y-%m-%dT%H:%M:%S.%f',
+    '%Y-%m-%dT%H:%M:%S',
+    '%Y-%m-%d %H:%M:%S.%f',
+    '%Y-%m-%d %H:%M:%S',
+    '%Y-%m-%d',
+)
+
+_TRUE = frozenset(['true', 't', 'yes', 'y', '1'])
+_FALSE = frozenset(['false', 'f', 'no', 'n', '0'])
+
+
+class LoaderException(CQLEngineException):
+    pass
+
+
+def _parse_datetime(value):
+    value = value.strip()
+    if value.lstrip('-').isdigit():
+        # milliseconds since the epoch
+        return datetime.datetime(1970, 1, 1) + datetime.timedelta(
+            milliseconds=int(value)
+        )
+    if value.endswith('Z'):
+        value = value[:-1]
+    for date_format in _DATETIME_FORMATS:
+        try:
+            return datetime.datetime.strptime(value, date_format)
+        except ValueError:
+            pass
+    raise ValueError("Invalid timestamp {0!r}".format(value))
+
+
+def _parse_boolean(value):
+    lowered = value.strip().lower()
+    if lowered in _TRUE:
+        return True
+    if lowered in _FALSE:
+        return False
+    raise ValueError("Invalid boolean {0!r}".format(value))
+
+
+def _parse_blob(value):
+    if value.startswith(('0x', '0X')):
+        value = value[2:]
+    return binascii.unhexlify(value)
+
+
+def parse_value(column, value):
+    """
+    Converts a value read from a file to the python type of a column.
+    Strings are parsed for the column types which don't accept them, and
+    collections are read from JSON strings.
+    """
+    if value is None:
+        return None
+    if isinstance(column, columns.BaseContainerColumn) or isinstance(
+            column, columns.Tuple):
+        if isinstance(value, six.string_types):
+            value = json.loads(value)
+        if isinstance(column, columns.Map):
+            return dict(
+                (
+                    parse_value(column.key_col, k),
+                    parse_value(column.value_col, v),
+                )
+                for k, v in value.items()
+            )
+        if isinstance(column, columns.Tuple):
+            return tuple(
+                parse_value(t, v) for t, v in zip(column.types, value)
+            )
+        parsed = [parse_value(column.value_col, v) for v in value]
+        return set(parsed) if isinstance(column, columns.Set) else parsed
+    if not isinstance(value, six.string_types):
+        return value
+    if isinstance(column, columns.Boolean):
+        return _parse_boolean(value)
+    if isinstance(column, columns.DateTime):
+        return _parse_datetime(value)
+    if isinstance(column, columns.Blob):
+        return _parse_blob(value)
+    if isinstance(column, columns.BaseFloat):
+        return float(value)
+    return value
+
+
+def _read_csv(path, delimiter):
+    with io.open(path, newline='', encoding='utf-8') as f:
+        for record in csv.DictReader(f, delimiter=delimiter):
+            # empty fields are nulls
+            yield dict((k, v if v != '' else None) for k, v in record.items())
+
+
+def _read_json_lines(path):
+    with io.open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                yield json.loads(line)
+
+
+def read_records(path, file_format=None, delimiter=','):
+    """
+    Yields the records of a CSV or newline-delimited JSON file as dicts.
+    The format is guessed from the file extension when not given.
+    """
+    if file_format is None:
+        extension = os.path.splitext(path)[1].lower()
+        try:
+            file_format = _FORMATS[extension]
+        except KeyError:
+            raise LoaderException(
+                "Unknown format for {0}, pass file_format".format(path)
+            )
+    if file_format == CSV:
+        return _read_csv(path, delimiter)
+    if file_format == JSON_LINES:
+        return _read_json_lines(path)
+    raise LoaderException("Unknown format {0}".format(file_format))
+
+
+def _write_atomically(path, data):
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(data, f)
+        os.rename(tmp, path)
+    except Exception:
+        os.unlink(tmp)
+        raise
+
+
+class LoadResult(object):
+    """Counters of a load, updated as it goes."""
+
+    def __init__(self):
+        self.skipped = 0
+        self.read = 0
+        self.written = 0
+        self.failed = 0
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self):
+        """Rows written per second."""
+        return self.written / self.elapsed if self.elapsed else 0.0
+
+    def __repr__(self):
+        return (
+            '<LoadResult read={0} written={1} failed={2} skipped={3} '
+            '{4:.1f} rows/s>'.format(
+                self.read,
+                self.written,
+                self.failed,
+                self.skipped,
+                self.throughput,
+            )
+        )
+
+
+class _Checkpoint(object):
+    """
+    Tracks the records done out of order, and the offset below which all of
+    them are.
+    """
+
+    def __init__(self, path, source, offset):
+        self.path = path
+        self.source = source
+        self.offset = offset
+        self.saved_offset = offset
+        self._done = set()
+
+    def done(self, index):
+        self._done.add(index)
+        while self.offset in self._done:
+            self._done.remove(self.offset)
+            self.offset += 1
+
+    def save(self):
+        if self.path is not None:
+            _write_atomically(
+                self.path,
+                {'source': self.source, 'offset': self.offset},
+            )
+        self.saved_offset = self.offset
+
+
+class BulkLoader(object):
+    """
+    Loads records from files into the table of a model.
+
+    Each record is mapped to the columns of the model by ``db_field_name``,
+    falling back to the attribute name, then parsed (see
+    :func:`parse_value`) and validated by the columns. Valid records are
+    saved through ``conn`` with up to ``concurrency`` writes in flight;
+    every write is routed to a replica of its partition by the connection,
+    as for any model save.
+
+    :param conn: the connection the rows are written with
+    :param model: the model class of the table
+    :param concurrency: the number of writes in flight
+    :type concurrency: int
+    :param dead_letter: (optional) path of a file receiving, as JSON lines,
+        the records which failed with their offset and error
+    :type dead_letter: str
+    :param checkpoint: (optional) path of the checkpoint file
+    :type checkpoint: str
+    :param checkpoint_every: the number of records between checkpoints
+    :type checkpoint_every: int
+    :param progress: (optional) called with the :class:`LoadResult` every
+        ``progress_interval`` seconds, progress is logged when not given
+    :type progress: callable
+    :param progress_interval: seconds between progress reports
+    :type progress_interval: float
+    :param ttl: (optional) TTL of the written rows, in seconds
+    :type ttl: int
+    :param strict: (Defaults to False) reject records with fields which
+        aren't columns of the model, they're ignored otherwise
+    :type strict: bool
+    """
+
+    def __init__(self, conn, model, concurrency=16, dead_letter=None,
+                 checkpoint=None, checkpoint_every=1000, progress=None,
+                 progress_interval=10.0, ttl=None, strict=False):
+        if model._has_counter:
+            raise LoaderException(
+                "Counter tables can't be loaded, {0} has counter "
+                "columns".format(model.__name__)
+            )
+        self.conn = conn
+        self.model = model
+        self.concurrency = concurrency
+        self.dead_letter = (
+            JsonLinesSink(dead_letter) if dead_letter is not None else None
+        )
+        self.checkpoint = checkpoint
+        self.checkpoint_every = checkpoint_every
+        self.progress = progress or self._log_progress
+        self.progress_interval = progress_interval
+        self.ttl = ttl
+        self.strict = strict
+        self._fields = {}
+        for name, column in model._columns.items():
+            self._fields[name] = (name, column)
+        for name, column in model._columns.items():
+            self._fields[column.db_field_name] = (name, column)
+
+    def _log_progress(self, result):
+        log.info("Loading %s: %r", self.model.__name__, result)
+
+    def to_values(self, record):
+        """
+        Returns the validated attribute values of a record, raises
+        ``ValidationError`` or ``ValueError`` for invalid records.
+        """
+        values = {}
+        for key, value in record.items():
+            try:
+                name, column = self._fields[key]
+            except KeyError:
+                if self.strict:
+                    raise LoaderException("Unknown column {0}".format(key))
+                continue
+            value = column.validate(parse_value(column, value))
+            column.to_database(value)
+            values[name] = value
+        for name, column in self.model._primary_keys.items():
+            if values.get(name) is None:
+                raise LoaderException(
+                    "Missing primary key column {0}".format(name)
+                )
+        return values
+
+    def _write(self, values):
+        instance = self.model(**values)
+        if self.ttl is not None:
+            instance.ttl(self.ttl)
+        instance.save(self.conn)
+
+    def _start_offset(self, source):
+        if self.checkpoint is None or not os.path.exists(self.checkpoint):
+            return 0
+        with open(self.checkpoint) as f:
+            saved = json.load(f)
+        if saved.get('source') != source:
+            raise LoaderException(
+                "The checkpoint {0} is for {1}, not {2}".format(
+                    self.checkpoint,
+                    saved.get('source'),
+                    source,
+                )
+            )
+        return saved['offset']
+
+    def _reject(self, index, record, stage, error):
+        if self.dead_letter is None:
+            return
+        self.dead_letter({
+            'offset': index,
+            'stage': stage,
+            'error': '{0}: {1}'.format(error.__class__.__name__, error),
+            'record': record,
+        })
+
+    def load(self, path, file_format=None, delimiter=','):
+        """
+        Loads a file, resuming after the records recorded in the checkpoint
+        for it.
+
+        :param path: the CSV or newline-delimited JSON file
+        :type path: str
+        :param file_format: (optional) ``csv`` or ``jsonl``, guessed from
+            the extension of the file when not given
+        :type file_format: str
+        :param delimiter: the CSV field delimiter
+        :type delimiter: str
+        :rtype: LoadResult
+        """
+        source = os.path.abspath(path)
+        offset = self._start_offset(source)
+        checkpoint = _Checkpoint(self.checkpoint, source, offset)
+        result = LoadResult()
+        lock = threading.Lock()
+        # bounds the records read ahead of the writes
+        slots = threading.BoundedSemaphore(self.concurrency * 2)
+        start = default_timer()
+        last_progress = [start]
+
+        def finish(index, record, error):
+            with lock:
+                if error is None:
+                    result.written += 1
+                else:
+                    result.failed += 1
+                    self._reject(index, record, 'write', error)
+                checkpoint.done(index)
+                pending = checkpoint.offset - checkpoint.saved_offset
+                if pending >= self.checkpoint_every:
+                    checkpoint.save()
+                now = default_timer()
+                if now - last_progress[0] >= self.progress_interval:
+                    last_progress[0] = now
+                    result.elapsed = now - start
+                    self.progress(result)
+
+        def write(index, record, values):
+            error = None
+            try:
+                self._write(values)
+            except Exception as e:
+                error = e
+            finally:
+                slots.release()
+            finish(index, record, error)
+
+        executor = ThreadPoolExecutor(max_workers=self.concurrency)
+        try:
+            for index, record in enumerate(
+                    read_records(path, file_format, delimiter)):
+                if index < offset:
+                    result.skipped += 1
+                    continue
+                result.read += 1
+                try:
+                    values = self.to_values(record)
+                except Exception as e:
+                    with lock:
+                        result.failed += 1
+                        self._reject(index, record, 'validate', e)
+                        checkpoint.done(index)
+                    continue
+                slots.acquire()
+                executor.submit(write, index, record, values)
+        finally:
+            executor.shutdown(wait=True)
+            checkpoint.save()
+        result.elapsed = default_timer() - start
+        self.progress(result)
+        return result
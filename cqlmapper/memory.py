@@ -0,0 +1,902 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from bisect import bisect_left
+import copy
+import functools
+import itertools
+import re
+import struct
+import threading
+import time
+
+import six
+
+from cassandra.metadata import Murmur3Token
+from cassandra.util import max_uuid_from_time, min_uuid_from_time
+
+from cqlmapper import (
+    columns,
+    ConnectionInterface,
+    CQLEngineException,
+    LWTException,
+)
+from cqlmapper.connection import check_applied
+from cqlmapper.functions import (
+    MaxTimeUUID,
+    MinTimeUUID,
+    QueryValue,
+    Token,
+)
+from cqlmapper.operators import (
+    ContainsOperator,
+    EqualsOperator,
+    GreaterThanOperator,
+    GreaterThanOrEqualOperator,
+    InOperator,
+    LessThanOperator,
+    LessThanOrEqualOperator,
+    NotEqualsOperator,
+)
+from cqlmapper.query import DMLQuery
+from cqlmapper.statements import (
+    BaseCQLStatement,
+    DeleteStatement,
+    InsertStatement,
+    SelectStatement,
+    UpdateStatement,
+    ValueQuoter,
+)
+
+# assignments and deletions as rendered by the mapper statements
+_ASSIGN = re.compile(r'^"(?P<field>[^"]+)" = %\((?P<value>\w+)\)s$')
+_APPEND = re.compile(
+    r'^"(?P<field>[^"]+)" = "(?P=field)" (?P<op>[+-]) %\((?P<value>\w+)\)s$'
+)
+_PREPEND = re.compile(
+    r'^"(?P<field>[^"]+)" = %\((?P<value>\w+)\)s \+ "(?P=field)"$'
+)
+_ITEM = re.compile(
+    r'^"(?P<field>[^"]+)"\[(?:%\((?P<key>\w+)\)s|(?P<index>\d+))\]'
+    r'(?: = %\((?P<value>\w+)\)s)?$'
+)
+_FIELD = re.compile(r'^"(?P<field>[^"]+)"$')
+_ORDER = re.compile(
+    r'^"(?P<field>[^"]+)"(?: (?P<direction>ASC|DESC))?$',
+    re.IGNORECASE,
+)
+
+_PROTOCOL_VERSION = 4
+
+
+class MemoryConnectionException(CQLEngineException):
+    pass
+
+
+@functools.total_ordering
+class _Descending(object):
+    """Sort key wrapper reversing the order of a value."""
+
+    __slots__ = ('value',)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+    def __hash__(self):
+        return hash(self.value)
+
+
+def _timeuuid_key(value):
+    # Cassandra orders timeuuids by time, not by their bytes
+    return value.time, value.bytes
+
+
+class _LWTResult(list):
+    """Result of a conditional write."""
+
+    def __init__(self, applied, existing=None):
+        row = dict(existing or {})
+        row['[applied]'] = applied
+        super(_LWTResult, self).__init__([row])
+        self.was_applied = applied
+
+
+class _Cell(object):
+
+    __slots__ = ('value', 'timestamp', 'expires')
+
+    def __init__(self, value, timestamp, expires):
+        self.value = value
+        self.timestamp = timestamp
+        self.expires = expires
+
+
+class _Row(object):
+
+    __slots__ = ('cells', 'marker', 'deleted_at')
+
+    def __init__(self):
+        self.cells = {}
+        # (timestamp, expires) of the row marker written by inserts
+        self.marker = None
+        self.deleted_at = None
+
+
+class _Partition(object):
+    """Rows of a partition, sorted by clustering key."""
+
+    __slots__ = ('sort_keys', 'clusterings', 'rows', 'static', 'deleted_at')
+
+    def __init__(self):
+        self.sort_keys = []
+        self.clusterings = []
+        self.rows = {}
+        self.static = _Row()
+        self.deleted_at = None
+
+    def row(self, table, clustering):
+        row = self.rows.get(clustering)
+        if row is None:
+            sort_key = table.sort_key(clustering)
+            i = bisect_left(self.sort_keys, sort_key)
+            self.sort_keys.insert(i, sort_key)
+            self.clusterings.insert(i, clustering)
+            row = self.rows[clustering] = _Row()
+        return row
+
+
+class _Table(object):
+
+    def __init__(self, model):
+        self.model = model
+        model_columns = model._columns.values()
+        self.partition_keys = [
+            c.db_field_name for c in model._partition_keys.values()
+        ]
+        self.clustering_keys = [
+            c.db_field_name for c in model._clustering_keys.values()
+        ]
+        self.static = set(c.db_field_name for c in model_columns if c.static)
+        self.columns = [c.db_field_name for c in model_columns]
+        self.counters = set(
+            c.db_field_name for c in model_columns
+            if isinstance(c, columns.Counter)
+        )
+        self.types = dict(
+            (c.db_field_name, c.cql_type) for c in model_columns
+        )
+        self.timeuuids = set(
+            c.db_field_name for c in model_columns
+            if isinstance(c, columns.TimeUUID)
+        )
+        self.descending = [
+            (c.clustering_order or '').upper() == 'DESC'
+            for c in model._clustering_keys.values()
+        ]
+        self.partitions = {}
+        self._tokens = {}
+
+    def comparable(self, field, value):
+        if field in self.timeuuids and value is not None:
+            return _timeuuid_key(value)
+        return value
+
+    def sort_key(self, clustering):
+        return tuple(
+            _Descending(self.comparable(f, v)) if desc else
+            self.comparable(f, v)
+            for f, v, desc in zip(
+                self.clustering_keys,
+                clustering,
+                self.descending,
+            )
+        )
+
+    def decode(self, row, fields=None):
+        """
+        Converts the stored values of a row, as written by the mapper, to
+        the values the driver would return for them.
+        """
+        decoded = {}
+        for field in fields or row:
+            value = row.get(field)
+            if value is not None:
+                cql_type = self.types[field]
+                value = cql_type.deserialize(
+                    cql_type.serialize(value, _PROTOCOL_VERSION),
+                    _PROTOCOL_VERSION,
+                )
+            decoded[field] = value
+        return decoded
+
+    def token(self, partition_key):
+        token = self._tokens.get(partition_key)
+        if token is None:
+            parts = self.model._routing_key_from_values(
+                list(partition_key),
+                _PROTOCOL_VERSION,
+            )
+            if len(parts) == 1:
+                routing_key = parts[0]
+            else:
+                # composite partition keys, as serialized by the driver
+                routing_key = b''.join(
+                    struct.pack('>H%dsB' % len(p), len(p), p, 0)
+                    for p in parts
+                )
+            token = self._tokens[partition_key] = Murmur3Token.hash_fn(
+                routing_key
+            )
+        return token
+
+
+def _unquote(value):
+    if isinstance(value, ValueQuoter):
+        return value.value
+    return value
+
+
+def _empty(value):
+    return value is None or (
+        isinstance(value, (set, frozenset, list, tuple, dict)) and not value
+    )
+
+
+class MemoryConnection(ConnectionInterface):
+    """
+    Connection running the statements generated by the mapper against an
+    in-process store, for tests and simulations which have no cluster.
+
+    .. code-block:: python
+
+        conn = MemoryConnection()
+        User.create(conn, id=1, name='a')
+        User.objects(id=1).get(conn)
+
+    The statement objects built by the mapper are interpreted, raw CQL
+    strings are not supported. The supported subset covers:
+
+    * SELECT with partition key, clustering and token restrictions (``=``,
+      ``IN``, ranges, ``CONTAINS``), ORDER BY, LIMIT, COUNT and DISTINCT,
+    * INSERT, UPDATE and DELETE, including collection updates, counters,
+      TTLs and write timestamps (last write wins),
+    * conditional writes (IF, IF EXISTS, IF NOT EXISTS),
+    * batches, applied atomically, conditions being checked before any
+      write of the batch.
+
+    Partitions are scanned in token order and rows are kept sorted by
+    clustering key. Tables are created on first use from the model of the
+    statements. Unlike Cassandra, restrictions requiring ALLOW FILTERING or
+    a secondary index are always accepted.
+
+    :param clock: (optional) returns the current time in seconds, used for
+        TTLs and write timestamps
+    :type clock: callable
+    """
+
+    def __init__(self, clock=None):
+        self.clock = clock or time.time
+        self._tables = {}
+        self._last_timestamp = 0
+        self._lock = threading.RLock()
+
+    def register(self, model):
+        """Creates the table of a model, if it doesn't exist yet."""
+        with self._lock:
+            table = self._tables.get(model.column_family_name())
+            if table is None:
+                table = _Table(model)
+                self._tables[model.column_family_name()] = table
+            return table
+
+    def truncate(self, model):
+        """Removes all the rows of a model's table."""
+        with self._lock:
+            self.register(model).partitions.clear()
+
+    def clear(self):
+        """Drops every table."""
+        with self._lock:
+            self._tables.clear()
+
+    def _table(self, statement, model):
+        if model is not None:
+            return self.register(model)
+        try:
+            return self._tables[statement.table]
+        except KeyError:
+            raise MemoryConnectionException(
+                "Unknown table {0}, pass the model of the statement or "
+                "register it first".format(statement.table)
+            )
+
+    def _timestamp(self, statement=None):
+        if statement is not None and statement.timestamp:
+            return statement.timestamp_normalized
+        timestamp = max(int(self.clock() * 1e6), self._last_timestamp + 1)
+        self._last_timestamp = timestamp
+        return timestamp
+
+    def execute(self, query, params=None, consistency_level=None,
+                timeout=None, verify_applied=False, model=None, **kwargs):
+        if isinstance(query, DMLQuery):
+            result = None
+            for statement in (query.statement, query.cleanup_statement):
+                if not statement:
+                    continue
+                statement_result = self._execute(statement, query.model)
+                if query.check_applied:
+                    check_applied(statement_result)
+                if statement is query.statement:
+                    result = statement_result
+            return result
+        if not isinstance(query, BaseCQLStatement):
+            raise MemoryConnectionException(
+                "MemoryConnection only executes mapper statements, "
+                "got {0!r}".format(query)
+            )
+        result = self._execute(query, model)
+        if verify_applied:
+            check_applied(result)
+        return result
+
+    def execute_batch_statements(self, batch):
+        """Applies the statements of a batch atomically."""
+        with self._lock:
+            statements = [
+                (statement, self._table(statement, model))
+                for statement, model in zip(batch.queries, batch._models)
+            ]
+            now = self.clock()
+            conditional = False
+            for statement, table in statements:
+                if (getattr(statement, 'conditionals', None) or
+                        getattr(statement, 'if_exists', False) or
+                        getattr(statement, 'if_not_exists', False)):
+                    conditional = True
+                    result = self._check(table, statement, now)
+                    if result is not None:
+                        raise LWTException(result[0])
+            timestamp = batch._timestamp_normalized()
+            for statement, table in statements:
+                self._write(
+                    table,
+                    statement,
+                    now,
+                    statement.timestamp_normalized or timestamp or
+                    self._timestamp(),
+                    check=False,
+                )
+            return _LWTResult(True) if conditional else []
+
+    def _execute(self, statement, model):
+        with self._lock:
+            table = self._table(statement, model)
+            now = self.clock()
+            if isinstance(statement, SelectStatement):
+                return self._select(table, statement, now)
+            return self._write(
+                table,
+                statement,
+                now,
+                self._timestamp(statement),
+            )
+
+    # reads
+
+    def _live(self, cell, row, partition, now):
+        if cell is None or cell.value is None:
+            return False
+        if cell.expires is not None and cell.expires <= now:
+            return False
+        for deleted_at in (row.deleted_at, partition.deleted_at):
+            if deleted_at is not None and cell.timestamp <= deleted_at:
+                return False
+        return True
+
+    def _cell_value(self, row, partition, field, now):
+        cell = row.cells.get(field)
+        if self._live(cell, row, partition, now):
+            return cell.value
+        return None
+
+    def _row_live(self, table, partition, row, now):
+        marker = row.marker
+        if marker is not None:
+            marker_cell = _Cell(True, marker[0], marker[1])
+            if self._live(marker_cell, row, partition, now):
+                return True
+        return any(
+            self._live(cell, row, partition, now)
+            for cell in row.cells.values()
+        )
+
+    def _static_live(self, partition, now):
+        static = partition.static
+        return any(
+            self._live(cell, static, partition, now)
+            for cell in static.cells.values()
+        )
+
+    def _row_values(self, table, partition_key, partition, clustering, row,
+                    now):
+        values = dict(zip(table.partition_keys, partition_key))
+        values.update(zip(table.clustering_keys, clustering))
+        for field in table.columns:
+            if field in values:
+                continue
+            if field in table.static:
+                value = self._cell_value(
+                    partition.static,
+                    partition,
+                    field,
+                    now,
+                )
+            elif row is not None:
+                value = self._cell_value(row, partition, field, now)
+            else:
+                value = None
+            values[field] = value
+        return values
+
+    def _bound(self, table, clause):
+        value = clause.value
+        if isinstance(value, Token):
+            key = tuple(
+                col.to_database(v)
+                for col, v in zip(value._columns, value.value)
+            )
+            return table.token(key)
+        if isinstance(value, MinTimeUUID):
+            return min_uuid_from_time(value.to_database(value.value) / 1e3)
+        if isinstance(value, MaxTimeUUID):
+            return max_uuid_from_time(value.to_database(value.value) / 1e3)
+        if isinstance(value, QueryValue):
+            raise MemoryConnectionException(
+                "Unsupported query function {0!r}".format(value)
+            )
+        return value
+
+    def _matches(self, table, clause, values, partition_key):
+        operator = clause.operator
+        bound = self._bound(table, clause)
+        if clause.field.startswith('token('):
+            field = None
+            actual = table.token(partition_key)
+        else:
+            field = clause.field
+            actual = values.get(field)
+
+        if isinstance(operator, InOperator):
+            return actual in bound
+        if isinstance(operator, ContainsOperator):
+            if isinstance(actual, dict):
+                return bound in actual.values()
+            return actual is not None and bound in actual
+        if isinstance(operator, EqualsOperator):
+            return actual == bound
+        if isinstance(operator, NotEqualsOperator):
+            return actual != bound
+        if actual is None:
+            return False
+        if field is not None:
+            actual = table.comparable(field, actual)
+            bound = table.comparable(field, bound)
+        if isinstance(operator, GreaterThanOperator):
+            return actual > bound
+        if isinstance(operator, GreaterThanOrEqualOperator):
+            return actual >= bound
+        if isinstance(operator, LessThanOperator):
+            return actual < bound
+        if isinstance(operator, LessThanOrEqualOperator):
+            return actual <= bound
+        raise MemoryConnectionException(
+            "Unsupported operator {0}".format(operator)
+        )
+
+    def _key_values(self, table, clauses, fields):
+        """
+        Returns the combinations of values restricting ``fields`` with
+        equalities, or None if one of them isn't restricted this way.
+        """
+        restrictions = {}
+        for clause in clauses:
+            if type(clause.operator) is InOperator:
+                restrictions[clause.field] = list(clause.value)
+            elif type(clause.operator) is EqualsOperator:
+                restrictions[clause.field] = [self._bound(table, clause)]
+        if not all(f in restrictions for f in fields):
+            return None
+        return list(itertools.product(*(restrictions[f] for f in fields)))
+
+    def _partition_keys(self, table, where):
+        keys = self._key_values(table, where, table.partition_keys)
+        if keys is None:
+            return sorted(table.partitions, key=table.token)
+        return keys
+
+    def _select(self, table, statement, now):
+        where = statement.where_clauses
+        clustering_restricted = any(
+            w.field in table.clustering_keys for w in where
+        )
+        rows = []
+        for partition_key in self._partition_keys(table, where):
+            partition = table.partitions.get(partition_key)
+            if partition is None:
+                continue
+            if statement.distinct_fields:
+                if self._static_live(partition, now) or any(
+                        self._row_live(table, partition, row, now)
+                        for row in partition.rows.values()):
+                    rows.append(self._row_values(
+                        table,
+                        partition_key,
+                        partition,
+                        (),
+                        None,
+                        now,
+                    ))
+                continue
+            found = False
+            for clustering in partition.clusterings:
+                row = partition.rows[clustering]
+                if not self._row_live(table, partition, row, now):
+                    continue
+                values = self._row_values(
+                    table,
+                    partition_key,
+                    partition,
+                    clustering,
+                    row,
+                    now,
+                )
+                if all(self._matches(table, w, values, partition_key)
+                       for w in where):
+                    rows.append(values)
+                found = True
+            if (not found and not clustering_restricted and
+                    self._static_live(partition, now)):
+                # partitions with only static values still have a row
+                values = self._row_values(
+                    table,
+                    partition_key,
+                    partition,
+                    (None,) * len(table.clustering_keys),
+                    None,
+                    now,
+                )
+                if all(self._matches(table, w, values, partition_key)
+                       for w in where):
+                    rows.append(values)
+
+        if statement.order_by and not statement.count:
+            rows.sort(key=self._order_key(table, statement.order_by))
+        if statement.limit:
+            rows = rows[:statement.limit]
+        if statement.count:
+            return [{'count': len(rows)}]
+        fields = statement.distinct_fields or statement.fields
+        return [table.decode(row, fields) for row in rows]
+
+    def _order_key(self, table, order_by):
+        ordering = []
+        for order in order_by:
+            match = _ORDER.match(six.text_type(order).strip())
+            if match is None:
+                raise MemoryConnectionException(
+                    "Unsupported ordering {0}".format(order)
+                )
+            descending = (match.group('direction') or '').upper() == 'DESC'
+            ordering.append((match.group('field'), descending))
+        # Cassandra only orders rows in their clustering order or in its
+        # reverse, whatever columns are listed
+        field, descending = ordering[0]
+        if field not in table.clustering_keys:
+            raise MemoryConnectionException(
+                "Can't order by {0}, only by clustering keys".format(field)
+            )
+        reverse = descending != table.descending[
+            table.clustering_keys.index(field)
+        ]
+        ordering = [
+            (f, natural != reverse)
+            for f, natural in zip(table.clustering_keys, table.descending)
+        ]
+
+        def key(row):
+            return tuple(
+                _Descending(table.comparable(f, row[f])) if descending else
+                table.comparable(f, row[f])
+                for f, descending in ordering
+            )
+        return key
+
+    # writes
+
+    def _set(self, row, field, value, timestamp, expires):
+        cell = row.cells.get(field)
+        if cell is not None and cell.timestamp > timestamp:
+            return
+        if _empty(value):
+            value = None
+        row.cells[field] = _Cell(value, timestamp, expires)
+
+    def _target(self, table, partition, row, field):
+        if field in table.static:
+            return partition.static
+        if row is None:
+            raise MemoryConnectionException(
+                "Missing clustering key to write {0}".format(field)
+            )
+        return row
+
+    def _rows(self, table, statement, partition_key):
+        """
+        Returns the clustering keys targeted by a write, or None for the
+        whole partition.
+        """
+        clauses = [
+            w for w in statement.where_clauses
+            if w.field in table.clustering_keys
+        ]
+        if not clauses:
+            return None
+        keys = self._key_values(table, clauses, table.clustering_keys)
+        if keys is not None:
+            return keys
+        partition = table.partitions.get(partition_key)
+        if partition is None:
+            return []
+        matching = []
+        for clustering in partition.clusterings:
+            values = dict(zip(table.clustering_keys, clustering))
+            if all(self._matches(table, w, values, partition_key)
+                   for w in clauses):
+                matching.append(clustering)
+        return matching
+
+    def _targets(self, table, statement):
+        if isinstance(statement, InsertStatement):
+            values = dict((a.field, a.value) for a in statement.assignments)
+            partition_key = tuple(values.get(f) for f in table.partition_keys)
+            clustering = tuple(values.get(f) for f in table.clustering_keys)
+            if any(v is None for v in clustering):
+                clustering = None
+            return [(partition_key, clustering)]
+        partition_keys = self._key_values(
+            table,
+            statement.where_clauses,
+            table.partition_keys,
+        )
+        if partition_keys is None:
+            raise MemoryConnectionException(
+                "Writes must restrict the whole partition key: {0}".format(
+                    statement
+                )
+            )
+        targets = []
+        for partition_key in partition_keys:
+            if not table.clustering_keys:
+                targets.append((partition_key, ()))
+                continue
+            clusterings = self._rows(table, statement, partition_key)
+            if clusterings is None:
+                targets.append((partition_key, None))
+            else:
+                targets.extend((partition_key, c) for c in clusterings)
+        return targets
+
+    def _check(self, table, statement, now):
+        """
+        Checks the conditions of a conditional write, returns the result of
+        the write if they don't hold.
+        """
+        for partition_key, clustering in self._targets(table, statement):
+            partition = table.partitions.get(partition_key)
+            row = None
+            if partition is not None and clustering is not None:
+                row = partition.rows.get(clustering)
+            exists = partition is not None and (
+                (row is not None and
+                 self._row_live(table, partition, row, now)) or
+                (clustering is None and self._static_live(partition, now))
+            )
+            existing = {}
+            if exists:
+                existing = self._row_values(
+                    table,
+                    partition_key,
+                    partition,
+                    clustering or (None,) * len(table.clustering_keys),
+                    row,
+                    now,
+                )
+            if getattr(statement, 'if_not_exists', False):
+                if exists:
+                    return _LWTResult(False, table.decode(existing))
+                continue
+            if getattr(statement, 'if_exists', False) and not exists:
+                return _LWTResult(False)
+            conditionals = getattr(statement, 'conditionals', None) or []
+            if conditionals and not exists:
+                return _LWTResult(False)
+            for clause in conditionals:
+                if not hasattr(clause, 'operator'):
+                    holds = existing.get(clause.field) == clause.value
+                else:
+                    holds = self._matches(
+                        table,
+                        clause,
+                        existing,
+                        partition_key,
+                    )
+                if not holds:
+                    return _LWTResult(False, table.decode(
+                        existing,
+                        [c.field for c in conditionals],
+                    ))
+        return None
+
+    def _write(self, table, statement, now, timestamp, check=True):
+        conditional = (
+            getattr(statement, 'conditionals', None) or
+            getattr(statement, 'if_exists', False) or
+            getattr(statement, 'if_not_exists', False)
+        )
+        if check and conditional:
+            result = self._check(table, statement, now)
+            if result is not None:
+                return result
+
+        ttl = getattr(statement, 'ttl', None)
+        expires = now + ttl if ttl else None
+        context = dict(
+            (k, _unquote(v)) for k, v in statement.get_context().items()
+        )
+        for partition_key, clustering in self._targets(table, statement):
+            partition = table.partitions.get(partition_key)
+            if partition is None:
+                if isinstance(statement, DeleteStatement):
+                    if statement.fields or clustering is not None:
+                        continue
+                partition = table.partitions[partition_key] = _Partition()
+            row = None
+            if clustering is not None:
+                row = partition.row(table, clustering)
+
+            if isinstance(statement, InsertStatement):
+                self._insert(table, statement, partition, row, timestamp,
+                             expires)
+            elif isinstance(statement, UpdateStatement):
+                for clause in statement.assignments:
+                    self._update(table, clause, context, partition, row,
+                                 timestamp, expires, now)
+            elif isinstance(statement, DeleteStatement):
+                self._delete(table, statement, context, partition, row,
+                             timestamp, now)
+        if conditional:
+            return _LWTResult(True)
+        return []
+
+    def _insert(self, table, statement, partition, row, timestamp, expires):
+        keys = set(table.partition_keys) | set(table.clustering_keys)
+        if row is not None:
+            row.marker = (timestamp, expires)
+        for clause in statement.assignments:
+            if clause.field in keys:
+                continue
+            target = self._target(table, partition, row, clause.field)
+            self._set(target, clause.field, clause.value, timestamp, expires)
+
+    def _update(self, table, clause, context, partition, row, timestamp,
+                expires, now):
+        for fragment in six.text_type(clause).split(', '):
+            if not fragment:
+                continue
+            match = (
+                _ASSIGN.match(fragment) or
+                _APPEND.match(fragment) or
+                _PREPEND.match(fragment) or
+                _ITEM.match(fragment)
+            )
+            if match is None:
+                raise MemoryConnectionException(
+                    "Unsupported assignment {0}".format(fragment)
+                )
+            field = match.group('field')
+            target = self._target(table, partition, row, field)
+            value = context.get(match.group('value'))
+            current = self._cell_value(target, partition, field, now)
+            pattern = match.re
+
+            if pattern is _ASSIGN:
+                new = value
+            elif pattern is _PREPEND:
+                new = list(value) + list(current or [])
+            elif pattern is _APPEND:
+                adding = match.group('op') == '+'
+                new = self._combine(table, field, current, value, adding)
+            else:
+                new = self._set_item(current, match, context, value)
+            self._set(target, field, copy.deepcopy(new), timestamp, expires)
+
+    def _combine(self, table, field, current, value, adding):
+        if field in table.counters:
+            return (current or 0) + (value if adding else -value)
+        if isinstance(value, dict):
+            new = dict(current or {})
+            new.update(value)
+            return new
+        if isinstance(value, (set, frozenset)):
+            current = set(current or ())
+            return current | value if adding else current - value
+        current = list(current or [])
+        if adding:
+            return current + list(value)
+        return [v for v in current if v not in value]
+
+    def _set_item(self, current, match, context, value):
+        if match.group('index') is not None:
+            new = list(current or [])
+            index = int(match.group('index'))
+            if index >= len(new):
+                raise MemoryConnectionException(
+                    "List index {0} out of bound".format(index)
+                )
+            new[index] = value
+            return new
+        new = dict(current or {})
+        new[context[match.group('key')]] = value
+        return new
+
+    def _delete(self, table, statement, context, partition, row, timestamp,
+                now):
+        if not statement.fields:
+            if row is not None:
+                row.deleted_at = max(row.deleted_at or 0, timestamp)
+            else:
+                partition.deleted_at = max(
+                    partition.deleted_at or 0,
+                    timestamp,
+                )
+            return
+        for clause in statement.fields:
+            for fragment in six.text_type(clause).split(', '):
+                match = _FIELD.match(fragment) or _ITEM.match(fragment)
+                if match is None:
+                    raise MemoryConnectionException(
+                        "Unsupported deletion {0}".format(fragment)
+                    )
+                field = match.group('field')
+                target = self._target(table, partition, row, field)
+                if match.re is _FIELD:
+                    self._set(target, field, None, timestamp, None)
+                    continue
+                current = self._cell_value(target, partition, field, now)
+                if match.group('index') is not None:
+                    new = list(current or [])
+                    index = int(match.group('index'))
+                    if index < len(new):
+                        del new[index]
+                else:
+                    new = dict(current or {})
+                    new.pop(context[match.group('key')], None)
+                self._set(target, field, new, timestamp, None)
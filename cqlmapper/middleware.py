@@ -0,0 +1,255 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from contextlib import contextmanager
+import threading
+from timeit import default_timer
+
+import six
+
+from cqlmapper.statements import (
+    DeleteStatement,
+    InsertStatement,
+    SelectStatement,
+    UpdateStatement,
+)
+
+_scoped = threading.local()
+
+# phases of the execution of a statement, in order
+PHASES = (
+    'clone',
+    'statement',
+    'render',
+    'bind',
+    'execute',
+    'paging',
+    'hydrate',
+)
+
+SELECT = 'select'
+INSERT = 'insert'
+UPDATE = 'update'
+DELETE = 'delete'
+BATCH = 'batch'
+SCHEMA = 'schema'
+OTHER = 'other'
+
+_STATEMENT_OPERATIONS = (
+    (SelectStatement, SELECT),
+    (InsertStatement, INSERT),
+    (UpdateStatement, UPDATE),
+    (DeleteStatement, DELETE),
+)
+
+_KEYWORD_OPERATIONS = {
+    'SELECT': SELECT,
+    'INSERT': INSERT,
+    'UPDATE': UPDATE,
+    'DELETE': DELETE,
+    'BEGIN': BATCH,
+    'CREATE': SCHEMA,
+    'ALTER': SCHEMA,
+    'DROP': SCHEMA,
+    'TRUNCATE': SCHEMA,
+}
+
+
+def statement_operation(statement):
+    """
+    Returns the kind of operation performed by a statement object or CQL
+    string: ``select``, ``insert``, ``update``, ``delete``, ``batch``,
+    ``schema`` or ``other``.
+    """
+    for statement_type, operation in _STATEMENT_OPERATIONS:
+        if isinstance(statement, statement_type):
+            return operation
+    if not isinstance(statement, six.string_types):
+        statement = getattr(statement, 'query_string', '')
+    words = statement.split(None, 1)
+    if not words:
+        return OTHER
+    return _KEYWORD_OPERATIONS.get(words[0].upper(), OTHER)
+
+
+def scoped_middleware():
+    """Returns the middlewares installed by :func:`scoped` in the current
+    thread.
+    """
+    return getattr(_scoped, 'middleware', ())
+
+
+@contextmanager
+def scoped(middleware):
+    """
+    Runs ``middleware`` on every connection, after their own middlewares,
+    for the statements executed by the current thread within the block.
+    """
+    previous = scoped_middleware()
+    _scoped.middleware = previous + (middleware,)
+    try:
+        yield middleware
+    finally:
+        _scoped.middleware = previous
+
+
+class ExecutionContext(object):
+    """
+    Describes a statement going through the middleware chain of a
+    :class:`cqlmapper.connection.Connection`.
+
+    ``source`` is what was passed to the connection (a mapper statement,
+    a model query or a CQL string) and ``statement`` the driver statement
+    built from it. Middlewares may change ``statement``, ``params``,
+    ``timeout`` or ``session`` (to route the statement to another driver
+    session), or set ``trace`` to turn on request tracing, before calling
+    the next middleware.
+
+    ``timings`` holds the number of seconds spent in each phase (see
+    ``PHASES``):
+
+    * ``clone``: cloning and filtering the queryset,
+    * ``statement``: building the mapper statement,
+    * ``render``: rendering it to CQL,
+    * ``bind``: collecting its bound values and routing key,
+    * ``execute``: the driver round trip for the first page,
+    * ``paging``: waiting for the following pages while iterating,
+    * ``hydrate``: constructing model instances from the rows.
+
+    Paging and hydration happen once the chain has returned, as the caller
+    consumes the results; their time and the number of ``rows`` hydrated
+    are added to the context as it goes. Callbacks registered with
+    :meth:`on_finish` are called once the statement has been executed,
+    callbacks registered with :meth:`on_complete` once every phase is over.
+
+    :param model: the model class the statement was built for, if any
+    :param operation: the kind of operation, see
+        :func:`statement_operation`
+    :type operation: str
+    :param lazy: (Defaults to False) the results are consumed by the
+        caller, which calls :meth:`complete` once it is done
+    :type lazy: bool
+    """
+
+    def __init__(self, model=None, operation=None, source=None, lazy=False):
+        self.model = model
+        self.operation = operation
+        self.source = source
+        self.lazy = lazy
+        self.statement = None
+        self.params = None
+        self.timeout = None
+        self.session = None
+        self.trace = False
+        self.result = None
+        self.error = None
+        self.rows = 0
+        self.timings = dict((phase, 0.0) for phase in PHASES)
+        # free for middlewares to use
+        self.tags = {}
+        self._finish_callbacks = []
+        self._complete_callbacks = []
+        self._finished = False
+        self._completed = False
+
+    def __repr__(self):
+        return '<ExecutionContext {0} {1}>'.format(
+            self.operation,
+            self.query_string,
+        )
+
+    @property
+    def query_string(self):
+        return getattr(self.statement, 'query_string', None)
+
+    @property
+    def consistency_level(self):
+        return getattr(self.statement, 'consistency_level', None)
+
+    @property
+    def bound_count(self):
+        """Number of values bound to the statement."""
+        return len(self.params or ())
+
+    @property
+    def table(self):
+        if self.model is not None:
+            return self.model.column_family_name()
+        return None
+
+    def on_finish(self, fn):
+        """Registers a function called with the context once the statement
+        has been executed (or failed).
+        """
+        self._finish_callbacks.append(fn)
+
+    def on_complete(self, fn):
+        """Registers a function called with the context once the results
+        of the statement have been consumed.
+        """
+        self._complete_callbacks.append(fn)
+
+    @property
+    def total_time(self):
+        return sum(self.timings.values())
+
+    def finish(self):
+        if self._finished:
+            return
+        self._finished = True
+        for fn in self._finish_callbacks:
+            fn(self)
+        if not self.lazy or self.error is not None:
+            self.complete()
+
+    def complete(self):
+        if self._completed:
+            return
+        self._completed = True
+        for fn in self._complete_callbacks:
+            fn(self)
+
+    def add_hydrate_time(self, seconds, rows=1):
+        self.timings['hydrate'] += seconds
+        self.rows += rows
+
+    def add_paging_time(self, seconds):
+        self.timings['paging'] += seconds
+
+    def hydrator(self, construct):
+        """Wraps a row constructor to account for the hydration time."""
+        def hydrate(row):
+            start = default_timer()
+            instance = construct(row)
+            self.add_hydrate_time(default_timer() - start)
+            return instance
+        return hydrate
+
+
+def timing_hook(fn):
+    """
+    Returns a middleware calling ``fn`` with the context of every statement
+    once all its phases are over, to collect ``context.timings``.
+
+    .. code-block:: python
+
+        def log_timings(context):
+            log.info("%s %r", context.query_string, context.timings)
+
+        conn.add_middleware(timing_hook(log_timings))
+    """
+    def middleware(context, call_next):
+        context.on_complete(fn)
+        return call_next(context)
+    return middleware
@@ -0,0 +1,286 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Copy of a table to another one, possibly of another model or cluster.
+
+.. code-block:: python
+
+    def rekey(event):
+        return {'day': event.created.date(), 'id': event.id,
+                'payload': event.payload}
+
+    copy_table(
+        old_conn, Event,
+        new_conn, EventByDay,
+        transform=rekey,
+        concurrency=16,
+        checkpoint='/var/lib/app/events.checkpoint',
+    )
+
+The source is scanned by token ranges, see :mod:`cqlmapper.scan`, and the
+rows of a range are written in unlogged batches grouping the rows of a
+destination partition. Each completed range is recorded in the checkpoint
+file, copying again with the same checkpoint skips them.
+
+Writes are inserts: the TTLs and write times of the source rows are not
+carried over, and rows deleted from the source after being copied are not
+deleted from the destination.
+"""
+
+from collections import OrderedDict
+import json
+import logging
+import os
+import tempfile
+from timeit import default_timer
+
+from cqlmapper import CQLEngineException
+from cqlmapper.batch import Batch, execute_batches
+from cqlmapper.query import BatchType
+from cqlmapper.scan import iter_range_rows, scan_ranges, split_ring
+
+log = logging.getLogger(__name__)
+
+FORMAT = 'cqlmapper-copy'
+VERSION = 1
+
+# rows of a token range buffered before being written
+CHUNK_ROWS = 1000
+
+
+class MigrationException(CQLEngineException):
+    pass
+
+
+class CopyResult(object):
+    """Counters of a copy."""
+
+    def __init__(self):
+        self.ranges = 0
+        self.skipped_ranges = 0
+        self.read = 0
+        self.written = 0
+        self.dropped = 0
+        self.elapsed = 0.0
+
+    @property
+    def throughput(self):
+        """Rows written per second."""
+        return self.written / self.elapsed if self.elapsed else 0.0
+
+    def __repr__(self):
+        return (
+            '<CopyResult ranges={0} skipped_ranges={1} read={2} written={3} '
+            'dropped={4} {5:.1f} rows/s>'.format(
+                self.ranges,
+                self.skipped_ranges,
+                self.read,
+                self.written,
+                self.dropped,
+                self.throughput,
+            )
+        )
+
+
+class _Checkpoint(object):
+    """The token ranges copied, saved to a JSON file after each range."""
+
+    def __init__(self, path, source, destination, splits):
+        self.path = path
+        self.state = {
+            'format': FORMAT,
+            'version': VERSION,
+            'source': source,
+            'destination': destination,
+            'splits': splits,
+            'done': [],
+        }
+        self.done = set()
+        if path is not None and os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        with open(self.path) as f:
+            saved = json.load(f)
+        if saved.get('format') != FORMAT or saved.get('version', 0) > VERSION:
+            raise MigrationException(
+                "{0} isn't a copy checkpoint".format(self.path)
+            )
+        for key in ('source', 'destination', 'splits'):
+            if saved.get(key) != self.state[key]:
+                raise MigrationException(
+                    "The checkpoint {0} was written for another copy, its "
+                    "{1} is {2!r} instead of {3!r}".format(
+                        self.path,
+                        key,
+                        saved.get(key),
+                        self.state[key],
+                    )
+                )
+        self.done = set(tuple(r) for r in saved['done'])
+
+    def add(self, token_range):
+        self.done.add(tuple(token_range))
+        if self.path is None:
+            return
+        self.state['done'] = sorted(self.done)
+        directory = os.path.dirname(os.path.abspath(self.path))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.state, f)
+            os.rename(tmp, self.path)
+        except Exception:
+            os.unlink(tmp)
+            raise
+
+
+def _copy_values(src_model, dst_model):
+    names = [name for name in dst_model._columns if name in src_model._columns]
+
+    def transform(instance):
+        return dict((name, getattr(instance, name)) for name in names)
+    return transform
+
+
+def _destination_values(dst_model, output):
+    """
+    Returns the values of the rows a transform returned: None, a dict of
+    values, a destination model instance, or a list of those.
+    """
+    if output is None:
+        return []
+    if isinstance(output, (dict, dst_model)):
+        output = [output]
+    values = []
+    for row in output:
+        if isinstance(row, dst_model):
+            row = dict(
+                (name, getattr(row, name)) for name in dst_model._columns
+            )
+        elif not isinstance(row, dict):
+            raise MigrationException(
+                "The transform returned {0!r}, expected a dict or a {1} "
+                "instance".format(row, dst_model.__name__)
+            )
+        values.append(row)
+    return values
+
+
+def copy_table(src_conn, src_model, dst_conn, dst_model, transform=None,
+               concurrency=4, splits=64, checkpoint=None,
+               write_concurrency=4, max_batch_size=50):
+    """
+    Copies the rows of a table to the table of ``dst_model``.
+
+    :param src_conn: the connection reading the source table
+    :param src_model: the model or the queryset to copy
+    :param dst_conn: the connection writing the destination table, can be
+        ``src_conn``
+    :param dst_model: the model of the destination table
+    :param transform: (optional) called with each source row, as a
+        ``src_model`` instance, returns the values of the destination row
+        as a dict or a ``dst_model`` instance, a list of those, or None to
+        drop the row. Defaults to copying the columns of the same name.
+    :type transform: callable
+    :param concurrency: the number of token ranges copied at once
+    :type concurrency: int
+    :param splits: the number of token ranges the ring is split in
+    :type splits: int
+    :param checkpoint: (optional) the path of the file recording the
+        ranges copied
+    :type checkpoint: str
+    :param write_concurrency: the number of batches executed at once per
+        token range
+    :type write_concurrency: int
+    :param max_batch_size: the maximum number of rows per batch
+    :type max_batch_size: int
+    :rtype: CopyResult
+    """
+    queryset = src_model
+    if not hasattr(queryset, '_iter_rows'):
+        queryset = queryset.objects.all()
+    src_model = queryset.model
+    if dst_model._has_counter:
+        raise MigrationException(
+            "Counter tables can't be copied, {0} has counter "
+            "columns".format(dst_model.__name__)
+        )
+    if transform is None:
+        transform = _copy_values(src_model, dst_model)
+
+    progress = _Checkpoint(
+        checkpoint,
+        src_model.column_family_name(),
+        dst_model.column_family_name(),
+        splits,
+    )
+    result = CopyResult()
+
+    def partition(values):
+        return tuple(
+            column.to_database(values.get(name))
+            for name, column in dst_model._partition_keys.items()
+        )
+
+    def write(instances):
+        partitions = OrderedDict()
+        for instance in instances:
+            partitions.setdefault(partition(instance), []).append(instance)
+        batches = []
+        for rows in partitions.values():
+            for i in range(0, len(rows), max_batch_size):
+                batch = Batch(dst_conn, batch_type=BatchType.Unlogged)
+                for values in rows[i:i + max_batch_size]:
+                    dst_model(**values).save(batch)
+                batches.append(batch)
+        execute_batches(batches, write_concurrency)
+
+    def copy_range(token_range):
+        read = dropped = written = 0
+        rows = []
+        for row in iter_range_rows(src_conn, queryset, token_range):
+            read += 1
+            values = _destination_values(
+                dst_model,
+                transform(src_model._construct_instance(row)),
+            )
+            if not values:
+                dropped += 1
+            rows.extend(values)
+            if len(rows) >= CHUNK_ROWS:
+                write(rows)
+                written += len(rows)
+                rows = []
+        write(rows)
+        written += len(rows)
+        return read, dropped, written
+
+    start = default_timer()
+    ranges = [r for r in split_ring(splits) if tuple(r) not in progress.done]
+    result.skipped_ranges = splits - len(ranges)
+    try:
+        for token_range, counts in scan_ranges(copy_range, ranges,
+                                               concurrency):
+            progress.add(token_range)
+            result.ranges += 1
+            result.read += counts[0]
+            result.dropped += counts[1]
+            result.written += counts[2]
+    finally:
+        result.elapsed = default_timer() - start
+    log.info("Copied %s to %s: %r", src_model.__name__, dst_model.__name__,
+             result)
+    return result
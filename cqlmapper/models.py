@@ -12,6 +12,7 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+import copy
 import logging
 import re
 import six
@@ -19,6 +20,8 @@ from warnings import warn
 
 from cqlmapper import CQLEngineException, ValidationError
 from cqlmapper import columns
+from cqlmapper.batch import Batch
+from cqlmapper.buffers import WriteBehindBuffer
 from cqlmapper import query
 from cqlmapper import TIMEOUT_NOT_SET
 from cqlmapper.query_set import DoesNotExist as _DoesNotExist
@@ -336,6 +339,10 @@ class BaseModel(object):
 
     __consistency__ = None  # can be set per query
 
+    __cache__ = None  # optional cache serving primary key lookups
+
+    __query_cache__ = None  # optional cache serving queryset reads
+
     _timestamp = None  # optional timestamp to include with the operation (USING TIMESTAMP)
 
     _if_not_exists = False  # optional if_not_exists flag to check existence before insertion
@@ -405,6 +412,50 @@ class BaseModel(object):
         instance._set_persisted()
         return instance
 
+    @classmethod
+    def _from_cached_values(cls, values):
+        """
+        method used to construct instances from values stored in the model
+        cache
+        """
+        instance = cls(**copy.deepcopy(values))
+        instance._set_persisted()
+        return instance
+
+    def _cached_values(self):
+        """Returns a copy of the column values to store in the model cache.
+        """
+        return copy.deepcopy(
+            dict((k, v.value) for k, v in self._values.items())
+        )
+
+    def _cache_key(self):
+        return tuple(
+            col.to_database(getattr(self, name))
+            for name, col in self._primary_keys.items()
+        )
+
+    def _invalidate_cache(self, conn):
+        """Drops the model cache entry of this instance and the query cache
+        entries of its table.
+
+        When writing through a batch or a write-behind buffer, the entries
+        are dropped again once the write has been executed.
+        """
+        query_cache = self.__query_cache__
+        if query_cache is not None:
+            table = self.column_family_name()
+            query_cache.invalidate_table(table)
+            if isinstance(conn, (Batch, WriteBehindBuffer)):
+                conn.add_callback(query_cache.invalidate_table, table)
+        cache = self.__cache__
+        if cache is None:
+            return
+        key = self._cache_key()
+        cache.invalidate(key)
+        if isinstance(conn, (Batch, WriteBehindBuffer)):
+            conn.add_callback(cache.invalidate, key)
+
     def _set_persisted(self):
         for v in self._values.values():
             v.reset_previous_value()
@@ -632,7 +683,10 @@ class BaseModel(object):
             timeout=self._timeout,
             if_exists=self._if_exists
         )
-        self._execute_query(conn, q)
+        try:
+            self._execute_query(conn, q)
+        finally:
+            self._invalidate_cache(conn)
 
         self._set_persisted()
         self._timestamp = None
@@ -687,7 +741,10 @@ class BaseModel(object):
             timeout=self._timeout,
             if_exists=self._if_exists
         )
-        self._execute_query(conn, q)
+        try:
+            self._execute_query(conn, q)
+        finally:
+            self._invalidate_cache(conn)
         self._set_persisted()
         self._timestamp = None
 
@@ -704,7 +761,10 @@ class BaseModel(object):
             conditional=self._conditional,
             if_exists=self._if_exists
         )
-        self._execute_query(conn, q)
+        try:
+            self._execute_query(conn, q)
+        finally:
+            self._invalidate_cache(conn)
 
     def get_changed_columns(self):
         """Returns a list of the columns that have been updated since
@@ -902,3 +962,15 @@ class Model(BaseModel):
     """
     *Optional* Setting False disables computing the routing key for TokenAwareRouting
     """
+
+    __cache__ = None
+    """
+    *Optional* A :class:`~cqlmapper.cache.LRUCache` used to serve :meth:`get` lookups on the full primary key from memory.
+    Entries are invalidated when the row is written through the model or its queryset.
+    """
+
+    __query_cache__ = None
+    """
+    *Optional* A :class:`~cqlmapper.cache.QueryCache` used to serve queryset reads from memory.
+    Every result cached for the table is dropped when the table is written through the model or its queryset.
+    """
@@ -0,0 +1,417 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Paging of driver result sets.
+
+:func:`prefetch` iterates over the rows of a result while fetching the
+following pages in the background, see
+:meth:`cqlmapper.query_set.ModelQuerySet.prefetch`. The pages of a
+statement can only be requested one after the other, each request carries
+the paging state of the previous page. Prefetching requests the next page
+as soon as the previous one arrived, from the callbacks of the driver's
+``ResponseFuture``, until ``depth`` pages are waiting to be consumed.
+
+:class:`AdaptiveFetchSize` is a connection middleware choosing the fetch
+size of selects from the size of the rows and the latency of the pages
+they returned before.
+
+:class:`Page` is a page of the keyset pagination of a partition by its
+clustering keys, see
+:meth:`cqlmapper.query_set.ModelQuerySet.paginate_by_clustering`.
+"""
+
+import base64
+from collections import deque
+import struct
+import threading
+
+from cassandra.query import FETCH_SIZE_UNSET
+
+from cqlmapper import CQLEngineException
+from cqlmapper.query import QueryException
+from cqlmapper.stats import _result_rows, _row_size, fingerprint
+
+
+class _Pages(object):
+    """The pages of a response future fetched ahead of the consumer."""
+
+    def __init__(self, future, depth):
+        self.future = future
+        self.depth = depth
+        self.pages = deque()
+        self.fetching = False
+        self.closed = False
+        self.error = None
+        self._cond = threading.Condition()
+
+    def _fetch(self):
+        # called with the condition held
+        if (self.fetching or self.closed or self.error is not None or
+                len(self.pages) >= self.depth or
+                not self.future.has_more_pages):
+            return
+        self.fetching = True
+        self.future.start_fetching_next_page()
+
+    def start(self):
+        with self._cond:
+            self._fetch()
+        self.future.add_callbacks(self._on_page, self._on_error)
+
+    def _on_page(self, rows):
+        # runs on the driver's event loop, or in start() when the page
+        # already arrived
+        with self._cond:
+            if not self.fetching:
+                return
+            self.fetching = False
+            self.pages.append(rows)
+            try:
+                self._fetch()
+            except Exception as e:
+                self.error = e
+            self._cond.notify_all()
+
+    def _on_error(self, exc):
+        with self._cond:
+            self.fetching = False
+            self.error = exc
+            self._cond.notify_all()
+
+    def next_page(self):
+        """Returns the next page, None once the result is exhausted."""
+        with self._cond:
+            while not self.pages and self.fetching and self.error is None:
+                self._cond.wait()
+            if self.pages:
+                page = self.pages.popleft()
+                self._fetch()
+                return page
+            if self.error is not None:
+                raise self.error
+            return None
+
+    def close(self):
+        with self._cond:
+            self.closed = True
+            self.pages.clear()
+
+
+def prefetch(result, depth):
+    """
+    Iterates over the rows of a driver ``ResultSet``, fetching up to
+    ``depth`` pages ahead of the page being consumed. Other results, like
+    the lists of the query cache, are iterated as is.
+
+    :param result: the result of the statement
+    :param depth: the number of pages fetched ahead
+    :type depth: int
+    """
+    future = getattr(result, 'response_future', None)
+    if not depth or future is None or not result.has_more_pages:
+        return iter(result)
+    return _iter_pages(result.current_rows, _Pages(future, depth))
+
+
+def _iter_pages(first_page, pages):
+    pages.start()
+    try:
+        page = first_page
+        while page is not None:
+            for row in page:
+                yield row
+            page = pages.next_page()
+    finally:
+        pages.close()
+
+
+class _FetchSizeState(object):
+    """Measurements of the pages returned for a statement fingerprint."""
+
+    def __init__(self, fetch_size):
+        self.fetch_size = fetch_size
+        self.pages = 0
+        self.rows = 0
+        self.bytes_per_row = None
+        self.seconds_per_row = None
+
+    def as_dict(self):
+        return {
+            'fetch_size': self.fetch_size,
+            'pages': self.pages,
+            'rows': self.rows,
+            'bytes_per_row': self.bytes_per_row,
+            'seconds_per_row': self.seconds_per_row,
+        }
+
+
+def _smooth(average, value, weight):
+    if average is None:
+        return value
+    return average + weight * (value - average)
+
+
+class AdaptiveFetchSize(object):
+    """
+    Connection middleware adjusting the fetch size of selects, per
+    statement fingerprint, so that their pages hold about
+    ``target_page_bytes`` and take about ``target_latency`` seconds.
+
+    .. code-block:: python
+
+        fetch_sizes = AdaptiveFetchSize(
+            target_page_bytes=512 * 1024,
+            target_latency=0.05,
+            max_fetch_size=5000,
+        )
+        conn.add_middleware(fetch_sizes)
+        ...
+        fetch_sizes.snapshot()
+
+    The size of the rows, estimated from their values, and the latency per
+    row are averaged over the first pages returned for a fingerprint. The
+    latency is only measured on full pages, the latency of shorter ones is
+    dominated by the round trip. Statements with an explicit fetch size,
+    see :meth:`cqlmapper.query_set.ModelQuerySet.fetch_size`, are left as
+    is.
+
+    :param target_page_bytes: (Defaults to 1MiB) the size of the pages
+        aimed at
+    :type target_page_bytes: int
+    :param target_latency: (Defaults to 0.1) the seconds per page aimed at,
+        None to only size pages by bytes
+    :type target_latency: float
+    :param min_fetch_size: the smallest fetch size used
+    :type min_fetch_size: int
+    :param max_fetch_size: the largest fetch size used
+    :type max_fetch_size: int
+    :param initial_fetch_size: the fetch size of fingerprints which haven't
+        been measured yet
+    :type initial_fetch_size: int
+    :param smoothing: (Defaults to 0.3) the weight of the last page in the
+        averages
+    :type smoothing: float
+    :param max_fingerprints: maximum number of fingerprints tracked,
+        statements of other fingerprints use ``initial_fetch_size``
+    :type max_fingerprints: int
+    """
+
+    def __init__(self, target_page_bytes=1024 * 1024, target_latency=0.1,
+                 min_fetch_size=10, max_fetch_size=5000,
+                 initial_fetch_size=1000, smoothing=0.3,
+                 max_fingerprints=5000):
+        if not 0 < min_fetch_size <= initial_fetch_size <= max_fetch_size:
+            raise CQLEngineException(
+                "Fetch sizes must satisfy 0 < min_fetch_size <= "
+                "initial_fetch_size <= max_fetch_size"
+            )
+        self.target_page_bytes = target_page_bytes
+        self.target_latency = target_latency
+        self.min_fetch_size = min_fetch_size
+        self.max_fetch_size = max_fetch_size
+        self.initial_fetch_size = initial_fetch_size
+        self.smoothing = smoothing
+        self.max_fingerprints = max_fingerprints
+        self._states = {}
+        self._fingerprints = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, context, call_next):
+        statement = context.statement
+        if (context.operation == 'select' and
+                getattr(statement, 'fetch_size', None) is FETCH_SIZE_UNSET):
+            key = self._fingerprint(context.query_string)
+            fetch_size = self.fetch_size(key)
+            statement.fetch_size = fetch_size
+            context.on_finish(
+                lambda context: self.record(context, key, fetch_size)
+            )
+        return call_next(context)
+
+    def _fingerprint(self, query_string):
+        try:
+            return self._fingerprints[query_string]
+        except KeyError:
+            pass
+        normalized = fingerprint(query_string)
+        if len(self._fingerprints) >= self.max_fingerprints * 4:
+            self._fingerprints.clear()
+        self._fingerprints[query_string] = normalized
+        return normalized
+
+    def fetch_size(self, key):
+        """Returns the fetch size of a statement fingerprint."""
+        state = self._states.get(key)
+        if state is None:
+            return self.initial_fetch_size
+        return state.fetch_size
+
+    def _target(self, state):
+        targets = []
+        if state.bytes_per_row:
+            targets.append(self.target_page_bytes / state.bytes_per_row)
+        if self.target_latency and state.seconds_per_row:
+            targets.append(self.target_latency / state.seconds_per_row)
+        if not targets:
+            return state.fetch_size
+        size = int(min(targets))
+        return max(self.min_fetch_size, min(self.max_fetch_size, size))
+
+    def record(self, context, key, fetch_size):
+        """Accounts for the first page returned for a statement.
+
+        :param context: the finished execution context
+        :type context: cqlmapper.middleware.ExecutionContext
+        :param key: the fingerprint of the statement
+        :param fetch_size: the fetch size the statement was executed with
+        """
+        if context.error is not None:
+            return
+        rows = _result_rows(context.result)
+        if not rows:
+            return
+        size = sum(_row_size(row) for row in rows)
+        with self._lock:
+            state = self._states.get(key)
+            if state is None:
+                if len(self._states) >= self.max_fingerprints:
+                    return
+                state = self._states[key] = _FetchSizeState(fetch_size)
+            state.pages += 1
+            state.rows += len(rows)
+            state.bytes_per_row = _smooth(
+                state.bytes_per_row,
+                size / float(len(rows)),
+                self.smoothing,
+            )
+            if len(rows) >= fetch_size:
+                state.seconds_per_row = _smooth(
+                    state.seconds_per_row,
+                    context.timings['execute'] / len(rows),
+                    self.smoothing,
+                )
+            state.fetch_size = self._target(state)
+
+    def snapshot(self):
+        """
+        Returns the fetch size and the measurements of every fingerprint,
+        as a dict of dicts keyed by fingerprint.
+        """
+        with self._lock:
+            return dict(
+                (key, state.as_dict()) for key, state in self._states.items()
+            )
+
+    def reset(self):
+        with self._lock:
+            self._states = {}
+
+
+# the protocol version clustering values are serialized with in cursors,
+# which must stay readable across driver upgrades
+_CURSOR_PROTOCOL_VERSION = 4
+
+
+def encode_cursor(model, values):
+    """
+    Encodes clustering key values, or a prefix of them, to an URL-safe
+    string.
+
+    :param model: the model the values are clustering keys of
+    :param values: the clustering key values, in clustering order
+    :type values: tuple
+    :rtype: str
+    """
+    encoded = []
+    for column, value in zip(model._clustering_keys.values(), values):
+        data = column.cql_type.serialize(
+            column.to_database(value),
+            _CURSOR_PROTOCOL_VERSION,
+        )
+        encoded.append(struct.pack('>I', len(data)) + data)
+    token = base64.urlsafe_b64encode(b''.join(encoded)).rstrip(b'=')
+    return token.decode('ascii')
+
+
+def decode_cursor(model, cursor):
+    """
+    Decodes a string returned by :func:`encode_cursor` to the clustering
+    key values it holds.
+
+    :rtype: tuple
+    """
+    try:
+        data = base64.urlsafe_b64decode(
+            cursor.encode('ascii') + b'=' * (-len(cursor) % 4)
+        )
+        values = []
+        columns = list(model._clustering_keys.values())
+        position = 0
+        while position < len(data):
+            column = columns[len(values)]
+            size, = struct.unpack('>I', data[position:position + 4])
+            position += 4
+            value = column.cql_type.deserialize(
+                data[position:position + size],
+                _CURSOR_PROTOCOL_VERSION,
+            )
+            position += size
+            values.append(column.to_python(value))
+    except Exception:
+        raise QueryException("Invalid cursor {0!r}".format(cursor))
+    return tuple(values)
+
+
+class Page(object):
+    """
+    A page of the rows of a partition, in clustering order.
+
+    ``cursor`` holds the clustering key values of the last row of the page,
+    pass it as ``after`` to get the next page. It is the ``after`` of the
+    page when the page is empty.
+
+    :param items: the rows of the page
+    :type items: list
+    :param cursor: the clustering key values of the last row
+    :type cursor: tuple
+    :param has_more: whether rows follow the page
+    :type has_more: bool
+    """
+
+    def __init__(self, model, items, cursor, has_more):
+        self.model = model
+        self.items = items
+        self.cursor = cursor
+        self.has_more = has_more
+
+    def __iter__(self):
+        return iter(self.items)
+
+    def __len__(self):
+        return len(self.items)
+
+    def __repr__(self):
+        return '<Page {0} rows has_more={1}>'.format(
+            len(self.items),
+            self.has_more,
+        )
+
+    @property
+    def token(self):
+        """The cursor encoded as an URL-safe string, see
+        :func:`encode_cursor`, or None."""
+        if not self.cursor:
+            return None
+        return encode_cursor(self.model, self.cursor)
@@ -0,0 +1,248 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import defaultdict, OrderedDict
+from contextlib import contextmanager
+from timeit import default_timer
+
+from cqlmapper.middleware import PHASES, scoped
+from cqlmapper.operators import EqualsOperator
+from cqlmapper.statements import SelectStatement, freeze_context
+from cqlmapper.stats import fingerprint
+
+
+def _freeze(value):
+    try:
+        return freeze_context(value)
+    except TypeError:
+        return repr(value)
+
+
+def _lookup(context):
+    """
+    Returns the restricted columns and their values if the context is a
+    lookup by key: a select restricting the whole partition key with
+    equalities only.
+    """
+    statement = context.source
+    if not isinstance(statement, SelectStatement):
+        return None
+    where = statement.where_clauses
+    if not where or not all(
+            isinstance(w.operator, EqualsOperator) for w in where):
+        return None
+    model = context.model
+    if model is not None:
+        partition = set(c.db_field_name for c in model._partition_keys.values())
+        if not partition <= set(w.field for w in where):
+            return None
+    return tuple((w.field, _freeze(w.value)) for w in where)
+
+
+class NPlusOne(object):
+    """
+    Lookups by key repeated with different keys on a table, which are
+    better fetched with a single query or concurrently.
+
+    :param table: the table looked up
+    :param fingerprint: the fingerprint of the lookups
+    :param count: the number of lookups
+    :param varying: the columns whose values differ between lookups
+    :param model: the model class, if known
+    """
+
+    def __init__(self, table, fingerprint, count, varying, model=None):
+        self.table = table
+        self.fingerprint = fingerprint
+        self.count = count
+        self.varying = varying
+        self.model = model
+
+    def __repr__(self):
+        return '<NPlusOne {0}x {1}>'.format(self.count, self.fingerprint)
+
+    @property
+    def suggestion(self):
+        if len(self.varying) == 1 and self.model is not None:
+            field = self.varying[0]
+            name = self.model._db_map.get(field, field)
+            return (
+                "fetch them with one query, {0}.objects({1}__in=[...]), "
+                "or execute the lookups concurrently".format(
+                    self.model.__name__,
+                    name,
+                )
+            )
+        return (
+            "execute the lookups concurrently instead of sequentially, "
+            "or fetch them with a single IN query"
+        )
+
+
+class Profile(object):
+    """
+    Statements recorded by :func:`profile`.
+
+    Rows are hydrated as query results are consumed, ``rows`` and the
+    ``hydrate`` timings are complete once the results have been iterated.
+
+    :param n_plus_one_threshold: number of lookups by different keys on the
+        same table flagged as an N+1 pattern
+    :type n_plus_one_threshold: int
+    """
+
+    def __init__(self, n_plus_one_threshold=3):
+        self.n_plus_one_threshold = n_plus_one_threshold
+        self.contexts = []
+        self.elapsed = None
+
+    def __call__(self, context, call_next):
+        self.contexts.append(context)
+        return call_next(context)
+
+    def __len__(self):
+        return len(self.contexts)
+
+    @property
+    def count(self):
+        """Number of statements executed."""
+        return len(self.contexts)
+
+    @property
+    def rows(self):
+        """Number of model instances hydrated."""
+        return sum(c.rows for c in self.contexts)
+
+    def timings(self):
+        """Returns the number of seconds spent in each phase."""
+        timings = dict((phase, 0.0) for phase in PHASES)
+        for context in self.contexts:
+            for phase in PHASES:
+                timings[phase] += context.timings[phase]
+        return timings
+
+    def fingerprints(self):
+        """Returns the number of statements executed per fingerprint."""
+        counts = OrderedDict()
+        for context in self.contexts:
+            key = fingerprint(context.query_string or '')
+            counts[key] = counts.get(key, 0) + 1
+        return counts
+
+    def duplicates(self):
+        """Returns the fingerprints executed more than once."""
+        return OrderedDict(
+            (key, count) for key, count in self.fingerprints().items()
+            if count > 1
+        )
+
+    def n_plus_one(self):
+        """
+        Returns the :class:`NPlusOne` patterns found: lookups by key on the
+        same table, with the same fingerprint and at least
+        ``n_plus_one_threshold`` different keys.
+        """
+        lookups = OrderedDict()
+        for context in self.contexts:
+            lookup = _lookup(context)
+            if lookup is None:
+                continue
+            key = (context.source.table, fingerprint(context.query_string))
+            if key not in lookups:
+                lookups[key] = (context.model, [])
+            lookups[key][1].append(lookup)
+
+        patterns = []
+        for (table, key), (model, found) in lookups.items():
+            if len(set(found)) < self.n_plus_one_threshold:
+                continue
+            values = defaultdict(set)
+            for lookup in found:
+                for field, value in lookup:
+                    values[field].add(value)
+            varying = [f for f, _ in found[0] if len(values[f]) > 1]
+            patterns.append(NPlusOne(table, key, len(found), varying, model))
+        return patterns
+
+    def report(self):
+        """Returns a human readable summary of the profile."""
+        timings = self.timings()
+        lines = [
+            '{0} statements in {1:.3f}s ({2}), {3} rows hydrated'.format(
+                self.count,
+                self.elapsed or 0.0,
+                ', '.join(
+                    '{0} {1:.3f}s'.format(phase, timings[phase])
+                    for phase in PHASES
+                ),
+                self.rows,
+            )
+        ]
+        duplicates = self.duplicates()
+        if duplicates:
+            lines.append('Repeated statements:')
+            for key, count in duplicates.items():
+                lines.append('  {0}x {1}'.format(count, key))
+        patterns = self.n_plus_one()
+        if patterns:
+            lines.append('Possible N+1 queries:')
+            for pattern in patterns:
+                lines.append('  {0} lookups on {1} by {2}: {3}'.format(
+                    pattern.count,
+                    pattern.table,
+                    ', '.join(pattern.varying) or 'the same key',
+                    pattern.suggestion,
+                ))
+        return '\n'.join(lines)
+
+    def assert_no_n_plus_one(self):
+        """Raises AssertionError if an N+1 pattern was found."""
+        if self.n_plus_one():
+            raise AssertionError(self.report())
+
+
+@contextmanager
+def profile(conn=None, n_plus_one_threshold=3):
+    """
+    Records the statements executed within the block.
+
+    .. code-block:: python
+
+        with cqlmapper.profile() as p:
+            render_page(conn)
+        print(p.report())
+        p.assert_no_n_plus_one()
+
+    :param conn: (optional) only record the statements of this connection,
+        from every thread. By default the statements executed by the
+        current thread on any connection are recorded.
+    :type conn: cqlmapper.connection.Connection
+    :param n_plus_one_threshold: number of lookups by different keys on the
+        same table flagged as an N+1 pattern
+    :type n_plus_one_threshold: int
+    """
+    profiler = Profile(n_plus_one_threshold)
+    start = default_timer()
+    try:
+        if conn is None:
+            with scoped(profiler):
+                yield profiler
+        else:
+            conn.add_middleware(profiler)
+            try:
+                yield profiler
+            finally:
+                conn.middleware.remove(profiler)
+    finally:
+        profiler.elapsed = default_timer() - start
@@ -12,6 +12,8 @@
 # See the License for the specific language governing permissions and
 # limitations under the License.
 
+from timeit import default_timer
+
 import six
 
 from cqlmapper import (
@@ -86,7 +88,10 @@ class DMLQuery(object):
         self._if_exists = if_exists
         self._conditional = conditional
         self.timeout = timeout
+        start = default_timer()
         self.prepare()
+        # seconds spent building the statements
+        self.prepare_time = default_timer() - start
 
     @property
     def check_applied(self):
@@ -113,11 +118,19 @@ class DMLQuery(object):
                 deleted_fields = True
                 static_only &= col.static
             elif isinstance(col, columns.Map):
-                uc = MapDeleteClause(
-                    col.db_field_name,
-                    v.value,
-                    v.previous_value,
-                )
+                mutations = v.mutations
+                if mutations is not None:
+                    uc = MapDeleteClause(
+                        col.db_field_name,
+                        v.value,
+                        removals=col.mutations_to_database(mutations)[1],
+                    )
+                else:
+                    uc = MapDeleteClause(
+                        col.db_field_name,
+                        v.value,
+                        v.previous_value,
+                    )
                 if uc.get_context_size() > 0:
                     ds.add_field(uc)
                     deleted_fields = True
@@ -179,7 +192,15 @@ class UpdateDMLQuery(DMLQuery):
                     continue
 
                 static_changed_only = static_changed_only and col.static
-                statement.add_update(col, val, previous=val_mgr.previous_value)
+                mutations = val_mgr.mutations
+                if mutations is not None:
+                    statement.add_update(col, val, mutations=mutations)
+                else:
+                    statement.add_update(
+                        col,
+                        val,
+                        previous=val_mgr.previous_value,
+                    )
                 updated_columns.add(col.db_field_name)
 
         if not null_clustering_key:
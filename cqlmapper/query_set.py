@@ -14,14 +14,22 @@
 
 import copy
 from functools import partial
+from timeit import default_timer
+
 import six
 
+from cqlmapper.batch import Batch
+from cqlmapper.buffers import WriteBehindBuffer
+from cqlmapper.cache import MISSING
+from cqlmapper import columnar, paging
+
 from cqlmapper import (
     columns,
     CQLEngineException,
     ValidationError,
     TIMEOUT_NOT_SET,
 )
+from cqlmapper.middleware import ExecutionContext
 from cqlmapper.query import (
     QueryException,
     IfExistsWithCounterColumn,
@@ -40,9 +48,15 @@ from cqlmapper.statements import (
     DeleteStatement,
     UpdateStatement,
     ConditionalClause,
+    freeze_context,
 )
 
 
+def _is_token_clause(clause):
+    """Returns True for restrictions on the token of the partition key."""
+    return isinstance(clause.value, Token) or not clause.quote_field
+
+
 class DoesNotExist(QueryException):
     pass
 
@@ -86,6 +100,11 @@ class ModelQuerySet(object):
         self._result_generator = None
         self._materialize_results = True
 
+        # execution context of the last execution, and seconds spent
+        # cloning and filtering the queryset up to this one
+        self._context = None
+        self._clone_time = 0.0
+
         self._distinct_fields = None
 
         self._count = None
@@ -97,6 +116,7 @@ class ModelQuerySet(object):
         self._timeout = TIMEOUT_NOT_SET
         self._if_exists = False
         self._fetch_size = None
+        self._prefetch = 0
         self._connection = None
 
     @property
@@ -107,14 +127,44 @@ class ModelQuerySet(object):
     def column_family_name(self):
         return self.model.column_family_name()
 
-    def _execute_statement(self, conn, statement):
+    def _execute_statement(self, conn, statement, context=None):
+        kwargs = {} if context is None else {'context': context}
         return conn.execute(
             statement,
             consistency_level=self._consistency,
             timeout=self._timeout,
             verify_applied=self.check_applied,
+            model=self.model,
+            **kwargs
         )
 
+    def _execute_select(self, conn, statement, context=None):
+        """Executes a select statement, serving it from the model query
+        cache when one is set.
+        """
+        cache = self.model.__query_cache__
+        if cache is None:
+            return self._execute_statement(conn, statement, context)
+        try:
+            key = (
+                statement.table,
+                six.text_type(statement),
+                freeze_context(statement.get_context()),
+                self._consistency,
+            )
+        except TypeError:
+            return self._execute_statement(conn, statement, context)
+        rows = cache.get(key)
+        if rows is None:
+            rows = [
+                row for row in self._execute_statement(conn, statement, context)
+            ]
+            cache.set(statement.table, key, copy.deepcopy(rows))
+        else:
+            # results are handed out to, and mutated by, the caller
+            rows = copy.deepcopy(rows)
+        return rows
+
     def __unicode__(self):
         return six.text_type(self._select_query())
 
@@ -125,17 +175,38 @@ class ModelQuerySet(object):
         return self.filter(**kwargs)
 
     def __deepcopy__(self, memo):
+        start = default_timer()
         clone = self.__class__(self.model)
         for k, v in self.__dict__.items():
-            if k in ['_con', '_cur', '_result_cache', '_result_idx', '_result_generator', '_construct_result']:  # don't clone these, which are per-request-execution
+            if k in ['_con', '_cur', '_result_cache', '_result_idx', '_result_generator', '_construct_result', '_context']:  # don't clone these, which are per-request-execution
                 clone.__dict__[k] = None
             elif k == '_timeout':
                 clone.__dict__[k] = self._timeout
             else:
                 clone.__dict__[k] = copy.deepcopy(v, memo)
 
+        clone._clone_time = self._clone_time + default_timer() - start
         return clone
 
+    @property
+    def timings(self):
+        """
+        Seconds spent in each phase of the last execution of the queryset
+        (see :class:`cqlmapper.middleware.ExecutionContext`), or None if it
+        has not been executed.
+
+        .. code-block:: python
+
+            users = User.objects(id=1)
+            list(users.iter(conn))
+            users.timings
+            # {'clone': ..., 'statement': ..., 'render': ..., 'bind': ...,
+            #  'execute': ..., 'paging': ..., 'hydrate': ...}
+        """
+        if self._context is None:
+            return None
+        return dict(self._context.timings)
+
     def _select_fields(self):
         """Returns the fields to select."""
         if self._defer_fields or self._only_fields:
@@ -166,10 +237,10 @@ class ModelQuerySet(object):
             self.model._get_column_by_db_name(w.field)
             for w in self._where if
             isinstance(w.operator, EqualsOperator) and
-            not isinstance(w.value, Token)
+            not _is_token_clause(w)
         ]
         token_comparison = any([
-            w for w in self._where if isinstance(w.value, Token)
+            w for w in self._where if _is_token_clause(w)
         ])
         has_pk_or_idx = any(w.primary_key or w.index for w in equal_ops)
         valid_clause = (
@@ -218,12 +289,24 @@ class ModelQuerySet(object):
 
     def _execute_query(self, conn):
         if self._result_cache is None:
-            self._result_generator = (
-                i for i in self._execute_statement(conn, self._select_query())
+            # rows are fetched and hydrated lazily, the context accounts for
+            # it after the statement went through the middlewares of the
+            # connection
+            context = self._context = ExecutionContext(
+                model=self.model,
+                lazy=True,
+            )
+            context.timings['clone'] = self._clone_time
+            start = default_timer()
+            statement = self._select_query()
+            context.timings['statement'] = default_timer() - start
+            self._result_generator = paging.prefetch(
+                self._execute_select(conn, statement, context),
+                self._prefetch,
             )
             self._result_cache = []
-            self._construct_result = self._maybe_inject_deferred(
-                self._get_result_constructor()
+            self._construct_result = context.hydrator(
+                self._maybe_inject_deferred(self._get_result_constructor())
             )
 
             # "DISTINCT COUNT()" is not supported in C* < 2.2, so we need to
@@ -266,7 +349,17 @@ class ModelQuerySet(object):
                         self._result_cache[self._result_idx] = result
                         break
                     except IndexError:
-                        self._result_cache.append(next(self._result_generator))
+                        self._result_cache.append(self._next_row())
+
+    def _next_row(self):
+        start = default_timer()
+        try:
+            return next(self._result_generator)
+        except StopIteration:
+            self._context.complete()
+            raise
+        finally:
+            self._context.add_paging_time(default_timer() - start)
 
     def iter(self, conn):
         self._execute_query(conn)
@@ -275,7 +368,7 @@ class ModelQuerySet(object):
         while True:
             if len(self._result_cache) <= idx:
                 try:
-                    self._result_cache.append(next(self._result_generator))
+                    self._result_cache.append(self._next_row())
                 except StopIteration:
                     break
 
@@ -447,13 +540,20 @@ class ModelQuerySet(object):
         if len([x for x in kwargs.values() if x is None]):
             raise CQLEngineException("None values on filter are not allowed")
 
+        start = default_timer()
         clone = copy.deepcopy(self)
 
         for arg, val in kwargs.items():
             col_name, col_op = self._parse_filter_arg(arg)
             quote_field = True
 
-            if not isinstance(val, Token):
+            if (col_name == 'pk__token' and
+                    isinstance(val, six.integer_types) and
+                    not isinstance(val, bool)):
+                # raw token bounds, as used to scan token ranges
+                column = columns._PartitionKeysToken(self.model)
+                quote_field = False
+            elif not isinstance(val, Token):
                 try:
                     column = self.model._get_column(col_name)
                 except KeyError:
@@ -500,7 +600,8 @@ class ModelQuerySet(object):
                 query_val = val
             else:
                 query_val = column.to_database(val)
-                if not col_op:  # only equal values should be deferred
+                # only equal values should be deferred
+                if not col_op and quote_field:
                     clone._defer_fields.add(col_name)
                     # map by db field name for substitution in results
                     clone._deferred_values[column.db_field_name] = val
@@ -514,6 +615,7 @@ class ModelQuerySet(object):
                 )
             )
 
+        clone._clone_time = self._clone_time + default_timer() - start
         return clone
 
     def find(self, conn, **kwargs):
@@ -548,6 +650,29 @@ class ModelQuerySet(object):
         if kwargs:
             return self.filter(**kwargs).get(conn)
 
+        cache = self.model.__cache__
+        cache_key = None
+        if cache is not None and self._consistency is None:
+            # reads at an explicit consistency level go to the database
+            cache_key = self._cache_key()
+        if cache_key is not None:
+            values = cache.get(cache_key, None)
+            if values is MISSING:
+                raise self.model.DoesNotExist
+            if values is not None:
+                return self.model._from_cached_values(values)
+            generation = cache.generation(cache_key)
+            try:
+                obj = self._get(conn)
+            except self.model.DoesNotExist:
+                cache.set(cache_key, MISSING, generation)
+                raise
+            cache.set(cache_key, obj._cached_values(), generation)
+            return obj
+
+        return self._get(conn)
+
+    def _get(self, conn):
         self._execute_query(conn)
 
         # Check that the resultset only contains one element, avoiding sending
@@ -565,6 +690,63 @@ class ModelQuerySet(object):
 
         return obj
 
+    def _cache_key(self):
+        """Returns the model cache key for this query.
+
+        A key is only returned when the query selects a single full row by
+        its primary key with an equality on every primary key column, None
+        is returned otherwise.
+        """
+        if (self._conditional or self._only_fields or self._values_list or
+                self._distinct_fields or self._allow_filtering):
+            return None
+        if set(self._defer_fields) - set(self.model._primary_keys):
+            return None
+        values = {}
+        for where in self._where:
+            if (where.operator.__class__ is not EqualsOperator or
+                    isinstance(where.value, BaseQueryFunction) or
+                    where.field in values):
+                return None
+            values[where.field] = where.value
+        primary_keys = self.model._primary_keys.values()
+        if len(values) != len(primary_keys):
+            return None
+        try:
+            return tuple(values[c.db_field_name] for c in primary_keys)
+        except KeyError:
+            return None
+
+    def _invalidate_cache(self, conn):
+        """Drops the model cache entries this query may have modified.
+
+        When writing through a batch or a write-behind buffer, the entries
+        are dropped again once the write has been executed.
+        """
+        deferred = isinstance(conn, (Batch, WriteBehindBuffer))
+        query_cache = self.model.__query_cache__
+        if query_cache is not None:
+            query_cache.invalidate_table(self.column_family_name)
+            if deferred:
+                conn.add_callback(
+                    query_cache.invalidate_table,
+                    self.column_family_name,
+                )
+        cache = self.model.__cache__
+        if cache is None:
+            return
+        key = self._cache_key()
+        if key is None:
+            # IN, range or partition wide modifications, the rows touched
+            # can't be enumerated so the whole cache is dropped
+            cache.clear()
+            if deferred:
+                conn.add_callback(cache.clear)
+        else:
+            cache.invalidate(key)
+            if deferred:
+                conn.add_callback(cache.invalidate, key)
+
     def _get_ordering_condition(self, colname):
         order_type = 'DESC' if colname.startswith('-') else 'ASC'
         colname = colname.replace('-', '')
@@ -649,7 +831,7 @@ class ModelQuerySet(object):
         if self._count is None:
             query = self._select_query()
             query.count = True
-            result = self._execute_statement(conn, query)
+            result = self._execute_select(conn, query)
             count_row = result[0].popitem()
             self._count = count_row[1]
         return self._count
@@ -747,6 +929,121 @@ class ModelQuerySet(object):
         clone._fetch_size = v
         return clone
 
+    def prefetch(self, depth):
+        """Fetches up to ``depth`` pages of results in the background while
+        the current page is consumed, instead of fetching each page once the
+        previous one is exhausted. 0 disables prefetching.
+
+        .. code-block:: python
+
+            for reading in Reading.objects(sensor=s).prefetch(2).iter(conn):
+                process(reading)
+        """
+
+        if not isinstance(depth, six.integer_types):
+            raise TypeError
+        if depth == self._prefetch:
+            return self
+
+        if depth < 0:
+            raise QueryException("Negative prefetch depth is not allowed")
+
+        clone = copy.deepcopy(self)
+        clone._prefetch = depth
+        return clone
+
+    def _clustering_reversed(self):
+        """Whether the ordering of the queryset reverses the clustering
+        order of the table."""
+        if not self._order:
+            return False
+        field, direction = self._order[0].rsplit(' ', 1)
+        column = self.model._get_column_by_db_name(field.strip('"'))
+        natural = (column.clustering_order or 'ASC').upper()
+        return direction.upper() != natural
+
+    def paginate_by_clustering(self, conn, page_size, after=None):
+        """Returns a page of the rows following ``after`` in clustering
+        order, as a :class:`cqlmapper.paging.Page`.
+
+        Pages are read by clustering key values rather than with the driver
+        paging state, so that a cursor stays valid across queries and
+        processes. The queryset must restrict the partition key and no
+        clustering key. Rows following ``(v1, v2)`` are read with a query
+        per clustering key, ``c1 = v1 AND c2 > v2`` then ``c1 > v1``,
+        using ``<`` for the clustering keys read in descending order.
+
+        .. code-block:: python
+
+            page = Comment.objects(photo_id=u).paginate_by_clustering(
+                conn, 20, after=request.args.get('after'))
+            next_after = page.token if page.has_more else None
+
+        :param page_size: the maximum number of rows of the page
+        :type page_size: int
+        :param after: (optional) the cursor of the previous page, a tuple of
+            clustering key values, or a prefix of them, or the encoded
+            string of :attr:`cqlmapper.paging.Page.token`
+        """
+        if not isinstance(page_size, six.integer_types):
+            raise TypeError
+        if page_size < 1:
+            raise QueryException("page size less than 1 is not allowed")
+        if self._values_list:
+            raise QueryException(
+                "paginate_by_clustering can't be used with values_list"
+            )
+        keys = list(self.model._clustering_keys.items())
+        if not keys:
+            raise QueryException(
+                "{0} has no clustering keys to paginate by".format(
+                    self.model.__name__
+                )
+            )
+        clustering_fields = set(c.db_field_name for _, c in keys)
+        if any(w.field in clustering_fields for w in self._where):
+            raise QueryException(
+                "paginate_by_clustering can't be used with filters on "
+                "clustering keys"
+            )
+
+        if after is None:
+            after = ()
+        elif isinstance(after, six.string_types):
+            after = paging.decode_cursor(self.model, after)
+        else:
+            after = tuple(after)
+        if len(after) > len(keys):
+            raise QueryException(
+                "The cursor has {0} values, {1} has {2} clustering "
+                "keys".format(len(after), self.model.__name__, len(keys))
+            )
+
+        querysets = [self] if not after else []
+        reverse = self._clustering_reversed()
+        for level in range(len(after), 0, -1):
+            name, column = keys[level - 1]
+            ascending = (column.clustering_order or 'ASC').upper() == 'ASC'
+            if reverse:
+                ascending = not ascending
+            kwargs = dict((keys[i][0], after[i]) for i in range(level - 1))
+            kwargs[name + ('__gt' if ascending else '__lt')] = after[level - 1]
+            querysets.append(self.filter(**kwargs))
+
+        # a row more than the page tells whether rows follow it
+        wanted = page_size + 1
+        items = []
+        for queryset in querysets:
+            items.extend(queryset.limit(wanted - len(items)).iter(conn))
+            if len(items) >= wanted:
+                break
+        has_more = len(items) > page_size
+        items = items[:page_size]
+        cursor = after or None
+        if items:
+            cursor = tuple(getattr(items[-1], name) for name, _ in keys)
+        return paging.Page(self.model, items, cursor, has_more)
+
     def allow_filtering(self):
         """ Enables the (usually) unwise practive of querying on a clustering
         key without also defining a partition key.
@@ -816,7 +1113,10 @@ class ModelQuerySet(object):
             conditionals=self._conditional,
             if_exists=self._if_exists
         )
-        self._execute_statement(conn, dq)
+        try:
+            self._execute_statement(conn, dq)
+        finally:
+            self._invalidate_cache(conn)
 
     def __eq__(self, q):
         if len(self._where) == len(q._where):
@@ -860,6 +1160,89 @@ class ModelQuerySet(object):
         clone._flat_values_list = flat
         return clone
 
+    def _iter_rows(self, conn):
+        """
+        Executes the query and yields its rows as dicts keyed by db field
+        name, without constructing model instances. Fields filtered by
+        equality, which aren't selected, are set to their filter value.
+        """
+        context = self._context = ExecutionContext(
+            model=self.model,
+            lazy=True,
+        )
+        context.timings['clone'] = self._clone_time
+        start = default_timer()
+        statement = self._select_query()
+        context.timings['statement'] = default_timer() - start
+        rows = paging.prefetch(
+            self._execute_select(conn, statement, context),
+            self._prefetch,
+        )
+        deferred = self._deferred_values
+        try:
+            while True:
+                start = default_timer()
+                try:
+                    row = next(rows)
+                except StopIteration:
+                    return
+                finally:
+                    context.add_paging_time(default_timer() - start)
+                if deferred:
+                    row.update(deferred)
+                yield row
+        finally:
+            context.complete()
+
+    def _fetch_columns(self, conn):
+        """
+        Executes the query, appending the values of the selected fields to
+        a :class:`cqlmapper.columnar.ColumnBuffer` each as rows are paged
+        in. Returns the field names and their buffers.
+        """
+        columnar._require_numpy()
+        names = list(self._only_fields) or list(self.model._columns)
+        model_columns = [self.model._columns[name] for name in names]
+        buffers = [columnar.ColumnBuffer(c) for c in model_columns]
+        fields = [c.db_field_name for c in model_columns]
+        for row in self._iter_rows(conn):
+            start = default_timer()
+            for field, buf in zip(fields, buffers):
+                buf.append(row.get(field))
+            self._context.add_hydrate_time(default_timer() - start)
+        return names, buffers
+
+    def to_columns(self, conn):
+        """
+        Returns the selected fields of the matching rows as a dict of NumPy
+        arrays, by field name, without constructing model instances.
+
+        ``BigInt`` and ``Counter`` columns are read into int64 arrays,
+        ``Double`` into float64 arrays, ``DateTime`` into datetime64[ms]
+        arrays (see :mod:`cqlmapper.columnar` for the other types), columns
+        of other types into object arrays. Null floats and datetimes are NaN
+        and NaT, other typed arrays with nulls are masked arrays.
+
+        .. code-block:: python
+
+            arrays = Reading.objects(sensor=1).values_list(
+                'at', 'value'
+            ).to_columns(conn)
+            arrays['value'].mean()
+
+        Requires NumPy.
+        """
+        return columnar.to_columns(*self._fetch_columns(conn))
+
+    def to_numpy(self, conn):
+        """
+        Returns the selected fields of the matching rows as a NumPy
+        structured array, with the dtypes of :meth:`to_columns`.
+
+        Requires NumPy.
+        """
+        return columnar.to_structured(*self._fetch_columns(conn))
+
     def ttl(self, ttl):
         """
         Sets the ttl (in seconds) for modified data.
@@ -1004,6 +1387,12 @@ class ModelQuerySet(object):
         if not values:
             return
 
+        try:
+            self._update(conn, values)
+        finally:
+            self._invalidate_cache(conn)
+
+    def _update(self, conn, values):
         nulled_columns = set()
         updated_columns = set()
         us = UpdateStatement(
@@ -0,0 +1,322 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Recording of the statements executed by a connection, and replay of the
+recordings.
+
+.. code-block:: python
+
+    recorder = StatementRecorder('/var/lib/app/statements.rec')
+    conn.add_middleware(recorder)
+    ...
+    recorder.close()
+
+    result = replay('/var/lib/app/statements.rec', test_conn, speed=2)
+    print(result.report())
+
+Recordings are sequences of pickled records, appended as statements
+complete. Each distinct query string is written once, the following
+executions only reference it. Recordings may contain sensitive bound
+values and, being pickles, must only be read from trusted sources.
+"""
+
+from collections import namedtuple
+import logging
+import random
+import threading
+import time
+from timeit import default_timer
+
+import six
+from six.moves import cPickle as pickle
+
+from cqlmapper import CQLEngineException
+from cqlmapper.stats import fingerprint
+from cqlmapper.stress import StressResult
+
+log = logging.getLogger(__name__)
+
+FORMAT = 'cqlmapper-recording'
+VERSION = 1
+
+_HEADER = 'h'
+_QUERY = 'q'
+_EXECUTION = 'x'
+
+RecordedStatement = namedtuple('RecordedStatement', [
+    'query_string',
+    'fingerprint',
+    'operation',
+    'model',
+    'started',
+    'latency',
+    'params',
+    'consistency_level',
+    'error',
+])
+
+
+class RecordingException(CQLEngineException):
+    pass
+
+
+class StatementRecorder(object):
+    """
+    Connection middleware appending the statements it executes to a
+    recording file.
+
+    Every execution is recorded with its query string, fingerprint, bound
+    values, consistency level, the wall clock time it started at, its
+    execution time and the name of the exception it raised, if any.
+
+    :param path: the file to append to
+    :type path: str
+    :param sample_rate: (Defaults to 1) the fraction of statements recorded
+    :type sample_rate: float
+    :param operations: (optional) only record these kinds of operations
+        (``select``, ``insert``, ...)
+    :type operations: collection
+    """
+
+    def __init__(self, path, sample_rate=1.0, operations=None):
+        self.path = path
+        self.sample_rate = sample_rate
+        self.operations = set(operations) if operations else None
+        self.recorded = 0
+        self._file = None
+        self._queries = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, context, call_next):
+        if self._records(context):
+            started = time.time()
+            context.on_finish(lambda context: self.record(context, started))
+        return call_next(context)
+
+    def _records(self, context):
+        if self.operations is not None:
+            if context.operation not in self.operations:
+                return False
+        return self.sample_rate >= 1 or random.random() < self.sample_rate
+
+    def _open(self):
+        if self._file is None:
+            self._file = open(self.path, 'ab')
+            self._write((_HEADER, FORMAT, VERSION))
+        return self._file
+
+    def _write(self, record):
+        pickle.dump(record, self._file, pickle.HIGHEST_PROTOCOL)
+
+    def record(self, context, started):
+        """Appends the execution of a statement to the recording."""
+        query_string = context.query_string
+        if query_string is None:
+            return
+        model = context.model
+        error = context.error
+        try:
+            with self._lock:
+                self._open()
+                query_id = self._queries.get(query_string)
+                if query_id is None:
+                    query_id = self._queries[query_string] = len(
+                        self._queries
+                    )
+                    self._write((
+                        _QUERY,
+                        query_id,
+                        query_string,
+                        fingerprint(query_string),
+                        context.operation,
+                        model.__name__ if model is not None else None,
+                    ))
+                self._write((
+                    _EXECUTION,
+                    query_id,
+                    started,
+                    context.timings['execute'],
+                    context.params,
+                    context.consistency_level,
+                    error.__class__.__name__ if error is not None else None,
+                ))
+                self.recorded += 1
+        except Exception:
+            log.exception("Could not record a statement to %s", self.path)
+
+    def flush(self):
+        with self._lock:
+            if self._file is not None:
+                self._file.flush()
+
+    def close(self):
+        """Flushes and closes the recording, reopened on the next record."""
+        with self._lock:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+                # query ids are only valid within an opening of the file
+                self._queries.clear()
+
+
+def read_recording(path):
+    """
+    Yields the :class:`RecordedStatement` of a recording, in the order they
+    were recorded.
+    """
+    queries = {}
+    with open(path, 'rb') as f:
+        while True:
+            try:
+                record = pickle.load(f)
+            except EOFError:
+                return
+            kind = record[0]
+            if kind == _EXECUTION:
+                _, query_id, started, latency, params, level, error = record
+                query_string, fp, operation, model = queries[query_id]
+                yield RecordedStatement(
+                    query_string,
+                    fp,
+                    operation,
+                    model,
+                    started,
+                    latency,
+                    params,
+                    level,
+                    error,
+                )
+            elif kind == _QUERY:
+                queries[record[1]] = record[2:]
+            elif kind == _HEADER:
+                if record[1] != FORMAT or record[2] > VERSION:
+                    raise RecordingException(
+                        "Unsupported recording format {0} {1}".format(
+                            record[1],
+                            record[2],
+                        )
+                    )
+                # a new opening of the file, query ids start over
+                queries = {}
+            else:
+                raise RecordingException(
+                    "Unexpected record {0!r} in {1}".format(kind, path)
+                )
+
+
+class ReplayResult(StressResult):
+    """
+    Latencies and errors of a replay, per operation. ``max_lag`` is the
+    largest delay, in seconds, between the time a statement was scheduled
+    at and the time it was issued.
+    """
+
+    def __init__(self, max_samples=100000):
+        super(ReplayResult, self).__init__(max_samples)
+        self.max_lag = 0.0
+
+    def add_lag(self, lag):
+        with self._lock:
+            self.max_lag = max(self.max_lag, lag)
+
+    def summary(self, percentiles=(0.5, 0.95, 0.99)):
+        summary = super(ReplayResult, self).summary(percentiles)
+        summary['max_lag'] = self.max_lag
+        return summary
+
+
+def replay(recording, conn, speed=1.0, concurrency=8, operations=None,
+           limit=None):
+    """
+    Reissues recorded statements through a connection.
+
+    Statements are issued in the order they were recorded. With a
+    ``speed``, they are also scheduled to keep the intervals between their
+    recorded start times, divided by ``speed``; without one they are
+    issued as fast as ``concurrency`` allows.
+
+    :param recording: the path of the recording, or an iterable of
+        :class:`RecordedStatement`
+    :param conn: the connection executing the statements
+    :param speed: (Defaults to 1) the replay speed relative to the
+        recording, None to not pace the statements
+    :type speed: float
+    :param concurrency: the number of statements executed at once
+    :type concurrency: int
+    :param operations: (optional) only replay these kinds of operations
+    :type operations: collection
+    :param limit: (optional) the maximum number of statements replayed
+    :type limit: int
+    :rtype: ReplayResult
+    """
+    if isinstance(recording, six.string_types):
+        recording = read_recording(recording)
+    if operations is not None:
+        operations = set(operations)
+        recording = (r for r in recording if r.operation in operations)
+    recording = iter(recording)
+
+    result = ReplayResult()
+    lock = threading.Lock()
+    state = {'issued': 0, 'first': None}
+    start = default_timer()
+
+    def next_statement():
+        with lock:
+            if limit is not None and state['issued'] >= limit:
+                return None, None
+            statement = next(recording, None)
+            if statement is None:
+                return None, None
+            state['issued'] += 1
+            if state['first'] is None:
+                state['first'] = statement.started
+            if not speed:
+                return statement, None
+            return statement, (
+                start + (statement.started - state['first']) / float(speed)
+            )
+
+    def worker():
+        while True:
+            statement, scheduled = next_statement()
+            if statement is None:
+                return
+            if scheduled is not None:
+                delay = scheduled - default_timer()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    result.add_lag(-delay)
+            began = default_timer()
+            error = None
+            try:
+                conn.execute(
+                    statement.query_string,
+                    params=statement.params,
+                    consistency_level=statement.consistency_level,
+                )
+            except Exception as e:
+                error = e
+            result.add(statement.operation, default_timer() - began, error)
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result.elapsed = default_timer() - start
+    return result
@@ -0,0 +1,98 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Full table scans split by token ranges of the Murmur3 partitioner.
+
+.. code-block:: python
+
+    ranges = split_ring(64)
+    for token_range, count in scan_ranges(count_rows, ranges, concurrency=8):
+        ...
+
+Each range is read with ``token(pk) > start AND token(pk) <= end``, so the
+ranges returned by :func:`split_ring` cover every partition exactly once.
+"""
+
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+from cqlmapper import CQLEngineException
+
+MIN_TOKEN = -2 ** 63
+MAX_TOKEN = 2 ** 63 - 1
+
+TokenRange = namedtuple('TokenRange', ['start', 'end'])
+
+
+class ScanException(CQLEngineException):
+    pass
+
+
+def split_ring(splits):
+    """
+    Splits the token ring in ``splits`` contiguous ranges of equal size.
+
+    :rtype: list of TokenRange
+    """
+    if splits < 1:
+        raise ScanException("The ring must be split in at least one range")
+    width = (MAX_TOKEN - MIN_TOKEN) // splits
+    bounds = [MIN_TOKEN + i * width for i in range(splits)] + [MAX_TOKEN]
+    return [TokenRange(s, e) for s, e in zip(bounds, bounds[1:])]
+
+
+def range_queryset(queryset, token_range):
+    """Restricts a queryset to the partitions of a token range."""
+    return queryset.filter(
+        pk__token__gt=token_range.start,
+        pk__token__lte=token_range.end,
+    )
+
+
+def iter_range_rows(conn, queryset, token_range):
+    """
+    Yields the rows of a queryset in a token range, as dicts keyed by db
+    field name, without constructing model instances.
+    """
+    return range_queryset(queryset, token_range)._iter_rows(conn)
+
+
+def scan_ranges(fn, ranges, concurrency=4):
+    """
+    Calls ``fn`` with each token range, ``concurrency`` ranges at a time,
+    and yields the ``(token_range, result)`` pairs as they complete.
+
+    The first exception raised by ``fn`` is raised once the ranges being
+    processed are done, the remaining ranges are not processed.
+    """
+    ranges = iter(ranges)
+    executor = ThreadPoolExecutor(max_workers=concurrency)
+    pending = {}
+    try:
+        for token_range in ranges:
+            pending[executor.submit(fn, token_range)] = token_range
+            if len(pending) >= concurrency:
+                break
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                token_range = pending.pop(future)
+                result = future.result()
+                for next_range in ranges:
+                    pending[executor.submit(fn, next_range)] = next_range
+                    break
+                yield token_range, result
+    finally:
+        executor.shutdown(wait=True)
@@ -0,0 +1,201 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import OrderedDict
+
+from cqlmapper import CQLEngineException
+from cqlmapper.batch import Batch, execute_batches
+from cqlmapper.query import BatchType
+
+
+class SessionException(CQLEngineException):
+    pass
+
+
+class Session(object):
+    """
+    Unit of work on top of a connection.
+
+    The session keeps an identity map, so a given primary key is loaded
+    as exactly one model instance for the lifetime of the session, and
+    tracks the instances added to or deleted from it. Nothing is written
+    until :meth:`flush` is called, at which point every dirty instance is
+    validated once and written with the minimal set of statements, grouped
+    by partition into batches sent concurrently.
+
+    .. code-block:: python
+
+        with Session(conn) as session:
+            user = session.get(User, id=user_id)
+            user.name = 'Steve'
+            # later on, in another code path
+            same_user = session.get(User, id=user_id)
+            assert same_user is user
+        # changes are flushed when the block exits without error
+
+    Instances with lightweight transaction conditions (``if_not_exists``,
+    ``if_exists`` or ``iff``) are written on their own, outside of the
+    partition batches.
+
+    If a flush fails, the state of the instances it was writing is
+    undefined and the session should be discarded.
+
+    :param conn: cqlmapper.connection.Connection object used to execute
+        the queries.
+    :param concurrency: maximum number of batches sent concurrently by
+        :meth:`flush`
+    :type concurrency: int
+    """
+
+    def __init__(self, conn, concurrency=4):
+        self.conn = conn
+        self.concurrency = concurrency
+        self._identity_map = OrderedDict()
+        self._deleted = OrderedDict()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.flush()
+
+    def __contains__(self, instance):
+        return self._identity_map.get(self._identity(instance)) is instance
+
+    def __iter__(self):
+        return iter(list(self._identity_map.values()))
+
+    def __len__(self):
+        return len(self._identity_map)
+
+    @staticmethod
+    def _identity(instance):
+        return instance.__class__, instance._cache_key()
+
+    def _register(self, instance):
+        return self._identity_map.setdefault(
+            self._identity(instance),
+            instance,
+        )
+
+    def get(self, model, **kwargs):
+        """Returns the instance of ``model`` matching the filter kwargs.
+
+        Lookups on the full primary key are served from the identity map
+        when the instance has already been loaded or added.
+        """
+        queryset = model.objects.filter(**kwargs)
+        key = queryset._cache_key()
+        if key is not None:
+            instance = self._identity_map.get((model, key))
+            if instance is not None:
+                return instance
+        return self._register(queryset.get(self.conn))
+
+    def find_all(self, queryset):
+        """Executes ``queryset`` and returns its results, instances already
+        present in the session are returned in place of the loaded ones.
+        """
+        results = queryset.find_all(self.conn)
+        if queryset._values_list:
+            return results
+        return [self._register(instance) for instance in results]
+
+    def add(self, instance):
+        """Adds an instance to the session, it will be saved on flush."""
+        identity = self._identity(instance)
+        current = self._identity_map.get(identity)
+        if current is not None and current is not instance:
+            raise SessionException(
+                "Another {0} instance with the same primary key is already "
+                "attached to this session".format(instance.__class__.__name__)
+            )
+        self._deleted.pop(identity, None)
+        self._identity_map[identity] = instance
+        return instance
+
+    def delete(self, instance):
+        """Marks an instance to be deleted on flush."""
+        identity = self._identity(instance)
+        self._identity_map.pop(identity, None)
+        self._deleted[identity] = instance
+
+    def expunge(self, instance):
+        """Removes an instance from the session without writing it."""
+        identity = self._identity(instance)
+        if self._identity_map.get(identity) is instance:
+            del self._identity_map[identity]
+        if self._deleted.get(identity) is instance:
+            del self._deleted[identity]
+
+    def clear(self):
+        """Removes every instance from the session without writing them."""
+        self._identity_map.clear()
+        self._deleted.clear()
+
+    @property
+    def dirty(self):
+        """The instances which will be written on the next flush."""
+        return [
+            i for i in self._identity_map.values()
+            if not i._is_persisted or i.get_changed_columns()
+        ]
+
+    def _batch_for(self, batches, instance):
+        model = instance.__class__
+        key = (model.column_family_name(),) + tuple(
+            col.to_database(getattr(instance, name))
+            for name, col in model._partition_keys.items()
+        )
+        batch = batches.get(key)
+        if batch is None:
+            batch_type = (
+                BatchType.Counter if model._has_counter
+                else BatchType.Unlogged
+            )
+            batch = batches[key] = Batch(self.conn, batch_type=batch_type)
+        return batch
+
+    @staticmethod
+    def _is_conditional(instance):
+        return bool(
+            instance._if_not_exists or
+            instance._if_exists or
+            instance._conditional
+        )
+
+    def flush(self):
+        """Writes every pending change of the session."""
+        batches = OrderedDict()
+        conditional = []
+
+        for instance in self._deleted.values():
+            if not instance._is_persisted:
+                continue
+            if self._is_conditional(instance):
+                conditional.append(instance.delete)
+            else:
+                instance.delete(self._batch_for(batches, instance))
+
+        for instance in self.dirty:
+            if self._is_conditional(instance):
+                conditional.append(instance.save)
+            else:
+                instance.save(self._batch_for(batches, instance))
+
+        self._deleted.clear()
+        execute_batches(list(batches.values()), self.concurrency)
+        for write in conditional:
+            write(self.conn)
@@ -0,0 +1,82 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import sys
+import threading
+
+import six
+
+
+class _Call(object):
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.exc_info = None
+        self.waiters = 0
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls sharing the same key.
+
+    While a call for a given key is in flight, other callers asking for the
+    same key wait for it and receive its result (or its exception) instead
+    of issuing their own call.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+        self.coalesced = 0
+
+    def do(self, key, fn, *args, **kwargs):
+        """
+        Calls ``fn(*args, **kwargs)`` unless a call for ``key`` is already in
+        flight, in which case its outcome is shared.
+
+        :returns: a ``(result, shared)`` tuple, ``shared`` being True when the
+            result was produced by another caller
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                call.waiters += 1
+                self.coalesced += 1
+                leader = False
+            else:
+                call = self._calls[key] = _Call()
+                leader = True
+
+        if not leader:
+            call.event.wait()
+            if call.exc_info is not None:
+                six.reraise(*call.exc_info)
+            return call.result, True
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException:
+            call.exc_info = sys.exc_info()
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result, call.waiters > 0
+
+    def in_flight(self):
+        """Returns the number of keys currently in flight."""
+        with self._lock:
+            return len(self._calls)
@@ -0,0 +1,216 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from concurrent.futures import ThreadPoolExecutor
+import json
+import logging
+import random
+import threading
+
+import six
+
+from cassandra import ConsistencyLevel
+
+from cqlmapper.stats import _estimate_size, fingerprint
+
+log = logging.getLogger(__name__)
+
+
+def _consistency_name(context):
+    level = context.consistency_level
+    if level is None:
+        level = getattr(context.session, 'default_consistency_level', None)
+    return ConsistencyLevel.value_to_name.get(level, level)
+
+
+def _coordinator(result):
+    future = getattr(result, 'response_future', None)
+    host = getattr(future, 'coordinator_host', None)
+    return six.text_type(host) if host is not None else None
+
+
+def _bound_sizes(params):
+    if isinstance(params, dict):
+        return dict((k, _estimate_size(v)) for k, v in params.items())
+    if params:
+        return [_estimate_size(v) for v in params]
+    return None
+
+
+def _json_default(value):
+    return six.text_type(value)
+
+
+class JsonLinesSink(object):
+    """
+    Appends the records it is called with to a file, one JSON document per
+    line.
+
+    :param path: the file to append to
+    :type path: str
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def __call__(self, record):
+        line = json.dumps(record, default=_json_default, sort_keys=True)
+        with self._lock:
+            with open(self.path, 'a') as f:
+                f.write(line + '\n')
+
+
+class SlowQueryLog(object):
+    """
+    Connection middleware logging the statements slower than a threshold,
+    and tracing a sample of them.
+
+    .. code-block:: python
+
+        slow_log = SlowQueryLog(
+            threshold=0.2,
+            thresholds={'select': 0.05},
+            trace_sample_rate=0.001,
+            trace_sink=JsonLinesSink('/var/log/app/cql-traces.jsonl'),
+        )
+        conn = Connection(session, slow_query_log=slow_log)
+
+    Slow statements are logged with their execution time, fingerprint,
+    model, the estimated size of their bound values, their consistency
+    level and the coordinator host which served them.
+
+    Sampled statements are executed with driver request tracing turned on.
+    Their trace is fetched in a background thread, once Cassandra has
+    written it, and handed to ``trace_sink`` as a dict.
+
+    :param threshold: (Defaults to 0.5) execution time, in seconds, above
+        which a statement is logged
+    :type threshold: float
+    :param thresholds: (optional) thresholds per operation (``select``,
+        ``insert``, ...) overriding ``threshold``
+    :type thresholds: dict
+    :param trace_sample_rate: (Defaults to 0) the fraction of statements
+        executed with tracing turned on
+    :type trace_sample_rate: float
+    :param trace_sink: (optional) callable receiving the traces, traces are
+        logged at the debug level when not given
+    :type trace_sink: callable
+    :param logger: (optional) the logger slow statements are logged to
+    :type logger: logging.Logger
+    :param trace_wait: (Defaults to 2) seconds to wait for a trace to be
+        available
+    :type trace_wait: float
+    """
+
+    def __init__(self, threshold=0.5, thresholds=None, trace_sample_rate=0.0,
+                 trace_sink=None, logger=None, trace_wait=2.0):
+        self.threshold = threshold
+        self.thresholds = dict(thresholds or {})
+        self.trace_sample_rate = trace_sample_rate
+        self.trace_sink = trace_sink or self._log_trace
+        self.logger = logger or log
+        self.trace_wait = trace_wait
+        self.slow_count = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    def __call__(self, context, call_next):
+        if self.trace_sample_rate and random.random() < self.trace_sample_rate:
+            context.trace = True
+        result = call_next(context)
+        execute_time = context.timings['execute']
+        threshold = self.thresholds.get(context.operation, self.threshold)
+        if threshold is not None and execute_time >= threshold:
+            self._log_slow(context, result, execute_time)
+        if context.trace:
+            self._submit(self._save_trace, self._record(context, result),
+                         result)
+        return result
+
+    def _record(self, context, result):
+        model = context.model
+        return {
+            'fingerprint': fingerprint(context.query_string),
+            'operation': context.operation,
+            'model': model.__name__ if model is not None else None,
+            'table': context.table,
+            'consistency': _consistency_name(context),
+            'coordinator': _coordinator(result),
+            'bound_sizes': _bound_sizes(context.params),
+            'execute_time': context.timings['execute'],
+        }
+
+    def _log_slow(self, context, result, execute_time):
+        with self._lock:
+            self.slow_count += 1
+        record = self._record(context, result)
+        self.logger.warning(
+            "Slow query (%.3fs) on %s: %s [model=%s consistency=%s "
+            "coordinator=%s bound_sizes=%s]",
+            execute_time,
+            record['table'],
+            record['fingerprint'],
+            record['model'],
+            record['consistency'],
+            record['coordinator'],
+            record['bound_sizes'],
+        )
+
+    def _submit(self, fn, *args):
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=1)
+            return self._executor.submit(fn, *args)
+
+    def _save_trace(self, record, result):
+        try:
+            trace = result.get_query_trace(max_wait_sec=self.trace_wait)
+        except Exception:
+            self.logger.exception("Could not fetch the trace of a statement")
+            return
+        if trace is None:
+            return
+        record.update({
+            'trace_id': trace.trace_id,
+            'coordinator': six.text_type(trace.coordinator),
+            'duration': trace.duration,
+            'started_at': trace.started_at,
+            'request_type': trace.request_type,
+            'parameters': trace.parameters,
+            'events': [
+                {
+                    'description': event.description,
+                    'source': event.source,
+                    'source_elapsed': event.source_elapsed,
+                    'thread_name': event.thread_name,
+                    'datetime': event.datetime,
+                }
+                for event in trace.events or ()
+            ],
+        })
+        try:
+            self.trace_sink(record)
+        except Exception:
+            self.logger.exception("Could not save the trace of a statement")
+
+    def _log_trace(self, record):
+        self.logger.debug("Trace of %s: %r", record['fingerprint'], record)
+
+    def flush(self):
+        """Waits for the traces being fetched to be saved."""
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
@@ -64,6 +64,27 @@ class InQuoter(ValueQuoter):
         return '(' + ', '.join(vals) + ')'
 
 
+def freeze_context(value):
+    """
+    Returns a hashable representation of a statement context (or of one of
+    its values), suitable for use as a dictionary key.
+
+    Raises TypeError if the context contains values that can't be hashed.
+    """
+    if isinstance(value, ValueQuoter):
+        return value.__class__, freeze_context(value.value)
+    if isinstance(value, dict):
+        return tuple(sorted(
+            (k, freeze_context(v)) for k, v in value.items()
+        ))
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze_context(v) for v in value)
+    if isinstance(value, (set, frozenset)):
+        return frozenset(freeze_context(v) for v in value)
+    hash(value)
+    return value
+
+
 class BaseClause(UnicodeMixin):
 
     def __init__(self, field, value):
@@ -179,9 +200,13 @@ class ContainerUpdateTypeMapMeta(type):
 @six.add_metaclass(ContainerUpdateTypeMapMeta)
 class ContainerUpdateClause(AssignmentClause):
 
-    def __init__(self, field, value, operation=None, previous=None):
+    def __init__(self, field, value, operation=None, previous=None,
+                 mutations=None):
         super(ContainerUpdateClause, self).__init__(field, value)
         self.previous = previous
+        # changes recorded by a tracked container, used instead of diffing
+        # the value with the previous one
+        self.mutations = mutations
         self._assignments = None
         self._operation = operation
         self._analyzed = False
@@ -208,6 +233,7 @@ class SetUpdateClause(ContainerUpdateClause):
         qs = []
         ctx_id = self.context_id
         if (self.previous is None and
+                self.mutations is None and
                 self._assignments is None and
                 self._additions is None and
                 self._removals is None):
@@ -231,6 +257,10 @@ class SetUpdateClause(ContainerUpdateClause):
             self._additions = self.value
         elif self._operation == "remove":
             self._removals = self.value
+        elif self.mutations is not None:
+            additions, removals = self.mutations
+            self._additions = additions or None
+            self._removals = removals or None
         elif self.previous is None:
             self._assignments = self.value
         else:
@@ -243,6 +273,7 @@ class SetUpdateClause(ContainerUpdateClause):
         if not self._analyzed:
             self._analyze()
         if (self.previous is None and
+                self.mutations is None and
                 not self._assignments and
                 self._additions is None and
                 self._removals is None):
@@ -254,6 +285,7 @@ class SetUpdateClause(ContainerUpdateClause):
             self._analyze()
         ctx_id = self.context_id
         if (self.previous is None and
+                self.mutations is None and
                 self._assignments is None and
                 self._additions is None and
                 self._removals is None):
@@ -268,13 +300,47 @@ class SetUpdateClause(ContainerUpdateClause):
             ctx[str(ctx_id)] = self._removals
 
 
+def _find_sublist(haystack, needle):
+    """
+    Returns the index of the first occurrence of the ``needle`` list in the
+    ``haystack`` list, or -1. Runs in linear time (Knuth-Morris-Pratt), only
+    comparing elements for equality.
+    """
+    if not needle:
+        return 0
+    fallback = [0] * len(needle)
+    k = 0
+    for i in range(1, len(needle)):
+        while k and needle[i] != needle[k]:
+            k = fallback[k - 1]
+        if needle[i] == needle[k]:
+            k += 1
+        fallback[i] = k
+
+    k = 0
+    for i, item in enumerate(haystack):
+        while k and item != needle[k]:
+            k = fallback[k - 1]
+        if item == needle[k]:
+            k += 1
+            if k == len(needle):
+                return i - k + 1
+    return -1
+
+
 class ListUpdateClause(ContainerUpdateClause):
     """ updates a list collection """
 
     col_type = columns.List
 
+    # maximum number of elements changed in place which are updated by
+    # index rather than by rewriting the list, Cassandra reads the list
+    # before applying each of them
+    max_index_updates = 8
+
     _append = None
     _prepend = None
+    _index_updates = None
 
     def __unicode__(self):
         if not self._analyzed:
@@ -291,13 +357,23 @@ class ListUpdateClause(ContainerUpdateClause):
 
         if self._append is not None:
             qs += ['"{0}" = "{0}" + %({1})s'.format(self.field, ctx_id)]
+            ctx_id += 1
+
+        for idx, _ in self._index_updates or []:
+            qs += ['"{0}"[{1}] = %({2})s'.format(self.field, idx, ctx_id)]
+            ctx_id += 1
 
         return ', '.join(qs)
 
     def get_context_size(self):
         if not self._analyzed:
             self._analyze()
-        return int(self._assignments is not None) + int(bool(self._append)) + int(bool(self._prepend))
+        return (
+            int(self._assignments is not None) +
+            int(bool(self._append)) +
+            int(bool(self._prepend)) +
+            len(self._index_updates or [])
+        )
 
     def update_context(self, ctx):
         if not self._analyzed:
@@ -311,6 +387,10 @@ class ListUpdateClause(ContainerUpdateClause):
             ctx_id += 1
         if self._append is not None:
             ctx[str(ctx_id)] = self._append
+            ctx_id += 1
+        for _, value in self._index_updates or []:
+            ctx[str(ctx_id)] = value
+            ctx_id += 1
 
     def _analyze(self):
         """ works out the updates to be performed """
@@ -323,6 +403,11 @@ class ListUpdateClause(ContainerUpdateClause):
         elif self._operation == "prepend":
             self._prepend = self.value
 
+        elif self.mutations is not None:
+            prepend, append = self.mutations
+            self._prepend = prepend or None
+            self._append = append or None
+
         elif self.previous is None:
             self._assignments = self.value
 
@@ -335,27 +420,32 @@ class ListUpdateClause(ContainerUpdateClause):
             # if we're updating from an empty
             # list, do a complete insert
             self._assignments = self.value
-        else:
 
-            # the max start idx we want to compare
-            search_space = len(self.value) - max(0, len(self.previous) - 1)
-
-            # the size of the sub lists we want to look at
-            search_size = len(self.previous)
-
-            for i in range(search_space):
-                # slice boundary
-                j = i + search_size
-                sub = self.value[i:j]
-                idx_cmp = lambda idx: self.previous[idx] == sub[idx]
-                if idx_cmp(0) and idx_cmp(-1) and self.previous == sub:
-                    self._prepend = self.value[:i] or None
-                    self._append = self.value[j:] or None
-                    break
-
-            # if both append and prepend are still None after looking
-            # at both lists, an insert statement will be created
-            if self._prepend is self._append is None:
+        elif len(self.value) == len(self.previous):
+            # elements changed in place, update them by index if there
+            # are only a few of them
+            changed = []
+            for idx, (new, old) in enumerate(zip(self.value, self.previous)):
+                if new != old:
+                    changed.append((idx, new))
+                    if len(changed) > self.max_index_updates:
+                        break
+            if (len(changed) <= self.max_index_updates and
+                    len(changed) * 2 < len(self.value)):
+                self._index_updates = changed
+            else:
+                self._assignments = self.value
+
+        else:
+            # look for the previous list within the new one, anything
+            # before it is prepended and anything after it is appended
+            i = _find_sublist(self.value, self.previous)
+            if i >= 0:
+                j = i + len(self.previous)
+                self._prepend = self.value[:i] or None
+                self._append = self.value[j:] or None
+            else:
+                # an insert statement will be created
                 self._assignments = self.value
 
         self._analyzed = True
@@ -371,6 +461,8 @@ class MapUpdateClause(ContainerUpdateClause):
     def _analyze(self):
         if self._operation == "update":
             self._updates = self.value.keys()
+        elif self.mutations is not None:
+            self._updates = sorted(self.mutations[0]) or None
         else:
             if self.previous is None:
                 self._updates = sorted([k for k, v in self.value.items()])
@@ -398,7 +490,11 @@ class MapUpdateClause(ContainerUpdateClause):
     def is_assignment(self):
         if not self._analyzed:
             self._analyze()
-        return self.previous is None and not self._updates
+        return (
+            self.previous is None and
+            self.mutations is None and
+            not self._updates
+        )
 
     def __unicode__(self):
         qs = []
@@ -457,12 +553,15 @@ class FieldDeleteClause(BaseDeleteClause):
 class MapDeleteClause(BaseDeleteClause):
     """ removes keys from a map """
 
-    def __init__(self, field, value, previous=None):
+    def __init__(self, field, value, previous=None, removals=None):
         super(MapDeleteClause, self).__init__(field, value)
         self.value = self.value or {}
         self.previous = previous or {}
         self._analyzed = False
         self._removals = None
+        if removals is not None:
+            self._removals = sorted(removals)
+            self._analyzed = True
 
     def _analyze(self):
         self._removals = sorted([k for k in self.previous if k not in self.value])
@@ -733,11 +832,16 @@ class InsertStatement(AssignmentStatement):
         if self.if_not_exists:
             qs += ["IF NOT EXISTS"]
 
+        using_options = []
+
         if self.ttl:
-            qs += ["USING TTL {0}".format(self.ttl)]
+            using_options += ["TTL {0}".format(self.ttl)]
 
         if self.timestamp:
-            qs += ["USING TIMESTAMP {0}".format(self.timestamp_normalized)]
+            using_options += ["TIMESTAMP {0}".format(self.timestamp_normalized)]
+
+        if using_options:
+            qs += ["USING {0}".format(" AND ".join(using_options))]
 
         return ' '.join(qs)
 
@@ -802,13 +906,22 @@ class UpdateStatement(AssignmentStatement):
             conditional.set_context_id(self.context_counter)
             self.context_counter += conditional.get_context_size()
 
-    def add_update(self, column, value, operation=None, previous=None):
+    def add_update(self, column, value, operation=None, previous=None,
+                   mutations=None):
         value = column.to_database(value)
         col_type = type(column)
         container_update_type = ContainerUpdateClause.type_map.get(col_type)
         if container_update_type:
             previous = column.to_database(previous)
-            clause = container_update_type(column.db_field_name, value, operation, previous)
+            if mutations is not None:
+                mutations = column.mutations_to_database(mutations)
+            clause = container_update_type(
+                column.db_field_name,
+                value,
+                operation,
+                previous,
+                mutations=mutations,
+            )
         elif col_type == columns.Counter:
             clause = CounterUpdateClause(column.db_field_name, value, previous)
         else:
@@ -0,0 +1,378 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+import datetime
+import os
+import random
+import re
+import tempfile
+import threading
+from uuid import UUID
+
+import six
+
+from cassandra import OperationTimedOut, Timeout
+
+from cqlmapper import LWTException
+
+_TOKENS = re.compile(
+    r"""
+    (?P<identifier>"(?:[^"]|"")*")
+    | (?P<string>'(?:[^']|'')*')
+    | (?P<placeholder>%\(\w+\)s|%s|\?|:\w+)
+    | (?P<uuid>\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}
+        -[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b)
+    | (?P<blob>\b0[xX][0-9a-fA-F]*\b)
+    | (?P<number>(?<![\w.])-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?\b)
+    | (?P<space>\s+)
+    """,
+    re.VERBOSE,
+)
+_IN_LIST = re.compile(r"\bIN \(\?(?:, \?)*\)", re.IGNORECASE)
+_COMMA = re.compile(r" ?, ?")
+
+
+def _normalize_token(match):
+    kind = match.lastgroup
+    if kind == 'identifier':
+        return match.group()
+    if kind == 'space':
+        return ' '
+    return '?'
+
+
+def fingerprint(query_string):
+    """
+    Normalizes a CQL statement to its fingerprint: literal values and
+    bind markers are replaced by ``?``, IN lists are collapsed to a single
+    marker and whitespace is collapsed.
+
+    .. code-block:: python
+
+        fingerprint("SELECT * FROM t WHERE id IN (1, 2) LIMIT %(0)s")
+        # 'SELECT * FROM t WHERE id IN (?) LIMIT ?'
+    """
+    normalized = _TOKENS.sub(_normalize_token, query_string).strip()
+    normalized = _COMMA.sub(', ', normalized)
+    return _IN_LIST.sub('IN (?)', normalized)
+
+
+def _estimate_size(value):
+    """Approximate number of bytes a value takes in a response."""
+    if value is None:
+        return 0
+    if isinstance(value, six.binary_type):
+        return len(value)
+    if isinstance(value, six.text_type):
+        return len(value.encode('utf-8'))
+    if isinstance(value, bool):
+        return 1
+    if isinstance(value, (six.integer_types, float)):
+        return 8
+    if isinstance(value, UUID):
+        return 16
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return 8
+    if isinstance(value, dict):
+        return sum(
+            _estimate_size(k) + _estimate_size(v) for k, v in value.items()
+        )
+    if isinstance(value, (list, tuple, set, frozenset)):
+        return sum(_estimate_size(v) for v in value)
+    return len(six.text_type(value))
+
+
+def _row_size(row):
+    if isinstance(row, dict):
+        # column names are sent once with the result metadata
+        row = row.values()
+    return sum(_estimate_size(v) for v in row)
+
+
+def _result_rows(result):
+    rows = getattr(result, 'current_rows', result)
+    if isinstance(rows, list):
+        return rows
+    return None
+
+
+def _percentile(samples, percentile):
+    """Nearest-rank percentile of sorted samples."""
+    if not samples:
+        return None
+    rank = int(round(percentile * (len(samples) - 1)))
+    return samples[rank]
+
+
+class StatementStats(object):
+    """
+    Statistics accumulated for a statement fingerprint.
+
+    Latencies are kept in a reservoir of ``max_samples`` uniformly sampled
+    values, from which percentiles are computed.
+    """
+
+    def __init__(self, fingerprint, max_samples=1000):
+        self.fingerprint = fingerprint
+        self.operation = None
+        self.table = None
+        self.calls = 0
+        self.total_time = 0.0
+        self.min_time = None
+        self.max_time = None
+        self.rows = 0
+        self.bytes = 0
+        self.timeouts = 0
+        self.lwt_rejections = 0
+        self.errors = 0
+        self.max_samples = max_samples
+        self._samples = []
+
+    def add(self, seconds, rows=0, size=0, error=None):
+        self.calls += 1
+        self.total_time += seconds
+        if self.min_time is None or seconds < self.min_time:
+            self.min_time = seconds
+        if self.max_time is None or seconds > self.max_time:
+            self.max_time = seconds
+        self.rows += rows
+        self.bytes += size
+        if isinstance(error, LWTException):
+            self.lwt_rejections += 1
+        elif isinstance(error, (Timeout, OperationTimedOut)):
+            self.timeouts += 1
+            self.errors += 1
+        elif error is not None:
+            self.errors += 1
+        if len(self._samples) < self.max_samples:
+            self._samples.append(seconds)
+        else:
+            index = random.randint(0, self.calls - 1)
+            if index < self.max_samples:
+                self._samples[index] = seconds
+
+    def percentiles(self, percentiles):
+        samples = sorted(self._samples)
+        return dict((p, _percentile(samples, p)) for p in percentiles)
+
+    def as_dict(self, percentiles=()):
+        return {
+            'operation': self.operation,
+            'table': self.table,
+            'calls': self.calls,
+            'total_time': self.total_time,
+            'mean_time': self.total_time / self.calls if self.calls else None,
+            'min_time': self.min_time,
+            'max_time': self.max_time,
+            'percentiles': self.percentiles(percentiles),
+            'rows': self.rows,
+            'bytes': self.bytes,
+            'timeouts': self.timeouts,
+            'lwt_rejections': self.lwt_rejections,
+            'errors': self.errors,
+        }
+
+
+def _label(value):
+    value = six.text_type(value)
+    return (
+        value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    )
+
+
+class StatementRegistry(object):
+    """
+    In-process registry of the statements executed through connections,
+    aggregated per fingerprint (see :func:`fingerprint`), in the spirit of
+    ``pg_stat_statements``.
+
+    The registry is a connection middleware:
+
+    .. code-block:: python
+
+        registry = StatementRegistry()
+        conn.add_middleware(registry)
+        ...
+        registry.snapshot()
+        registry.write_prometheus('/var/lib/node_exporter/cqlmapper.prom')
+
+    Latency is the time spent executing the statement, as measured by the
+    connection. Rows are the rows of the first page of a result, and bytes
+    an estimate of their size computed from the returned values.
+
+    :param percentiles: the latency percentiles to report
+    :type percentiles: tuple
+    :param max_samples: number of latencies sampled per fingerprint to
+        compute percentiles
+    :type max_samples: int
+    :param max_fingerprints: maximum number of fingerprints tracked,
+        statements with a new fingerprint are counted in ``dropped`` once
+        it is reached
+    :type max_fingerprints: int
+    :param count_bytes: (Defaults to True) estimate the size of results
+    :type count_bytes: bool
+    """
+
+    def __init__(self, percentiles=(0.5, 0.95, 0.99), max_samples=1000,
+                 max_fingerprints=5000, count_bytes=True):
+        self.percentiles = tuple(percentiles)
+        self.max_samples = max_samples
+        self.max_fingerprints = max_fingerprints
+        self.count_bytes = count_bytes
+        self.dropped = 0
+        self._stats = {}
+        self._fingerprints = {}
+        self._lock = threading.Lock()
+
+    def __call__(self, context, call_next):
+        context.on_finish(self.record)
+        return call_next(context)
+
+    def _fingerprint(self, query_string):
+        try:
+            return self._fingerprints[query_string]
+        except KeyError:
+            pass
+        normalized = fingerprint(query_string)
+        if len(self._fingerprints) >= self.max_fingerprints * 4:
+            self._fingerprints.clear()
+        self._fingerprints[query_string] = normalized
+        return normalized
+
+    def record(self, context):
+        """Accounts for a statement executed through a connection.
+
+        :param context: the finished execution context
+        :type context: cqlmapper.middleware.ExecutionContext
+        """
+        if context.query_string is None:
+            return
+        key = self._fingerprint(context.query_string)
+        rows = _result_rows(context.result) if context.error is None else None
+        row_count = len(rows) if rows is not None else 0
+        size = 0
+        if rows and self.count_bytes:
+            size = sum(_row_size(row) for row in rows)
+        with self._lock:
+            stats = self._stats.get(key)
+            if stats is None:
+                if len(self._stats) >= self.max_fingerprints:
+                    self.dropped += 1
+                    return
+                stats = self._stats[key] = StatementStats(
+                    key,
+                    self.max_samples,
+                )
+                stats.operation = context.operation
+                stats.table = context.table
+            stats.add(
+                context.timings['execute'],
+                rows=row_count,
+                size=size,
+                error=context.error,
+            )
+
+    def snapshot(self, reset=False):
+        """
+        Returns the statistics of every fingerprint, as a dict of dicts
+        keyed by fingerprint.
+
+        :param reset: (Defaults to False) reset the registry atomically
+        :type reset: bool
+        """
+        with self._lock:
+            snapshot = dict(
+                (key, stats.as_dict(self.percentiles))
+                for key, stats in self._stats.items()
+            )
+            if reset:
+                self._stats = {}
+                self.dropped = 0
+        return snapshot
+
+    def reset(self):
+        with self._lock:
+            self._stats = {}
+            self.dropped = 0
+
+    def to_prometheus(self, prefix='cqlmapper_statement'):
+        """Returns the statistics in the Prometheus text format."""
+        snapshot = self.snapshot()
+        counters = (
+            ('calls', 'Statements executed'),
+            ('rows', 'Rows returned'),
+            ('bytes', 'Estimated bytes returned'),
+            ('timeouts', 'Statements timed out'),
+            ('lwt_rejections', 'Conditional writes not applied'),
+            ('errors', 'Statements failed'),
+        )
+        lines = []
+        for name, help_text in counters:
+            metric = '{0}_{1}_total'.format(prefix, name)
+            lines.append('# HELP {0} {1}'.format(metric, help_text))
+            lines.append('# TYPE {0} counter'.format(metric))
+            for key in sorted(snapshot):
+                lines.append('{0}{{{1}}} {2}'.format(
+                    metric,
+                    self._labels(key, snapshot[key]),
+                    snapshot[key][name],
+                ))
+        metric = '{0}_duration_seconds'.format(prefix)
+        lines.append('# HELP {0} Statement execution time'.format(metric))
+        lines.append('# TYPE {0} summary'.format(metric))
+        for key in sorted(snapshot):
+            stats = snapshot[key]
+            labels = self._labels(key, stats)
+            for percentile, value in sorted(stats['percentiles'].items()):
+                lines.append('{0}{{{1},quantile="{2}"}} {3!r}'.format(
+                    metric,
+                    labels,
+                    percentile,
+                    value,
+                ))
+            lines.append('{0}_sum{{{1}}} {2!r}'.format(
+                metric,
+                labels,
+                stats['total_time'],
+            ))
+            lines.append('{0}_count{{{1}}} {2}'.format(
+                metric,
+                labels,
+                stats['calls'],
+            ))
+        return '\n'.join(lines) + '\n'
+
+    def _labels(self, key, stats):
+        return 'fingerprint="{0}",operation="{1}",table="{2}"'.format(
+            _label(key),
+            _label(stats['operation'] or ''),
+            _label(stats['table'] or ''),
+        )
+
+    def write_prometheus(self, path, prefix='cqlmapper_statement'):
+        """
+        Writes the statistics to a file in the Prometheus text format, for
+        the textfile collector of the node exporter. The file is replaced
+        atomically.
+        """
+        text = self.to_prometheus(prefix)
+        directory = os.path.dirname(os.path.abspath(path))
+        fd, tmp = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(text)
+            os.rename(tmp, path)
+        except Exception:
+            os.unlink(tmp)
+            raise
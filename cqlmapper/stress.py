@@ -0,0 +1,587 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""
+Load generator running the statements of a model at a target rate.
+
+.. code-block:: bash
+
+    cqlmapper-stress myapp.models:User --memory --operations 10000
+    cqlmapper-stress myapp.models:User --hosts 10.0.0.1 --keyspace app \\
+        --mix write=1,read=4,update=1 --rate 2000 --concurrency 32 \\
+        --duration 60
+
+Rows are generated from the column types of the model. Their primary keys
+are drawn from a fixed population (``--partitions`` times
+``--rows-per-partition``), so reads and updates target rows which may have
+been written.
+"""
+
+from __future__ import print_function
+
+import argparse
+import datetime
+import decimal
+import importlib
+import random
+import string
+import sys
+import threading
+import time
+from timeit import default_timer
+import uuid
+
+from cassandra.util import uuid_from_time
+
+from cqlmapper import columns, CQLEngineException
+from cqlmapper.stats import StatementStats
+
+OPERATIONS = ('write', 'read', 'update')
+
+_TEXT = string.ascii_letters + string.digits
+_EPOCH = datetime.datetime(2000, 1, 1)
+_SPAN = 20 * 365 * 24 * 3600
+
+
+class StressException(CQLEngineException):
+    pass
+
+
+def _text(column, rng, settings):
+    length = settings['text_length']
+    if column.max_length is not None:
+        length = min(length, column.max_length)
+    if column.min_length is not None:
+        length = max(length, column.min_length)
+    return ''.join(rng.choice(_TEXT) for _ in range(length))
+
+
+def _integer(bits):
+    bound = 2 ** (bits - 1)
+    return lambda column, rng, settings: rng.randrange(-bound, bound)
+
+
+def _datetime(rng):
+    # millisecond precision, as stored by Cassandra
+    return _EPOCH + datetime.timedelta(milliseconds=rng.randrange(_SPAN * 1000))
+
+
+def _timeuuid(column, rng, settings):
+    return uuid_from_time(
+        time.mktime(_datetime(rng).timetuple()) + rng.random(),
+        node=rng.getrandbits(48),
+        clock_seq=rng.getrandbits(14),
+    )
+
+
+def _collection_size(rng, settings):
+    return rng.randint(0, settings['collection_size'])
+
+
+def _set(column, rng, settings):
+    return set(
+        generate_value(column.value_col, rng, settings)
+        for _ in range(_collection_size(rng, settings))
+    )
+
+
+def _list(column, rng, settings):
+    return [
+        generate_value(column.value_col, rng, settings)
+        for _ in range(_collection_size(rng, settings))
+    ]
+
+
+def _map(column, rng, settings):
+    return dict(
+        (
+            generate_value(column.key_col, rng, settings),
+            generate_value(column.value_col, rng, settings),
+        )
+        for _ in range(_collection_size(rng, settings))
+    )
+
+
+def _tuple(column, rng, settings):
+    return tuple(generate_value(t, rng, settings) for t in column.types)
+
+
+# checked in order, subclasses first
+_GENERATORS = [
+    (columns.Counter, lambda column, rng, settings: rng.randint(1, 10)),
+    (columns.TimeUUID, _timeuuid),
+    (columns.UUID, lambda column, rng, settings: uuid.UUID(
+        int=rng.getrandbits(128),
+        version=4,
+    )),
+    (columns.Ascii, _text),
+    (columns.Text, _text),
+    (columns.TinyInt, _integer(8)),
+    (columns.SmallInt, _integer(16)),
+    (columns.BigInt, _integer(64)),
+    (columns.Integer, _integer(32)),
+    (columns.VarInt, _integer(64)),
+    (columns.BaseFloat, lambda column, rng, settings: rng.uniform(-1e6, 1e6)),
+    (columns.Decimal, lambda column, rng, settings: decimal.Decimal(
+        rng.randrange(-10 ** 8, 10 ** 8)
+    ).scaleb(-4)),
+    (columns.Boolean, lambda column, rng, settings: rng.random() < 0.5),
+    (columns.DateTime, lambda column, rng, settings: _datetime(rng)),
+    (columns.Date, lambda column, rng, settings: _datetime(rng).date()),
+    (columns.Time, lambda column, rng, settings: _datetime(rng).time()),
+    (columns.Blob, lambda column, rng, settings: bytes(bytearray(
+        rng.getrandbits(8) for _ in range(settings['text_length'])
+    ))),
+    (columns.Inet, lambda column, rng, settings: '10.{0}.{1}.{2}'.format(
+        rng.randrange(256),
+        rng.randrange(256),
+        rng.randrange(256),
+    )),
+    (columns.Set, _set),
+    (columns.List, _list),
+    (columns.Map, _map),
+    (columns.Tuple, _tuple),
+]
+
+DEFAULT_SETTINGS = {
+    'text_length': 16,
+    'collection_size': 5,
+}
+
+
+def generate_value(column, rng, settings=None):
+    """
+    Returns a random value for a column, of its python type.
+
+    :param column: the column instance
+    :type column: cqlmapper.columns.Column
+    :param rng: the source of randomness
+    :type rng: random.Random
+    :param settings: (optional) ``text_length`` and ``collection_size`` of
+        the generated values
+    :type settings: dict
+    """
+    settings = settings or DEFAULT_SETTINGS
+    for column_class, generator in _GENERATORS:
+        if isinstance(column, column_class):
+            return generator(column, rng, settings)
+    raise StressException(
+        "Can't generate values for {0} columns".format(
+            column.__class__.__name__
+        )
+    )
+
+
+class RowGenerator(object):
+    """
+    Generates the rows of a model.
+
+    Primary keys are derived from an index in ``[0, population)``: the same
+    index always yields the same key, and ``rows_per_partition``
+    consecutive indexes share a partition key.
+
+    :param model: the model class
+    :param partitions: the number of distinct partition keys
+    :type partitions: int
+    :param rows_per_partition: the number of distinct clustering keys per
+        partition, ignored for models without clustering keys
+    :type rows_per_partition: int
+    :param seed: (optional) seed of the key population
+    :param text_length: the length of generated strings and blobs
+    :type text_length: int
+    :param collection_size: the maximum size of generated collections
+    :type collection_size: int
+    """
+
+    def __init__(self, model, partitions=1000, rows_per_partition=1,
+                 seed=None, text_length=16, collection_size=5):
+        self.model = model
+        self.partitions = partitions
+        if not model._clustering_keys:
+            rows_per_partition = 1
+        self.rows_per_partition = rows_per_partition
+        self.seed = seed
+        self.settings = {
+            'text_length': text_length,
+            'collection_size': collection_size,
+        }
+        self.partition_keys = list(model._partition_keys.items())
+        self.clustering_keys = list(model._clustering_keys.items())
+        self.value_columns = [
+            (name, column) for name, column in model._columns.items()
+            if not column.primary_key
+        ]
+
+    @property
+    def population(self):
+        return self.partitions * self.rows_per_partition
+
+    def _values(self, key_columns, rng):
+        return dict(
+            (name, generate_value(column, rng, self.settings))
+            for name, column in key_columns
+        )
+
+    def primary_key(self, index):
+        """Returns the primary key values of the row at ``index``."""
+        partition = index // self.rows_per_partition
+        key = self._values(
+            self.partition_keys,
+            random.Random('{0}:p:{1}'.format(self.seed, partition)),
+        )
+        key.update(self._values(
+            self.clustering_keys,
+            random.Random('{0}:c:{1}'.format(self.seed, index)),
+        ))
+        return key
+
+    def values(self, rng):
+        """Returns random values for the non key columns."""
+        return self._values(self.value_columns, rng)
+
+    def row(self, index, rng):
+        row = self.primary_key(index)
+        row.update(self.values(rng))
+        return row
+
+
+class Workload(object):
+    """
+    A weighted mix of operations on the rows of a model.
+
+    * ``write`` saves a whole generated row (increments the counters of
+      counter models),
+    * ``read`` selects a row by primary key,
+    * ``update`` updates the non key columns of a row.
+
+    :param model: the model class
+    :param mix: the relative weights of the operations, defaults to as
+        many writes as reads
+    :type mix: dict
+    :param generator: (optional) the generator of the rows, defaults to a
+        :class:`RowGenerator` with its default settings
+    :type generator: RowGenerator
+    """
+
+    def __init__(self, model, mix=None, generator=None):
+        self.model = model
+        self.generator = generator or RowGenerator(model)
+        mix = dict(mix or {'write': 1, 'read': 1})
+        unknown = set(mix) - set(OPERATIONS)
+        if unknown:
+            raise StressException(
+                "Unknown operations: {0}".format(', '.join(sorted(unknown)))
+            )
+        if mix.get('update') and not self.generator.value_columns:
+            raise StressException(
+                "{0} has no columns to update".format(model.__name__)
+            )
+        self.operations = [op for op in OPERATIONS if mix.get(op, 0) > 0]
+        if not self.operations:
+            raise StressException("The operation mix is empty")
+        total = float(sum(mix[op] for op in self.operations))
+        self._cumulative = []
+        weight = 0
+        for op in self.operations:
+            weight += mix[op] / total
+            self._cumulative.append(weight)
+
+    def choose(self, rng):
+        """Returns the name of a random operation of the mix."""
+        draw = rng.random()
+        for op, weight in zip(self.operations, self._cumulative):
+            if draw < weight:
+                return op
+        return self.operations[-1]
+
+    def _index(self, rng):
+        return rng.randrange(self.generator.population)
+
+    def write(self, conn, rng):
+        if self.model._has_counter:
+            return self.update(conn, rng)
+        self.model.create(conn, **self.generator.row(self._index(rng), rng))
+
+    def read(self, conn, rng):
+        key = self.generator.primary_key(self._index(rng))
+        list(self.model.objects(**key).iter(conn))
+
+    def update(self, conn, rng):
+        key = self.generator.primary_key(self._index(rng))
+        self.model.objects(**key).update(conn, **self.generator.values(rng))
+
+    def run_operation(self, op, conn, rng):
+        getattr(self, op)(conn, rng)
+
+
+class StressResult(object):
+    """Latencies and errors of a run, per operation."""
+
+    def __init__(self, max_samples=100000):
+        self.max_samples = max_samples
+        self.stats = {}
+        self.errors = {}
+        self.elapsed = 0.0
+        self._lock = threading.Lock()
+
+    def add(self, op, seconds, error=None):
+        with self._lock:
+            stats = self.stats.get(op)
+            if stats is None:
+                stats = self.stats[op] = StatementStats(op, self.max_samples)
+            stats.add(seconds, error=error)
+            if error is not None:
+                name = error.__class__.__name__
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+    @property
+    def operations(self):
+        return sum(s.calls for s in self.stats.values())
+
+    @property
+    def throughput(self):
+        return self.operations / self.elapsed if self.elapsed else 0.0
+
+    def summary(self, percentiles=(0.5, 0.95, 0.99)):
+        """Returns the statistics of the run as a dict."""
+        with self._lock:
+            return {
+                'elapsed': self.elapsed,
+                'operations': self.operations,
+                'throughput': self.throughput,
+                'errors': dict(self.errors),
+                'by_operation': dict(
+                    (op, stats.as_dict(percentiles))
+                    for op, stats in self.stats.items()
+                ),
+            }
+
+    def report(self, percentiles=(0.5, 0.95, 0.99)):
+        """Returns a human readable summary of the run."""
+        summary = self.summary(percentiles)
+        lines = [
+            '{0} operations in {1:.2f}s, {2:,.1f} ops/s'.format(
+                summary['operations'],
+                summary['elapsed'],
+                summary['throughput'],
+            ),
+            '{0:<8} {1:>10} {2:>8} {3} {4:>10}'.format(
+                'op',
+                'count',
+                'errors',
+                ' '.join(
+                    '{0:>10}'.format('p{0:g}'.format(p * 100))
+                    for p in percentiles
+                ),
+                'max',
+            ),
+        ]
+        by_operation = summary['by_operation']
+        ordered = [op for op in OPERATIONS if op in by_operation]
+        ordered += sorted(set(by_operation) - set(OPERATIONS))
+        for op in ordered:
+            stats = by_operation[op]
+            lines.append('{0:<8} {1:>10} {2:>8} {3} {4:>10}'.format(
+                op,
+                stats['calls'],
+                stats['errors'],
+                ' '.join(
+                    '{0:>8.2f}ms'.format(stats['percentiles'][p] * 1e3)
+                    for p in percentiles
+                ),
+                '{0:.2f}ms'.format(stats['max_time'] * 1e3),
+            ))
+        for name, count in sorted(summary['errors'].items()):
+            lines.append('{0}: {1}'.format(name, count))
+        return '\n'.join(lines)
+
+
+def run(workload, conn, operations=None, duration=None, rate=None,
+        concurrency=8, seed=None):
+    """
+    Runs a workload until ``operations`` operations were issued or for
+    ``duration`` seconds.
+
+    With a ``rate``, operations are scheduled at fixed intervals and their
+    latency is measured from their scheduled start, so that the time spent
+    waiting for a busy worker is accounted for.
+
+    :param workload: the operations to run
+    :type workload: Workload
+    :param conn: the connection executing the operations
+    :param operations: (optional) the number of operations to run
+    :type operations: int
+    :param duration: (optional) the maximum duration of the run, in seconds
+    :type duration: float
+    :param rate: (optional) the target number of operations per second
+    :type rate: float
+    :param concurrency: the number of operations running at once
+    :type concurrency: int
+    :param seed: (optional) seed of the generated operations and values
+    :rtype: StressResult
+    """
+    if operations is None and duration is None:
+        raise StressException("Either operations or duration must be set")
+    result = StressResult()
+    lock = threading.Lock()
+    issued = [0]
+    start = default_timer()
+
+    def next_operation():
+        with lock:
+            index = issued[0]
+            if operations is not None and index >= operations:
+                return None
+            if duration is not None and default_timer() - start >= duration:
+                return None
+            issued[0] += 1
+            return index
+
+    def worker(worker_id):
+        rng = random.Random('{0}:w:{1}'.format(seed, worker_id))
+        while True:
+            index = next_operation()
+            if index is None:
+                return
+            scheduled = None
+            if rate:
+                scheduled = start + index / float(rate)
+                delay = scheduled - default_timer()
+                if delay > 0:
+                    time.sleep(delay)
+            op = workload.choose(rng)
+            began = default_timer()
+            error = None
+            try:
+                workload.run_operation(op, conn, rng)
+            except Exception as e:
+                error = e
+            ended = default_timer()
+            result.add(op, ended - (scheduled or began), error)
+
+    threads = [
+        threading.Thread(target=worker, args=(i,))
+        for i in range(concurrency)
+    ]
+    for thread in threads:
+        thread.daemon = True
+        thread.start()
+    for thread in threads:
+        thread.join()
+    result.elapsed = default_timer() - start
+    return result
+
+
+def load_model(path):
+    """Imports a model from a ``package.module:Model`` path."""
+    module_name, _, name = path.partition(':')
+    if not name:
+        raise StressException(
+            "Models are given as package.module:Model, got {0}".format(path)
+        )
+    return getattr(importlib.import_module(module_name), name)
+
+
+def _parse_mix(value):
+    mix = {}
+    for part in value.split(','):
+        op, _, weight = part.partition('=')
+        mix[op.strip()] = float(weight or 1)
+    return mix
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description='Runs a synthetic workload against a cqlmapper model.',
+    )
+    parser.add_argument('model', help='the model, as package.module:Model')
+    parser.add_argument('--memory', action='store_true',
+                        help='run against an in-process MemoryConnection')
+    parser.add_argument('--hosts', default='127.0.0.1',
+                        help='comma separated contact points')
+    parser.add_argument('--port', type=int, default=9042)
+    parser.add_argument('--keyspace', help='keyspace of the model table')
+    parser.add_argument('--sync-table', action='store_true',
+                        help='create or update the table before the run')
+    parser.add_argument('--mix', type=_parse_mix, default='write=1,read=1',
+                        help='weights of the operations, as '
+                             'write=1,read=4,update=1')
+    parser.add_argument('--operations', type=int,
+                        help='number of operations to run')
+    parser.add_argument('--duration', type=float,
+                        help='duration of the run, in seconds')
+    parser.add_argument('--rate', type=float,
+                        help='target operations per second')
+    parser.add_argument('--concurrency', type=int, default=8,
+                        help='number of concurrent operations')
+    parser.add_argument('--partitions', type=int, default=1000,
+                        help='number of distinct partition keys')
+    parser.add_argument('--rows-per-partition', type=int, default=1,
+                        help='number of clustering keys per partition')
+    parser.add_argument('--text-length', type=int, default=16)
+    parser.add_argument('--collection-size', type=int, default=5)
+    parser.add_argument('--seed', help='seed of the generated data')
+    args = parser.parse_args(argv)
+    if args.operations is None and args.duration is None:
+        parser.error('one of --operations or --duration is required')
+    if not args.memory and not args.keyspace:
+        parser.error('--keyspace is required unless --memory is used')
+    return args
+
+
+def _connect(args):
+    if args.memory:
+        from cqlmapper.memory import MemoryConnection
+        return MemoryConnection(), None
+
+    from cassandra.cluster import Cluster
+    from cqlmapper.connection import Connection
+    cluster = Cluster(args.hosts.split(','), port=args.port)
+    return Connection(cluster.connect(args.keyspace)), cluster
+
+
+def main(argv=None):
+    args = _parse_args(argv)
+    model = load_model(args.model)
+    conn, cluster = _connect(args)
+    try:
+        if args.sync_table and cluster is not None:
+            from cqlmapper.management import sync_table
+            sync_table(conn, model)
+        generator = RowGenerator(
+            model,
+            partitions=args.partitions,
+            rows_per_partition=args.rows_per_partition,
+            seed=args.seed,
+            text_length=args.text_length,
+            collection_size=args.collection_size,
+        )
+        result = run(
+            Workload(model, args.mix, generator),
+            conn,
+            operations=args.operations,
+            duration=args.duration,
+            rate=args.rate,
+            concurrency=args.concurrency,
+            seed=args.seed,
+        )
+    finally:
+        if cluster is not None:
+            cluster.shutdown()
+    print(result.report())
+    return 1 if result.errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,239 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+from collections import defaultdict
+import logging
+import threading
+
+from cqlmapper import columns
+from cqlmapper.operators import EqualsOperator, InOperator
+from cqlmapper.statements import (
+    AssignmentClause,
+    AssignmentStatement,
+    DeleteStatement,
+    FieldDeleteClause,
+    InsertStatement,
+    ListUpdateClause,
+    MapDeleteClause,
+    MapUpdateClause,
+    SetUpdateClause,
+)
+
+log = logging.getLogger(__name__)
+
+# kinds of tombstones
+PARTITION = 'partition'
+ROW = 'row'
+RANGE = 'range'
+COLLECTION = 'collection'
+CELL = 'cell'
+
+
+def _fanout(statement):
+    """Number of rows targeted by the IN clauses of a statement."""
+    count = 1
+    for clause in statement.where_clauses:
+        if isinstance(clause.operator, InOperator):
+            count *= len(clause.value)
+    return count
+
+
+def _row_deletion_kind(statement, model):
+    restricted = set(
+        w.field for w in statement.where_clauses
+        if isinstance(w.operator, EqualsOperator)
+    )
+    if len(restricted) < len(statement.where_clauses):
+        return RANGE
+    if model is None:
+        return ROW
+    clustering = set(
+        c.db_field_name for c in model._clustering_keys.values()
+    )
+    if not clustering:
+        return ROW
+    if not clustering & restricted:
+        return PARTITION
+    if clustering - restricted:
+        return RANGE
+    return ROW
+
+
+def _is_collection(field, value, model):
+    if model is not None:
+        column = model._columns.get(model._db_map.get(field, field))
+        if column is not None:
+            return (
+                isinstance(column, columns.BaseContainerColumn) and
+                not column.db_type.startswith('frozen')
+            )
+    return isinstance(value, (set, frozenset, list, dict))
+
+
+def _assignment_tombstones(clause, model, insert):
+    if isinstance(clause, (SetUpdateClause, ListUpdateClause)):
+        if not clause._analyzed:
+            clause._analyze()
+    if isinstance(clause, SetUpdateClause):
+        if (clause._assignments is not None or (
+                clause.previous is None and
+                clause.mutations is None and
+                clause._additions is None and
+                clause._removals is None)):
+            yield COLLECTION, 1
+        if clause._removals:
+            yield CELL, len(clause._removals)
+    elif isinstance(clause, ListUpdateClause):
+        if clause._assignments is not None:
+            yield COLLECTION, 1
+    elif isinstance(clause, MapUpdateClause):
+        if clause.is_assignment:
+            yield COLLECTION, 1
+    elif type(clause) is AssignmentClause:
+        if clause.value is None:
+            yield CELL, 1
+        elif insert and _is_collection(clause.field, clause.value, model):
+            yield COLLECTION, 1
+
+
+def count_tombstones(statement, model=None):
+    """
+    Returns the tombstones a write statement generates, as a list of
+    ``(column, kind, count)`` tuples. ``column`` is None for partition, row
+    and range deletions.
+
+    :param statement: the statement to inspect
+    :type statement: BaseCQLStatement
+    :param model: (optional) the model the statement was built for, used to
+        tell partition deletions from row deletions, and frozen from
+        non-frozen collections
+    """
+    tombstones = []
+    if isinstance(statement, DeleteStatement):
+        fanout = _fanout(statement)
+        if not statement.fields:
+            kind = _row_deletion_kind(statement, model)
+            tombstones.append((None, kind, fanout))
+        for field in statement.fields:
+            if isinstance(field, MapDeleteClause):
+                if not field._analyzed:
+                    field._analyze()
+                count = len(field._removals)
+            elif isinstance(field, FieldDeleteClause):
+                count = 1
+            else:
+                continue
+            if count:
+                tombstones.append((field.field, CELL, count * fanout))
+    elif isinstance(statement, AssignmentStatement):
+        insert = isinstance(statement, InsertStatement)
+        fanout = 1 if insert else _fanout(statement)
+        for clause in statement.assignments:
+            for kind, count in _assignment_tombstones(clause, model, insert):
+                tombstones.append((clause.field, kind, count * fanout))
+    return tombstones
+
+
+def _log_budget_exceeded(count, statements):
+    log.warning(
+        "Write generating %d tombstones: %s",
+        count,
+        '; '.join(str(s) for s in statements),
+    )
+
+
+class TombstoneStats(object):
+    """
+    Counts the tombstones generated by the writes sent through a connection,
+    per table, column and kind of tombstone.
+
+    .. code-block:: python
+
+        stats = TombstoneStats(budget=100)
+        conn = Connection(session, tombstone_stats=stats)
+        ...
+        stats.stats()
+        # {'"ks"."users"': {'emails': {'collection': 12}, None: {'row': 3}}}
+
+    Tombstones are counted from the statements built by the mapper, before
+    they are sent:
+
+    * ``partition``, ``row`` and ``range`` for deletions of whole rows,
+    * ``collection`` for collections overwritten as a whole, which writes a
+      range tombstone covering the previous content,
+    * ``cell`` for deleted or nulled columns, removed set elements and
+      removed map keys.
+
+    :param budget: (optional) maximum number of tombstones a single write
+        (statement or batch) should generate
+    :type budget: int or None
+    :param on_budget_exceeded: (optional) called with the number of
+        tombstones and the list of statements of a write exceeding the
+        budget, logs a warning by default
+    :type on_budget_exceeded: callable
+    """
+
+    def __init__(self, budget=None, on_budget_exceeded=None):
+        self.budget = budget
+        self.on_budget_exceeded = on_budget_exceeded or _log_budget_exceeded
+        self.writes = 0
+        self._counts = defaultdict(int)
+        self._lock = threading.Lock()
+
+    def record(self, statements, models=None):
+        """
+        Counts the tombstones generated by a write made of ``statements``,
+        and returns their number.
+
+        :param statements: the statements of the write
+        :type statements: list
+        :param models: (optional) the model of each statement
+        :type models: list
+        """
+        models = models or [None] * len(statements)
+        total = 0
+        with self._lock:
+            for statement, model in zip(statements, models):
+                for column, kind, count in count_tombstones(statement, model):
+                    self._counts[(statement.table, column, kind)] += count
+                    total += count
+            if total:
+                self.writes += 1
+        if self.budget is not None and total > self.budget:
+            self.on_budget_exceeded(total, statements)
+        return total
+
+    def stats(self):
+        """
+        Returns the number of tombstones generated per table, column and
+        kind, as nested dicts.
+        """
+        stats = {}
+        with self._lock:
+            for (table, column, kind), count in self._counts.items():
+                stats.setdefault(table, {}).setdefault(column, {})[kind] = count
+        return stats
+
+    def totals(self):
+        """Returns the number of tombstones generated per table."""
+        totals = defaultdict(int)
+        with self._lock:
+            for (table, _, _), count in self._counts.items():
+                totals[table] += count
+        return dict(totals)
+
+    def reset(self):
+        with self._lock:
+            self._counts.clear()
+            self.writes = 0
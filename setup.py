@@ -3,11 +3,19 @@ from setuptools import setup, find_packages
 
 setup(
     name="cqlmapper",
-    packages=find_packages(),
+    packages=find_packages(exclude=['benchmarks']),
     install_requires=[
         "cassandra-driver",
     ],
+    extras_require={
+        "numpy": ["numpy"],
+    },
     include_package_data=True,
+    entry_points={
+        "console_scripts": [
+            "cqlmapper-stress = cqlmapper.stress:main",
+        ],
+    },
     tests_require=[
         "mock",
         "nose",
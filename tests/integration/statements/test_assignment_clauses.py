@@ -16,7 +16,7 @@ try:
 except ImportError:
     import unittest  # noqa
 
-from cqlmapper.statements import AssignmentClause, SetUpdateClause, ListUpdateClause, MapUpdateClause, MapDeleteClause, FieldDeleteClause, CounterUpdateClause
+from cqlmapper.statements import AssignmentClause, SetUpdateClause, ListUpdateClause, MapUpdateClause, MapDeleteClause, FieldDeleteClause, CounterUpdateClause, _find_sublist
 
 
 class AssignmentClauseTests(unittest.TestCase):
@@ -264,6 +264,44 @@ class ListUpdateClauseTests(unittest.TestCase):
         c.update_context(ctx)
         self.assertEqual(ctx, {'0': [1, 2, 3]})
 
+    def test_update_by_index(self):
+        c = ListUpdateClause('s', [1, 2, 9, 4, 5], previous=[1, 2, 3, 4, 6])
+        c._analyze()
+        c.set_context_id(0)
+
+        self.assertIsNone(c._assignments)
+        self.assertIsNone(c._append)
+        self.assertIsNone(c._prepend)
+
+        self.assertEqual(c.get_context_size(), 2)
+        self.assertEqual(str(c), '"s"[2] = %(0)s, "s"[4] = %(1)s')
+
+        ctx = {}
+        c.update_context(ctx)
+        self.assertEqual(ctx, {'0': 9, '1': 5})
+
+    def test_many_changes_rewrite_the_list(self):
+        previous = list(range(100))
+        value = [-i for i in previous]
+        c = ListUpdateClause('s', value, previous=previous)
+        c._analyze()
+        self.assertEqual(c._assignments, value)
+        self.assertIsNone(c._index_updates)
+
+    def test_append_to_long_list(self):
+        previous = [i % 7 for i in range(5000)]
+        c = ListUpdateClause('s', [0] + previous + [1, 2], previous=previous)
+        c._analyze()
+        self.assertIsNone(c._assignments)
+        self.assertEqual(c._prepend, [0])
+        self.assertEqual(c._append, [1, 2])
+
+    def test_find_sublist(self):
+        self.assertEqual(_find_sublist([1, 2, 1, 2, 3], [1, 2, 3]), 2)
+        self.assertEqual(_find_sublist([1, 1, 1, 2], [1, 1, 2]), 1)
+        self.assertEqual(_find_sublist([1, 2], [2, 1]), -1)
+        self.assertEqual(_find_sublist([[1], [2]], [[2]]), 1)
+
 
 class MapUpdateTests(unittest.TestCase):
 
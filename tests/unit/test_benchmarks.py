@@ -0,0 +1,29 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest  # noqa
+
+from benchmarks.mapper import BENCHMARKS
+from benchmarks.run import run_benchmark
+
+
+class BenchmarksTest(unittest.TestCase):
+
+    def test_benchmarks_run(self):
+        for name in BENCHMARKS:
+            result = run_benchmark(name, min_time=0, repeat=1)
+            self.assertGreater(result['ops'], 0, name)
@@ -0,0 +1,228 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest  # noqa
+
+import re
+import threading
+
+from cqlmapper import columns, ConnectionInterface
+from cqlmapper.buffers import (
+    BufferClosed,
+    BufferException,
+    BufferFull,
+    CounterBuffer,
+    WriteBehindBuffer,
+)
+from cqlmapper.models import Model
+
+
+class FakeConnection(ConnectionInterface):
+
+    def __init__(self, error=None):
+        self.executed = []
+        self.error = error
+        self.release = threading.Event()
+        self.release.set()
+        self.written = threading.Event()
+
+    def execute(self, statement, *args, **kwargs):
+        self.release.wait(5)
+        self.executed.append(statement)
+        self.written.set()
+        if self.error is not None:
+            raise self.error
+        return []
+
+
+class BufferedEvent(Model):
+    source = columns.Integer(partition_key=True)
+    id = columns.Integer(primary_key=True)
+    payload = columns.Text()
+
+
+class BufferedCounter(Model):
+    id = columns.Integer(primary_key=True)
+    hits = columns.Counter()
+
+
+class BufferedPageViews(Model):
+    site = columns.Integer(partition_key=True)
+    page = columns.Text(primary_key=True)
+    views = columns.Counter()
+    uniques = columns.Counter()
+
+
+class WriteBehindBufferTest(unittest.TestCase):
+
+    def test_writes_are_deferred(self):
+        conn = FakeConnection()
+        with WriteBehindBuffer(conn, flush_interval=None) as buffer:
+            for source in range(2):
+                for i in range(3):
+                    BufferedEvent(source=source, id=i).save(buffer)
+            self.assertEqual(conn.executed, [])
+            self.assertEqual(len(buffer), 6)
+        self.assertEqual(len(conn.executed), 2)
+        for batch in conn.executed:
+            self.assertIn('BEGIN UNLOGGED  BATCH', batch)
+            self.assertEqual(batch.count('INSERT'), 3)
+
+    def test_timestamps_are_increasing(self):
+        conn = FakeConnection()
+        with WriteBehindBuffer(conn, flush_interval=None) as buffer:
+            for i in range(3):
+                BufferedEvent(source=1, id=i).save(buffer)
+        timestamps = [
+            int(ts) for ts in re.findall(r'TIMESTAMP (\d+)', conn.executed[0])
+        ]
+        self.assertEqual(len(timestamps), 3)
+        self.assertEqual(timestamps, sorted(set(timestamps)))
+
+    def test_overwritten_writes_are_coalesced(self):
+        conn = FakeConnection()
+        with WriteBehindBuffer(conn, flush_interval=None) as buffer:
+            BufferedEvent(source=1, id=1, payload='a').save(buffer)
+            BufferedEvent(source=1, id=1, payload='b').save(buffer)
+            BufferedEvent(source=1, id=2, payload='a').save(buffer)
+            BufferedEvent(source=1, id=2).delete(buffer)
+            self.assertEqual(len(buffer), 2)
+            self.assertEqual(buffer.coalesced, 2)
+        self.assertEqual(conn.executed[0].count('INSERT'), 1)
+        self.assertEqual(conn.executed[0].count('DELETE'), 1)
+
+    def test_flush_size_triggers_flush(self):
+        conn = FakeConnection()
+        buffer = WriteBehindBuffer(conn, flush_size=2, flush_interval=None)
+        BufferedEvent(source=1, id=1).save(buffer)
+        BufferedEvent(source=2, id=1).save(buffer)
+        self.assertTrue(conn.written.wait(5))
+        buffer.close()
+        self.assertEqual(len(conn.executed), 2)
+
+    def test_flush_interval(self):
+        conn = FakeConnection()
+        buffer = WriteBehindBuffer(conn, flush_interval=0.01)
+        BufferedEvent(source=1, id=1).save(buffer)
+        self.assertTrue(conn.written.wait(5))
+        buffer.close()
+        self.assertEqual(len(conn.executed), 1)
+
+    def test_close(self):
+        buffer = WriteBehindBuffer(FakeConnection(), flush_interval=None)
+        buffer.close()
+        buffer.close()
+        self.assertTrue(buffer.closed)
+        with self.assertRaises(BufferClosed):
+            BufferedEvent(source=1, id=1).save(buffer)
+
+    def test_backpressure(self):
+        conn = FakeConnection()
+        conn.release.clear()
+        buffer = WriteBehindBuffer(
+            conn,
+            flush_size=1,
+            flush_interval=None,
+            max_pending=1,
+            put_timeout=0.05,
+        )
+        BufferedEvent(source=1, id=1).save(buffer)
+        with self.assertRaises(BufferFull):
+            BufferedEvent(source=1, id=2).save(buffer)
+        conn.release.set()
+        buffer.close()
+
+    def test_on_error(self):
+        errors = []
+        conn = FakeConnection(error=ValueError('boom'))
+        buffer = WriteBehindBuffer(
+            conn,
+            flush_interval=None,
+            on_error=lambda exc, statements: errors.append((exc, statements)),
+        )
+        BufferedEvent(source=1, id=1).save(buffer)
+        buffer.flush()
+        self.assertEqual(len(errors), 1)
+        self.assertIsInstance(errors[0][0], ValueError)
+        self.assertEqual(len(errors[0][1]), 1)
+        buffer.close()
+
+    def test_unsupported_writes(self):
+        with WriteBehindBuffer(FakeConnection(), flush_interval=None) as buffer:
+            with self.assertRaises(BufferException):
+                BufferedEvent(source=1, id=1).if_not_exists().save(buffer)
+            with self.assertRaises(BufferException):
+                BufferedCounter(id=1, hits=1).update(buffer)
+            with self.assertRaises(BufferException):
+                buffer.execute('SELECT * FROM events')
+
+
+class CounterBufferTest(unittest.TestCase):
+
+    def test_increments_are_summed(self):
+        conn = FakeConnection()
+        with CounterBuffer(BufferedPageViews, flush_interval=None) as buffer:
+            for _ in range(10):
+                buffer.incr(conn, {'site': 1, 'page': 'a'}, 'views')
+            buffer.incr(conn, {'site': 1, 'page': 'a'}, 'views', 5)
+            buffer.decr(conn, {'site': 1, 'page': 'a'}, 'uniques', 2)
+            buffer.incr(conn, {'site': 1, 'page': 'b'}, 'views')
+            buffer.incr(conn, {'site': 2, 'page': 'a'}, 'views')
+            self.assertEqual(len(buffer), 4)
+            self.assertEqual(buffer.increments, 14)
+            self.assertEqual(conn.executed, [])
+        self.assertEqual(len(conn.executed), 2)
+        batch = conn.executed[0]
+        self.assertIn('BEGIN COUNTER  BATCH', batch)
+        self.assertEqual(batch.count('UPDATE'), 2)
+        self.assertIn('"views" = "views" +', batch)
+        self.assertIn('"uniques" = "uniques" -', batch)
+
+    def test_flush_once(self):
+        conn = FakeConnection()
+        buffer = CounterBuffer(BufferedPageViews, flush_interval=None)
+        buffer.incr(conn, {'site': 1, 'page': 'a'}, 'views')
+        buffer.flush()
+        buffer.close()
+        buffer.close()
+        self.assertEqual(len(conn.executed), 1)
+        with self.assertRaises(BufferClosed):
+            buffer.incr(conn, {'site': 1, 'page': 'a'}, 'views')
+
+    def test_zero_deltas_are_skipped(self):
+        conn = FakeConnection()
+        with CounterBuffer(BufferedPageViews, flush_interval=None) as buffer:
+            buffer.incr(conn, {'site': 1, 'page': 'a'}, 'views')
+            buffer.decr(conn, {'site': 1, 'page': 'a'}, 'views')
+        self.assertEqual(conn.executed, [])
+
+    def test_flush_interval(self):
+        conn = FakeConnection()
+        buffer = CounterBuffer(BufferedPageViews, flush_interval=0.01)
+        buffer.incr(conn, {'site': 1, 'page': 'a'}, 'views')
+        self.assertTrue(conn.written.wait(5))
+        buffer.close()
+        self.assertEqual(len(conn.executed), 1)
+
+    def test_invalid_increments(self):
+        with self.assertRaises(BufferException):
+            CounterBuffer(BufferedEvent)
+        with CounterBuffer(BufferedPageViews, flush_interval=None) as buffer:
+            with self.assertRaises(BufferException):
+                buffer.incr(FakeConnection(), {'site': 1}, 'views')
+            with self.assertRaises(BufferException):
+                buffer.incr(FakeConnection(), {'site': 1, 'page': 'a'}, 'page')
@@ -0,0 +1,276 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest  # noqa
+
+from cqlmapper import columns, ConnectionInterface
+from cqlmapper.batch import Batch
+from cqlmapper.cache import LRUCache, MISSING, QueryCache, estimate_size
+from cqlmapper.models import Model
+from cqlmapper.statements import SelectStatement
+
+
+class FakeConnection(ConnectionInterface):
+
+    def __init__(self, rows=None):
+        self.rows = rows or []
+        self.statements = []
+
+    def execute(self, statement, *args, **kwargs):
+        self.statements.append(statement)
+        if isinstance(statement, SelectStatement):
+            return [dict(r) for r in self.rows]
+        return []
+
+
+class CachedModel(Model):
+    __cache__ = LRUCache(maxsize=2)
+
+    key = columns.Integer(primary_key=True)
+    value = columns.Text()
+
+
+class QueryCachedModel(Model):
+    __query_cache__ = QueryCache(ttl=60)
+
+    partition = columns.Integer(primary_key=True)
+    cluster = columns.Integer(primary_key=True)
+    tags = columns.Set(columns.Text)
+
+
+class LRUCacheTest(unittest.TestCase):
+
+    def test_hits_and_misses(self):
+        cache = LRUCache(maxsize=10)
+        self.assertIsNone(cache.get('a'))
+        cache.set('a', 1)
+        self.assertEqual(cache.get('a'), 1)
+        self.assertEqual(cache.stats(), {
+            'hits': 1,
+            'misses': 1,
+            'evictions': 0,
+            'size': 1,
+        })
+
+    def test_lru_eviction(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        cache.get('a')
+        cache.set('c', 3)
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.evictions, 1)
+
+    def test_ttl_expiry(self):
+        now = [100.0]
+        cache = LRUCache(maxsize=2, ttl=10, timer=lambda: now[0])
+        cache.set('a', 1)
+        now[0] += 5
+        self.assertEqual(cache.get('a'), 1)
+        now[0] += 5
+        self.assertIsNone(cache.get('a'))
+        self.assertEqual(cache.evictions, 1)
+        self.assertEqual(len(cache), 0)
+
+    def test_negative_entries(self):
+        cache = LRUCache()
+        cache.set('a', MISSING)
+        self.assertIs(cache.get('a'), MISSING)
+        self.assertNotIn('a', cache)
+
+    def test_sets_after_an_invalidation_are_dropped(self):
+        cache = LRUCache(maxsize=2)
+        generation = cache.generation('a')
+        cache.invalidate('a')
+        self.assertFalse(cache.set('a', 1, generation))
+        self.assertNotIn('a', cache)
+        self.assertTrue(cache.set('a', 1, cache.generation('a')))
+
+        generation = cache.generation('a')
+        cache.clear()
+        self.assertFalse(cache.set('a', 1, generation))
+
+        # the generations kept are bounded by maxsize
+        generation = cache.generation('a')
+        for key in 'bcd':
+            cache.invalidate(key)
+        self.assertLessEqual(len(cache._generations), 2)
+        self.assertFalse(cache.set('a', 1, generation))
+
+
+class ModelCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        CachedModel.__cache__.clear()
+
+    def test_get_served_from_cache(self):
+        conn = FakeConnection([{'value': 'one'}])
+        first = CachedModel.get(conn, key=1)
+        second = CachedModel.get(conn, key=1)
+        self.assertEqual(len(conn.statements), 1)
+        self.assertEqual(first, second)
+        self.assertIsNot(first, second)
+        self.assertEqual(second.key, 1)
+        self.assertEqual(second.value, 'one')
+
+    def test_does_not_exist_is_cached(self):
+        conn = FakeConnection()
+        for _ in range(2):
+            with self.assertRaises(CachedModel.DoesNotExist):
+                CachedModel.get(conn, key=1)
+        self.assertEqual(len(conn.statements), 1)
+
+    def test_partial_key_lookups_are_not_cached(self):
+        conn = FakeConnection([{'key': 1, 'value': 'one'}])
+        CachedModel.objects.filter(key__in=[1]).get(conn)
+        CachedModel.objects.filter(key__in=[1]).get(conn)
+        self.assertEqual(len(conn.statements), 2)
+
+    def test_save_invalidates(self):
+        conn = FakeConnection()
+        with self.assertRaises(CachedModel.DoesNotExist):
+            CachedModel.get(conn, key=1)
+        CachedModel(key=1, value='one').save(conn)
+        conn.rows = [{'value': 'one'}]
+        self.assertEqual(CachedModel.get(conn, key=1).value, 'one')
+
+    def test_queryset_update_invalidates(self):
+        conn = FakeConnection([{'value': 'one'}])
+        CachedModel.get(conn, key=1)
+        CachedModel.objects(key=1).update(conn, value='two')
+        conn.rows = [{'value': 'two'}]
+        self.assertEqual(CachedModel.get(conn, key=1).value, 'two')
+
+    def test_reads_racing_a_write_are_not_cached(self):
+        conn = FakeConnection([{'value': 'one'}])
+        execute = conn.execute
+
+        def write_during_read(statement, *args, **kwargs):
+            conn.execute = execute
+            rows = execute(statement, *args, **kwargs)
+            CachedModel.objects(key=1).update(conn, value='two')
+            return rows
+
+        conn.execute = write_during_read
+        self.assertEqual(CachedModel.get(conn, key=1).value, 'one')
+        conn.rows = [{'value': 'two'}]
+        self.assertEqual(CachedModel.get(conn, key=1).value, 'two')
+
+    def test_consistency_bypasses_the_cache(self):
+        conn = FakeConnection([{'value': 'one'}])
+        CachedModel.get(conn, key=1)
+        CachedModel.objects.consistency(1).get(conn, key=1)
+        self.assertEqual(len(conn.statements), 2)
+
+    def test_queryset_update_in_a_batch_invalidates_once_executed(self):
+        conn = FakeConnection([{'value': 'one'}])
+        CachedModel.get(conn, key=1)
+        batch = Batch(conn)
+        CachedModel.objects(key=1).update(batch, value='two')
+        # read before the batch is executed
+        CachedModel.get(conn, key=1)
+        batch.execute_batch()
+        batch._execute_callbacks()
+        conn.rows = [{'value': 'two'}]
+        self.assertEqual(CachedModel.get(conn, key=1).value, 'two')
+
+    def test_queryset_delete_invalidates(self):
+        conn = FakeConnection([{'value': 'one'}])
+        CachedModel.get(conn, key=1)
+        CachedModel.objects(key=1).delete(conn)
+        conn.rows = []
+        with self.assertRaises(CachedModel.DoesNotExist):
+            CachedModel.get(conn, key=1)
+
+
+class QueryCacheTest(unittest.TestCase):
+
+    def test_memory_budget(self):
+        cache = QueryCache(max_bytes=100)
+        rows = [{'a': 'x' * 40}]
+        self.assertTrue(cache.set('t', 1, rows))
+        self.assertTrue(cache.set('t', 2, rows))
+        self.assertTrue(cache.set('t', 3, rows))
+        self.assertLessEqual(cache.size, 100)
+        self.assertIsNone(cache.get(1))
+        self.assertIsNone(cache.get(2))
+        self.assertEqual(cache.get(3), rows)
+        self.assertEqual(cache.evictions, 2)
+        self.assertFalse(cache.set('t', 4, [{'a': 'x' * 200}]))
+
+    def test_invalidate_table(self):
+        cache = QueryCache()
+        cache.set('a', 1, [])
+        cache.set('b', 2, [])
+        cache.invalidate_table('a')
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(cache.get(2), [])
+        self.assertEqual(cache.stats()['entries'], 1)
+
+    def test_ttl_expiry(self):
+        now = [0.0]
+        cache = QueryCache(ttl=1, timer=lambda: now[0])
+        cache.set('a', 1, [])
+        now[0] = 2
+        self.assertIsNone(cache.get(1))
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.size, 0)
+
+    def test_estimate_size(self):
+        self.assertEqual(estimate_size('abc'), 3)
+        self.assertEqual(estimate_size({'a': 1}), 1 + 8 + 8)
+
+
+class ModelQueryCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        QueryCachedModel.__query_cache__.clear()
+
+    def test_reads_served_from_cache(self):
+        conn = FakeConnection([{'cluster': 1, 'tags': set(['a'])}])
+        qs = QueryCachedModel.objects(partition=1)
+        first = qs.find_all(conn)
+        second = qs.all().find_all(conn)
+        self.assertEqual(len(conn.statements), 1)
+        self.assertEqual(first, second)
+        second[0].tags.add('b')
+        self.assertEqual(qs.all().find_all(conn)[0].tags, set(['a']))
+
+    def test_values_list_and_count(self):
+        conn = FakeConnection([{'count': 3}])
+        qs = QueryCachedModel.objects(partition=1)
+        self.assertEqual(qs.count(conn), 3)
+        self.assertEqual(qs.all().count(conn), 3)
+        self.assertEqual(len(conn.statements), 1)
+
+        conn.rows = [{'cluster': 1}, {'cluster': 2}]
+        values = qs.values_list('cluster', flat=True)
+        self.assertEqual(values.find_all(conn), [1, 2])
+        self.assertEqual(values.all().find_all(conn), [1, 2])
+        self.assertEqual(len(conn.statements), 2)
+
+    def test_writes_invalidate_table(self):
+        conn = FakeConnection([{'cluster': 1, 'tags': set()}])
+        qs = QueryCachedModel.objects(partition=1)
+        qs.find_all(conn)
+        QueryCachedModel(partition=1, cluster=2).save(conn)
+        qs.all().find_all(conn)
+        QueryCachedModel.objects(partition=1, cluster=2).delete(conn)
+        qs.all().find_all(conn)
+        selects = [s for s in conn.statements if isinstance(s, SelectStatement)]
+        self.assertEqual(len(selects), 3)
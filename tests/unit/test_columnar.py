@@ -0,0 +1,118 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest  # noqa
+
+import datetime
+
+from mock import patch
+
+from cqlmapper import columnar, columns
+from cqlmapper.columnar import ColumnarException, ColumnBuffer
+from cqlmapper.memory import MemoryConnection
+from cqlmapper.models import Model
+
+numpy = columnar.numpy
+
+
+class Reading(Model):
+    sensor = columns.Integer(partition_key=True)
+    seq = columns.BigInt(primary_key=True)
+    at = columns.DateTime()
+    value = columns.Double()
+    valid = columns.Boolean()
+    label = columns.Text()
+
+
+START = datetime.datetime(2016, 1, 1)
+
+
+class ColumnBufferTest(unittest.TestCase):
+
+    def test_typed_buffers(self):
+        buf = ColumnBuffer(Reading._columns['seq'])
+        buf.append(3)
+        buf.append(None)
+        self.assertEqual(buf.values.typecode, 'q')
+        self.assertEqual(list(buf.values), [3, 0])
+        self.assertEqual(buf.nulls, [1])
+        buf = ColumnBuffer(Reading._columns['at'])
+        buf.append(START)
+        self.assertEqual(list(buf.values), [1451606400000])
+        buf = ColumnBuffer(Reading._columns['label'])
+        buf.append('a')
+        self.assertEqual(buf.values, ['a'])
+
+    def test_numpy_is_required(self):
+        with patch.object(columnar, 'numpy', None):
+            with self.assertRaises(ColumnarException):
+                Reading.objects(sensor=1).to_columns(MemoryConnection())
+
+
+@unittest.skipIf(numpy is None, 'requires numpy')
+class ToColumnsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = MemoryConnection()
+        for i in range(5):
+            Reading.create(
+                self.conn,
+                sensor=1,
+                seq=i,
+                at=START + datetime.timedelta(seconds=i),
+                value=i / 2.0 if i != 3 else None,
+                valid=i % 2 == 0 if i != 4 else None,
+                label=str(i),
+            )
+        Reading.create(self.conn, sensor=2, seq=0)
+
+    def test_to_columns(self):
+        arrays = Reading.objects(sensor=1).to_columns(self.conn)
+        self.assertEqual(
+            sorted(arrays),
+            ['at', 'label', 'sensor', 'seq', 'valid', 'value'],
+        )
+        self.assertEqual(arrays['seq'].dtype, numpy.int64)
+        self.assertEqual(list(arrays['seq']), [0, 1, 2, 3, 4])
+        self.assertEqual(list(arrays['sensor']), [1] * 5)
+        self.assertEqual(arrays['at'].dtype, numpy.dtype('datetime64[ms]'))
+        self.assertEqual(
+            arrays['at'][1],
+            numpy.datetime64('2016-01-01T00:00:01', 'ms'),
+        )
+        self.assertEqual(arrays['value'].dtype, numpy.float64)
+        self.assertTrue(numpy.isnan(arrays['value'][3]))
+        self.assertTrue(isinstance(arrays['valid'], numpy.ma.MaskedArray))
+        self.assertEqual(list(arrays['valid'].mask), [False] * 4 + [True])
+        self.assertEqual(arrays['label'].dtype, object)
+        self.assertEqual(list(arrays['label']), ['0', '1', '2', '3', '4'])
+
+    def test_values_list_to_numpy(self):
+        queryset = Reading.objects(sensor=1).filter(seq__lt=3)
+        result = queryset.values_list('seq', 'value').to_numpy(self.conn)
+        self.assertEqual(result.dtype.names, ('seq', 'value'))
+        self.assertEqual(list(result['seq']), [0, 1, 2])
+        self.assertEqual(list(result['value']), [0, 0.5, 1])
+
+    def test_masked_structured_array(self):
+        result = Reading.objects(sensor=1).values_list(
+            'seq',
+            'valid',
+        ).to_numpy(self.conn)
+        self.assertTrue(isinstance(result, numpy.ma.MaskedArray))
+        self.assertTrue(result.mask['valid'][4])
+        self.assertFalse(result.mask['seq'][4])
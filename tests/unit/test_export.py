@@ -0,0 +1,160 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest  # noqa
+
+import datetime
+import os
+import shutil
+import tempfile
+from uuid import UUID
+
+from cqlmapper import columnar, columns
+from cqlmapper.export import Export, export_table, ExportException
+from cqlmapper.memory import MemoryConnection
+from cqlmapper.models import Model
+from cqlmapper.scan import (
+    iter_range_rows,
+    MAX_TOKEN,
+    MIN_TOKEN,
+    scan_ranges,
+    split_ring,
+)
+
+numpy = columnar.numpy
+
+
+class Reading(Model):
+    sensor = columns.UUID(partition_key=True)
+    seq = columns.Integer(primary_key=True)
+    at = columns.DateTime()
+    value = columns.Double()
+    label = columns.Text()
+    raw = columns.Blob()
+    tags = columns.Set(columns.Text)
+
+
+START = datetime.datetime(2016, 1, 1)
+
+
+class ScanTest(unittest.TestCase):
+
+    def test_split_ring_covers_the_ring(self):
+        ranges = split_ring(7)
+        self.assertEqual(len(ranges), 7)
+        self.assertEqual(ranges[0].start, MIN_TOKEN)
+        self.assertEqual(ranges[-1].end, MAX_TOKEN)
+        for previous, token_range in zip(ranges, ranges[1:]):
+            self.assertEqual(previous.end, token_range.start)
+
+    def test_ranges_read_every_partition_once(self):
+        conn = MemoryConnection()
+        for i in range(30):
+            Reading.create(conn, sensor=UUID(int=i), seq=0)
+
+        def read(token_range):
+            return [
+                row['sensor'] for row in
+                iter_range_rows(conn, Reading.objects.all(), token_range)
+            ]
+
+        sensors = []
+        for _, rows in scan_ranges(read, split_ring(8), concurrency=3):
+            sensors.extend(rows)
+        self.assertEqual(
+            sorted(sensors),
+            [UUID(int=i) for i in range(30)],
+        )
+
+
+@unittest.skipIf(numpy is None, 'requires numpy')
+class ExportTest(unittest.TestCase):
+
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.conn = MemoryConnection()
+        for i in range(20):
+            Reading.create(
+                self.conn,
+                sensor=UUID(int=i % 4),
+                seq=i,
+                at=START + datetime.timedelta(minutes=i),
+                value=float(i) if i != 5 else None,
+                label=u'r\xe9{0}'.format(i) if i != 6 else None,
+                raw=b'\x00\x01' * i,
+                tags={'t{0}'.format(i)},
+            )
+
+    def _by_seq(self, export, values):
+        order = numpy.argsort(export.array('seq'))
+        return [values[int(i)] for i in order]
+
+    def test_export_roundtrip(self):
+        schema = export_table(
+            self.conn,
+            Reading,
+            self.path,
+            splits=4,
+            concurrency=2,
+        )
+        self.assertEqual(schema['rows'], 20)
+        export = Export(self.path)
+        self.assertEqual(len(export), 20)
+        self.assertEqual(
+            sorted(export.array('seq').tolist()),
+            list(range(20)),
+        )
+        self.assertTrue(isinstance(export.array('value'), numpy.memmap))
+        self.assertEqual(export.array('at').dtype.kind, 'M')
+        at = self._by_seq(export, export.array('at'))
+        self.assertEqual(
+            at[3],
+            numpy.datetime64('2016-01-01T00:03:00', 'ms'),
+        )
+        nulls = self._by_seq(export, export.nulls('value'))
+        self.assertEqual([i for i, n in enumerate(nulls) if n], [5])
+        labels = self._by_seq(export, list(export.values('label')))
+        self.assertEqual(labels[1], u'r\xe91')
+        self.assertIsNone(labels[6])
+        raw = self._by_seq(export, list(export.values('raw')))
+        self.assertEqual(raw[3], b'\x00\x01' * 3)
+        tags = self._by_seq(export, list(export.values('tags')))
+        self.assertEqual(tags[2], ['t2'])
+        sensors = export.array('sensor')
+        self.assertEqual(
+            set(UUID(bytes=bytes(s)) for s in sensors),
+            set(UUID(int=i) for i in range(4)),
+        )
+
+    def test_selected_columns(self):
+        export_table(
+            self.conn,
+            Reading.objects.only(['seq', 'label']),
+            self.path,
+            splits=2,
+        )
+        export = Export(self.path)
+        self.assertEqual(export.names, ['seq', 'label'])
+        with self.assertRaises(ExportException):
+            export.array('label')
+        with self.assertRaises(ExportException):
+            export.array('value')
+
+    def test_incomplete_export(self):
+        with self.assertRaises(ExportException):
+            Export(os.path.join(self.path, 'missing'))
@@ -0,0 +1,169 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest  # noqa
+
+import datetime
+import io
+import json
+import os
+import shutil
+import tempfile
+from uuid import UUID
+
+from cqlmapper import columns
+from cqlmapper.loader import BulkLoader, LoaderException, parse_value
+from cqlmapper.memory import MemoryConnection
+from cqlmapper.models import Model
+
+
+class Account(Model):
+    id = columns.UUID(primary_key=True)
+    name = columns.Text(db_field='full_name')
+    active = columns.Boolean()
+    created = columns.DateTime()
+    balance = columns.Double()
+    tags = columns.Set(columns.Text)
+    limits = columns.Map(columns.Text, columns.Integer)
+
+
+class FailingConnection(MemoryConnection):
+
+    def execute(self, query, *args, **kwargs):
+        if getattr(query, 'instance', None) is not None and \
+                query.instance.name == 'fail':
+            raise RuntimeError('write failed')
+        return super(FailingConnection, self).execute(query, *args, **kwargs)
+
+
+class ParseTest(unittest.TestCase):
+
+    def test_parse_strings(self):
+        columns_ = Account._columns
+        self.assertIs(parse_value(columns_['active'], 'False'), False)
+        self.assertEqual(
+            parse_value(columns_['created'], '2016-01-02T03:04:05Z'),
+            datetime.datetime(2016, 1, 2, 3, 4, 5),
+        )
+        self.assertEqual(
+            parse_value(columns_['created'], '1000'),
+            datetime.datetime(1970, 1, 1, 0, 0, 1),
+        )
+        self.assertEqual(
+            parse_value(columns_['tags'], '["a", "b"]'),
+            set(['a', 'b']),
+        )
+        self.assertEqual(
+            parse_value(columns_['limits'], {'a': '1'}),
+            {'a': '1'},
+        )
+        with self.assertRaises(ValueError):
+            parse_value(columns_['active'], 'maybe')
+
+
+class BulkLoaderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.dead_letter = self._path('failed.jsonl')
+        self.checkpoint = self._path('checkpoint')
+
+    def _path(self, name):
+        return os.path.join(self.directory, name)
+
+    def _write(self, name, text):
+        path = self._path(name)
+        with io.open(path, 'w', encoding='utf-8') as f:
+            f.write(text)
+        return path
+
+    def _loader(self, conn, **kwargs):
+        return BulkLoader(
+            conn,
+            Account,
+            concurrency=4,
+            dead_letter=self.dead_letter,
+            checkpoint=self.checkpoint,
+            checkpoint_every=2,
+            progress=lambda result: None,
+            **kwargs
+        )
+
+    def _failures(self):
+        with open(self.dead_letter) as f:
+            return [json.loads(line) for line in f]
+
+    def test_load_csv(self):
+        path = self._write('accounts.csv', u'\n'.join([
+            u'id,full_name,active,created,balance,tags',
+            u'{0},a,true,2016-01-01,1.5,"[""x""]"'.format(UUID(int=1)),
+            u'{0},b,no,,,'.format(UUID(int=2)),
+            u'not-a-uuid,c,true,,,',
+            u'{0},d,maybe,,,'.format(UUID(int=4)),
+            u'{0},fail,true,,,'.format(UUID(int=5)),
+        ]))
+        conn = FailingConnection()
+        result = self._loader(conn).load(path)
+        self.assertEqual(
+            (result.read, result.written, result.failed),
+            (5, 2, 3),
+        )
+        account = Account.objects(id=UUID(int=1)).get(conn)
+        self.assertEqual(account.name, 'a')
+        self.assertEqual(account.created, datetime.datetime(2016, 1, 1))
+        self.assertEqual(account.tags, set(['x']))
+        self.assertFalse(Account.objects(id=UUID(int=2)).get(conn).active)
+        failures = self._failures()
+        self.assertEqual(
+            sorted((f['offset'], f['stage']) for f in failures),
+            [(2, 'validate'), (3, 'validate'), (4, 'write')],
+        )
+        with open(self.checkpoint) as f:
+            self.assertEqual(json.load(f)['offset'], 5)
+
+    def test_resume_from_checkpoint(self):
+        lines = [
+            json.dumps({'id': str(UUID(int=i)), 'name': str(i)})
+            for i in range(6)
+        ]
+        path = self._write('accounts.jsonl', u'\n'.join(lines))
+        with open(self.checkpoint, 'w') as f:
+            json.dump({'source': os.path.abspath(path), 'offset': 4}, f)
+        conn = MemoryConnection()
+        result = self._loader(conn).load(path)
+        self.assertEqual((result.skipped, result.written), (4, 2))
+        self.assertEqual(
+            sorted(a.name for a in Account.objects.all().iter(conn)),
+            ['4', '5'],
+        )
+
+    def test_checkpoint_of_another_file(self):
+        path = self._write('accounts.jsonl', u'')
+        with open(self.checkpoint, 'w') as f:
+            json.dump({'source': '/elsewhere.jsonl', 'offset': 4}, f)
+        with self.assertRaises(LoaderException):
+            self._loader(MemoryConnection()).load(path)
+
+    def test_strict_mode_rejects_unknown_fields(self):
+        path = self._write(
+            'accounts.jsonl',
+            json.dumps({'id': str(UUID(int=1)), 'extra': 1}),
+        )
+        result = self._loader(MemoryConnection(), strict=True).load(path)
+        self.assertEqual(result.failed, 1)
+        self.assertIn('Unknown column extra', self._failures()[0]['error'])
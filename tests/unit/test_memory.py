@@ -0,0 +1,179 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest  # noqa
+
+import datetime
+
+from cqlmapper import columns, LWTException
+from cqlmapper.batch import Batch
+from cqlmapper.functions import Token
+from cqlmapper.memory import MemoryConnection, MemoryConnectionException
+from cqlmapper.models import Model
+from cqlmapper.query_set import DoesNotExist
+
+
+class Clock(object):
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+class User(Model):
+    id = columns.Integer(primary_key=True)
+    name = columns.Text()
+    tags = columns.Set(columns.Text)
+    history = columns.List(columns.Integer)
+    attrs = columns.Map(columns.Text, columns.Text)
+
+
+class Message(Model):
+    room = columns.Integer(partition_key=True)
+    seq = columns.Integer(primary_key=True, clustering_order='DESC')
+    topic = columns.Text(static=True)
+    body = columns.Text()
+
+
+class Event(Model):
+    id = columns.Integer(primary_key=True)
+    at = columns.DateTime()
+    day = columns.Date()
+
+
+class Views(Model):
+    page = columns.Text(primary_key=True)
+    count = columns.Counter()
+
+
+class MemoryConnectionTest(unittest.TestCase):
+
+    def setUp(self):
+        self.clock = Clock()
+        self.conn = MemoryConnection(clock=self.clock)
+
+    def test_crud(self):
+        user = User.create(self.conn, id=1, name='a', tags={'x'})
+        self.assertEqual(User.objects(id=1).get(self.conn).name, 'a')
+        user.name = 'b'
+        user.save(self.conn)
+        self.assertEqual(User.objects(id=1).get(self.conn).name, 'b')
+        self.assertEqual(User.objects.count(self.conn), 1)
+        user.delete(self.conn)
+        with self.assertRaises(DoesNotExist):
+            User.objects(id=1).get(self.conn)
+
+    def test_collections(self):
+        User.create(self.conn, id=1, tags={'x'}, history=[1, 2], attrs={})
+        User.objects(id=1).update(
+            self.conn,
+            tags__add={'y'},
+            history__append=[3],
+            attrs__update={'k': 'v'},
+        )
+        User.objects(id=1).update(self.conn, history__prepend=[0])
+        user = User.objects(id=1).get(self.conn)
+        self.assertEqual(user.tags, {'x', 'y'})
+        self.assertEqual(user.history, [0, 1, 2, 3])
+        self.assertEqual(user.attrs, {'k': 'v'})
+        User.objects(id=1).update(self.conn, tags__remove={'x'})
+        self.assertEqual(User.objects(id=1).get(self.conn).tags, {'y'})
+
+    def test_clustering_order_and_queries(self):
+        for seq in (2, 5, 1, 4, 3):
+            Message.create(self.conn, room=1, seq=seq, body=str(seq))
+        Message.create(self.conn, room=2, seq=1, body='other')
+        rows = list(Message.objects(room=1).iter(self.conn))
+        self.assertEqual([m.seq for m in rows], [5, 4, 3, 2, 1])
+        rows = Message.objects(room=1).order_by('seq').limit(2)
+        self.assertEqual([m.seq for m in rows.iter(self.conn)], [1, 2])
+        rows = Message.objects(room=1, seq__gt=1, seq__lte=3)
+        self.assertEqual([m.seq for m in rows.iter(self.conn)], [3, 2])
+        rows = Message.objects(room__in=[1, 2], seq=1)
+        self.assertEqual(
+            sorted(m.body for m in rows.iter(self.conn)),
+            ['1', 'other'],
+        )
+        self.assertEqual(Message.objects(room=1).count(self.conn), 5)
+
+    def test_token_ranges_cover_every_partition(self):
+        for i in range(10):
+            User.create(self.conn, id=i)
+        ids = [u.id for u in User.objects.all().iter(self.conn)]
+        self.assertEqual(sorted(ids), list(range(10)))
+        after = User.objects.filter(pk__token__gt=Token(ids[4]))
+        self.assertEqual(
+            [u.id for u in after.iter(self.conn)],
+            ids[5:],
+        )
+
+    def test_static_columns(self):
+        Message.create(self.conn, room=1, seq=1, topic='a', body='x')
+        Message.create(self.conn, room=1, seq=2, topic='b', body='y')
+        self.assertEqual(
+            [m.topic for m in Message.objects(room=1).iter(self.conn)],
+            ['b', 'b'],
+        )
+
+    def test_counters(self):
+        Views.objects(page='a').update(self.conn, count=1)
+        Views.objects(page='a').update(self.conn, count=2)
+        self.assertEqual(Views.objects(page='a').get(self.conn).count, 3)
+
+    def test_ttl(self):
+        User.ttl(10).create(self.conn, id=1, name='a')
+        self.assertEqual(User.objects.count(self.conn), 1)
+        self.clock.now += 11
+        self.assertEqual(User.objects.count(self.conn), 0)
+
+    def test_lightweight_transactions(self):
+        User.if_not_exists().create(self.conn, id=1, name='a')
+        with self.assertRaises(LWTException):
+            User.if_not_exists().create(self.conn, id=1, name='b')
+        with self.assertRaises(LWTException):
+            User.objects(id=1).iff(name='b').update(self.conn, name='c')
+        User.objects(id=1).iff(name='a').update(self.conn, name='c')
+        self.assertEqual(User.objects(id=1).get(self.conn).name, 'c')
+
+    def test_batches_are_atomic(self):
+        User.create(self.conn, id=1, name='a')
+        with Batch(self.conn) as batch:
+            User.create(batch, id=2, name='b')
+            User.objects(id=1).update(batch, name='c')
+        self.assertEqual(
+            sorted(u.name for u in User.objects.all().iter(self.conn)),
+            ['b', 'c'],
+        )
+        batch = Batch(self.conn)
+        User.create(batch, id=3, name='d')
+        User.objects(id=1).iff(name='a').update(batch, name='e')
+        with self.assertRaises(LWTException):
+            batch.execute_batch()
+        self.assertEqual(User.objects.count(self.conn), 2)
+
+    def test_values_are_returned_as_driver_types(self):
+        at = datetime.datetime(2016, 1, 2, 3, 4, 5)
+        Event.create(self.conn, id=1, at=at, day=at.date())
+        event = Event.objects(id=1).get(self.conn)
+        self.assertEqual(event.at, at)
+        self.assertEqual(event.day.date(), at.date())
+
+    def test_raw_cql_is_rejected(self):
+        with self.assertRaises(MemoryConnectionException):
+            self.conn.execute('SELECT * FROM user')
@@ -0,0 +1,180 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest  # noqa
+
+from cassandra.encoder import Encoder
+
+from cqlmapper import columns
+from cqlmapper.batch import Batch
+from cqlmapper.connection import Connection
+from cqlmapper.middleware import PHASES, statement_operation, timing_hook
+from cqlmapper.models import Model
+from cqlmapper.statements import SelectStatement
+
+
+class FakeCluster(object):
+    protocol_version = 4
+
+
+class FakeSession(object):
+
+    keyspace = 'ks'
+
+    def __init__(self, rows=None):
+        self.cluster = FakeCluster()
+        self.encoder = Encoder()
+        self.rows = rows or []
+        self.statements = []
+
+    def execute(self, statement, params=None, timeout=None):
+        self.statements.append(statement)
+        if statement.query_string.startswith('SELECT'):
+            return [dict(row) for row in self.rows]
+        return []
+
+
+class Recorder(object):
+
+    def __init__(self):
+        self.contexts = []
+
+    def __call__(self, context, call_next):
+        self.contexts.append(context)
+        return call_next(context)
+
+
+class Article(Model):
+    id = columns.Integer(primary_key=True)
+    title = columns.Text()
+
+
+class StatementOperationTest(unittest.TestCase):
+
+    def test_operations(self):
+        self.assertEqual(statement_operation(SelectStatement('t')), 'select')
+        self.assertEqual(statement_operation('  insert into t'), 'insert')
+        self.assertEqual(statement_operation('BEGIN BATCH'), 'batch')
+        self.assertEqual(statement_operation('DROP TABLE t'), 'schema')
+        self.assertEqual(statement_operation(''), 'other')
+
+
+class MiddlewareTest(unittest.TestCase):
+
+    def setUp(self):
+        self.recorder = Recorder()
+        self.session = FakeSession(rows=[{'id': 1, 'title': 'a'}])
+        self.conn = Connection(self.session, middleware=[self.recorder])
+
+    def test_model_operations(self):
+        Article(id=1, title='a').save(self.conn)
+        articles = list(Article.objects(id=1).iter(self.conn))
+        Article(id=1).delete(self.conn)
+        self.assertEqual(
+            [(c.operation, c.model) for c in self.recorder.contexts],
+            [
+                ('insert', Article),
+                ('select', Article),
+                ('delete', Article),
+            ],
+        )
+        select = self.recorder.contexts[1]
+        self.assertIsInstance(select.source, SelectStatement)
+        self.assertEqual(select.bound_count, 1)
+        self.assertEqual(select.table, Article.column_family_name())
+        self.assertEqual(select.rows, 1)
+        self.assertEqual(articles[0].title, 'a')
+        for context in self.recorder.contexts:
+            for phase in ('statement', 'render', 'bind', 'execute'):
+                self.assertGreater(context.timings[phase], 0)
+
+    def test_batches_and_strings(self):
+        with Batch(self.conn) as batch:
+            Article(id=1).save(batch)
+            Article(id=2).save(batch)
+        self.conn.execute('TRUNCATE articles')
+        batch_context, schema_context = self.recorder.contexts
+        self.assertEqual(batch_context.operation, 'batch')
+        self.assertIs(batch_context.model, Article)
+        self.assertEqual(schema_context.operation, 'schema')
+        self.assertIsNone(schema_context.model)
+
+    def test_chain_order_and_rewrites(self):
+        calls = []
+        other = FakeSession()
+
+        def outer(context, call_next):
+            calls.append('outer')
+            result = call_next(context)
+            calls.append('outer done')
+            return result
+
+        def route(context, call_next):
+            calls.append('route')
+            context.session = other
+            context.tags['routed'] = True
+            return call_next(context)
+
+        conn = Connection(self.session, middleware=[outer])
+        conn.add_middleware(route)
+        conn.execute('SELECT * FROM articles')
+        self.assertEqual(calls, ['outer', 'route', 'outer done'])
+        self.assertEqual(len(other.statements), 1)
+        self.assertEqual(self.session.statements, [])
+
+    def test_errors_and_finish_callbacks(self):
+        finished = []
+
+        def failing(context, call_next):
+            context.on_finish(finished.append)
+            raise ValueError('nope')
+
+        self.conn.add_middleware(failing)
+        with self.assertRaises(ValueError):
+            self.conn.execute('SELECT * FROM articles')
+        context, = finished
+        self.assertIsInstance(context.error, ValueError)
+        self.assertEqual(self.session.statements, [])
+
+
+class TimingsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.completed = []
+        self.session = FakeSession(rows=[{'id': 1, 'title': 'a'}] * 3)
+        self.conn = Connection(
+            self.session,
+            middleware=[timing_hook(self.completed.append)],
+        )
+
+    def test_queryset_phases(self):
+        articles = Article.objects.filter(id=1).limit(5)
+        self.assertIsNone(articles.timings)
+        list(articles.iter(self.conn))
+        context, = self.completed
+        self.assertEqual(context.rows, 3)
+        timings = articles.timings
+        self.assertEqual(sorted(timings), sorted(PHASES))
+        for phase in PHASES:
+            self.assertGreater(timings[phase], 0, phase)
+        self.assertEqual(timings, context.timings)
+
+    def test_writes_complete_once_executed(self):
+        Article(id=1, title='a').save(self.conn)
+        context, = self.completed
+        self.assertGreater(context.timings['statement'], 0)
+        self.assertEqual(context.timings['hydrate'], 0)
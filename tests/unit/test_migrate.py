@@ -0,0 +1,163 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest  # noqa
+
+import json
+import os
+import shutil
+import tempfile
+from uuid import UUID
+
+from cqlmapper import columns
+from cqlmapper.memory import MemoryConnection
+from cqlmapper.migrate import copy_table, MigrationException
+from cqlmapper.models import Model
+
+
+class Event(Model):
+    id = columns.UUID(primary_key=True)
+    day = columns.Integer()
+    payload = columns.Text()
+
+
+class EventByDay(Model):
+    day = columns.Integer(partition_key=True)
+    id = columns.UUID(primary_key=True)
+    payload = columns.Text()
+
+
+class EventCount(Model):
+    day = columns.Integer(primary_key=True)
+    events = columns.Counter()
+
+
+class BatchCountingConnection(MemoryConnection):
+
+    def __init__(self):
+        super(BatchCountingConnection, self).__init__()
+        self.batches = 0
+
+    def execute_batch_statements(self, batch):
+        self.batches += 1
+        return super(BatchCountingConnection, self).execute_batch_statements(
+            batch
+        )
+
+
+class FailingConnection(MemoryConnection):
+
+    def __init__(self, fail_at):
+        super(FailingConnection, self).__init__()
+        self.fail_at = fail_at
+        self.batches = 0
+
+    def execute_batch_statements(self, batch):
+        self.batches += 1
+        if self.batches == self.fail_at:
+            raise RuntimeError('write failed')
+        return super(FailingConnection, self).execute_batch_statements(batch)
+
+
+class CopyTableTest(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.checkpoint = os.path.join(self.directory, 'checkpoint')
+        self.src = MemoryConnection()
+        for i in range(40):
+            Event.create(self.src, id=UUID(int=i), day=i % 4, payload=str(i))
+
+    def _events(self, conn):
+        return sorted(
+            (e.day, e.id.int, e.payload)
+            for e in EventByDay.objects.all().iter(conn)
+        )
+
+    def test_copy_rekeys_rows(self):
+        dst = BatchCountingConnection()
+        result = copy_table(self.src, Event, dst, EventByDay, splits=1)
+        self.assertEqual((result.read, result.written), (40, 40))
+        self.assertEqual(
+            self._events(dst),
+            sorted((i % 4, i, str(i)) for i in range(40)),
+        )
+        # a batch per destination partition
+        self.assertEqual(dst.batches, 4)
+
+    def test_transform(self):
+        def transform(event):
+            if event.day == 0:
+                return None
+            return [
+                {'day': event.day, 'id': event.id, 'payload': 'a'},
+                EventByDay(day=event.day + 10, id=event.id, payload='b'),
+            ]
+
+        dst = MemoryConnection()
+        result = copy_table(
+            self.src,
+            Event.objects.filter(id=UUID(int=1)),
+            dst,
+            EventByDay,
+            transform=transform,
+            splits=3,
+            concurrency=2,
+        )
+        self.assertEqual((result.read, result.dropped, result.written),
+                         (1, 0, 2))
+        self.assertEqual(self._events(dst), [(1, 1, 'a'), (11, 1, 'b')])
+
+        result = copy_table(self.src, Event, dst, EventByDay,
+                            transform=transform, splits=3)
+        self.assertEqual(result.dropped, 10)
+
+    def test_resume_from_checkpoint(self):
+        dst = FailingConnection(fail_at=10)
+        with self.assertRaises(RuntimeError):
+            copy_table(self.src, Event, dst, EventByDay, splits=8,
+                       concurrency=1, checkpoint=self.checkpoint)
+        with open(self.checkpoint) as f:
+            done = len(json.load(f)['done'])
+        self.assertTrue(0 < done < 8)
+
+        result = copy_table(self.src, Event, dst, EventByDay, splits=8,
+                            concurrency=1, checkpoint=self.checkpoint)
+        self.assertEqual(result.skipped_ranges, done)
+        self.assertEqual(result.ranges, 8 - done)
+        self.assertEqual(len(self._events(dst)), 40)
+
+        result = copy_table(self.src, Event, dst, EventByDay, splits=8,
+                            checkpoint=self.checkpoint)
+        self.assertEqual((result.ranges, result.read), (0, 0))
+
+    def test_checkpoint_of_another_copy(self):
+        copy_table(self.src, Event, MemoryConnection(), EventByDay, splits=2,
+                   checkpoint=self.checkpoint)
+        with self.assertRaises(MigrationException):
+            copy_table(self.src, Event, MemoryConnection(), EventByDay,
+                       splits=4, checkpoint=self.checkpoint)
+
+    def test_counter_destination(self):
+        with self.assertRaises(MigrationException):
+            copy_table(self.src, Event, MemoryConnection(), EventCount)
+
+    def test_invalid_transform_output(self):
+        with self.assertRaises(MigrationException):
+            copy_table(self.src, Event, MemoryConnection(), EventByDay,
+                       transform=lambda event: 'row', splits=1)
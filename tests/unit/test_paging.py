@@ -0,0 +1,362 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest  # noqa
+
+import threading
+
+from cassandra.encoder import Encoder
+from cassandra.query import FETCH_SIZE_UNSET
+
+from cqlmapper import columns, CQLEngineException
+from cqlmapper.connection import Connection
+from cqlmapper.memory import MemoryConnection
+from cqlmapper.middleware import ExecutionContext
+from cqlmapper.models import Model
+from cqlmapper.paging import (
+    AdaptiveFetchSize,
+    decode_cursor,
+    encode_cursor,
+    prefetch,
+)
+from cqlmapper.query import QueryException
+
+
+class FakeFuture(object):
+    """
+    Pages of a response future, delivered to the callbacks from another
+    thread like the driver's event loop does.
+    """
+
+    def __init__(self, pages, fail_at=None):
+        self.pages = pages
+        self.fail_at = fail_at
+        self.index = 0
+        self.requested = [0]
+        self.callbacks = []
+        self.result = pages[0]
+        self.error = None
+        self.lock = threading.Lock()
+
+    @property
+    def has_more_pages(self):
+        return self.index < len(self.pages) - 1
+
+    def start_fetching_next_page(self):
+        with self.lock:
+            self.index += 1
+            self.requested.append(self.index)
+            self.result = None
+        thread = threading.Thread(target=self._deliver, args=(self.index,))
+        thread.start()
+
+    def _deliver(self, index):
+        with self.lock:
+            if index == self.fail_at:
+                self.error = RuntimeError('read failed')
+            else:
+                self.result = self.pages[index]
+            callbacks = list(self.callbacks)
+        for callback, errback in callbacks:
+            if self.error is not None:
+                errback(self.error)
+            else:
+                callback(self.result)
+
+    def add_callbacks(self, callback, errback):
+        with self.lock:
+            self.callbacks.append((callback, errback))
+            result, error = self.result, self.error
+        if result is not None:
+            callback(result)
+        elif error is not None:
+            errback(error)
+
+
+class FakeResultSet(object):
+
+    def __init__(self, pages, fail_at=None):
+        self.response_future = FakeFuture(pages, fail_at)
+        self.current_rows = pages[0]
+
+    @property
+    def has_more_pages(self):
+        return self.response_future.has_more_pages
+
+    def __iter__(self):
+        raise AssertionError('rows must be read from the pages')
+
+
+class FakeConnection(object):
+
+    def __init__(self, result):
+        self.result = result
+
+    def execute(self, statement, **kwargs):
+        return self.result
+
+
+class FakeCluster(object):
+    protocol_version = 4
+
+
+class FakeSession(object):
+    """Returns full pages of rows holding ``row_bytes`` of text."""
+
+    keyspace = 'ks'
+
+    def __init__(self, row_bytes):
+        self.cluster = FakeCluster()
+        self.encoder = Encoder()
+        self.row_bytes = row_bytes
+        self.fetch_sizes = []
+
+    def execute(self, statement, params=None, timeout=None):
+        self.fetch_sizes.append(statement.fetch_size)
+        size = statement.fetch_size
+        if size is FETCH_SIZE_UNSET:
+            size = 5000
+        return [
+            {'sensor': 1, 'seq': i, 'label': u'x' * (self.row_bytes - 16)}
+            for i in range(size)
+        ]
+
+
+class Reading(Model):
+    sensor = columns.Integer(partition_key=True)
+    seq = columns.Integer(primary_key=True)
+    label = columns.Text()
+
+
+def _pages(count, size=3):
+    return [
+        [{'sensor': 1, 'seq': p * size + i} for i in range(size)]
+        for p in range(count)
+    ]
+
+
+class PrefetchTest(unittest.TestCase):
+
+    def test_rows_of_every_page(self):
+        result = FakeResultSet(_pages(5))
+        rows = list(prefetch(result, 2))
+        self.assertEqual([r['seq'] for r in rows], list(range(15)))
+
+    def test_pages_are_fetched_ahead(self):
+        result = FakeResultSet(_pages(6))
+        rows = prefetch(result, 2)
+        next(rows)
+        future = result.response_future
+        for _ in range(100):
+            if future.requested == [0, 1, 2]:
+                break
+            threading.Event().wait(0.01)
+        # two pages are waiting while the first one is consumed
+        self.assertEqual(future.requested, [0, 1, 2])
+        self.assertEqual(len(list(rows)), 17)
+
+    def test_errors_are_raised(self):
+        rows = prefetch(FakeResultSet(_pages(4), fail_at=2), 1)
+        seqs = []
+        with self.assertRaises(RuntimeError):
+            for row in rows:
+                seqs.append(row['seq'])
+        self.assertEqual(seqs, list(range(6)))
+
+    def test_other_results_are_iterated(self):
+        self.assertEqual(list(prefetch([1, 2], 2)), [1, 2])
+        result = FakeResultSet(_pages(3))
+        result.__class__ = type('Unpaged', (FakeResultSet,), {
+            '__iter__': lambda self: iter(self.current_rows),
+        })
+        self.assertEqual(len(list(prefetch(result, 0))), 3)
+
+    def test_queryset(self):
+        conn = FakeConnection(FakeResultSet(_pages(4)))
+        readings = Reading.objects(sensor=1).prefetch(1)
+        self.assertEqual(
+            [r.seq for r in readings.iter(conn)],
+            list(range(12)),
+        )
+        self.assertEqual(readings.prefetch(1)._prefetch, 1)
+        with self.assertRaises(QueryException):
+            readings.prefetch(-1)
+        with self.assertRaises(TypeError):
+            readings.prefetch('2')
+
+
+class AdaptiveFetchSizeTest(unittest.TestCase):
+
+    def _select(self, conn, sensor=1):
+        return list(Reading.objects(sensor=sensor).iter(conn))
+
+    def test_pages_are_sized_by_bytes(self):
+        session = FakeSession(row_bytes=1000)
+        conn = Connection(session)
+        fetch_sizes = AdaptiveFetchSize(
+            target_page_bytes=50000,
+            target_latency=None,
+            initial_fetch_size=100,
+        )
+        conn.add_middleware(fetch_sizes)
+        self._select(conn)
+        self._select(conn, sensor=2)
+        self.assertEqual(session.fetch_sizes, [100, 50])
+        snapshot = fetch_sizes.snapshot()
+        self.assertEqual(len(snapshot), 1)
+        stats = list(snapshot.values())[0]
+        self.assertEqual(
+            (stats['fetch_size'], stats['pages'], stats['rows']),
+            (50, 2, 150),
+        )
+        self.assertEqual(stats['bytes_per_row'], 1000)
+
+    def test_bounds(self):
+        session = FakeSession(row_bytes=20)
+        conn = Connection(session)
+        conn.add_middleware(AdaptiveFetchSize(
+            target_page_bytes=10 ** 9,
+            max_fetch_size=2000,
+        ))
+        self._select(conn)
+        self._select(conn)
+        self.assertEqual(session.fetch_sizes[-1], 2000)
+
+        session = FakeSession(row_bytes=200000)
+        conn = Connection(session)
+        conn.add_middleware(
+            AdaptiveFetchSize(min_fetch_size=10, initial_fetch_size=20)
+        )
+        self._select(conn)
+        self._select(conn)
+        self.assertEqual(session.fetch_sizes[-1], 10)
+
+    def test_explicit_fetch_size(self):
+        session = FakeSession(row_bytes=1000)
+        conn = Connection(session)
+        conn.add_middleware(AdaptiveFetchSize(initial_fetch_size=100))
+        list(Reading.objects(sensor=1).fetch_size(7).iter(conn))
+        self.assertEqual(session.fetch_sizes, [7])
+
+    def test_pages_are_sized_by_latency(self):
+        fetch_sizes = AdaptiveFetchSize(
+            target_latency=0.1,
+            initial_fetch_size=100,
+            smoothing=1,
+        )
+
+        def page(rows, seconds):
+            context = ExecutionContext(operation='select')
+            context.result = [{'seq': i} for i in range(rows)]
+            context.timings['execute'] = seconds
+            fetch_sizes.record(context, 'q', 100)
+
+        # a full page taking 0.5s
+        page(100, 0.5)
+        self.assertEqual(fetch_sizes.fetch_size('q'), 20)
+        # short pages don't measure the latency per row
+        page(5, 0.5)
+        self.assertEqual(fetch_sizes.fetch_size('q'), 20)
+        self.assertEqual(fetch_sizes.fetch_size('other'), 100)
+
+    def test_invalid_bounds(self):
+        with self.assertRaises(CQLEngineException):
+            AdaptiveFetchSize(min_fetch_size=100, initial_fetch_size=10)
+
+
+class Message(Model):
+    channel = columns.Integer(partition_key=True)
+    day = columns.Integer(primary_key=True)
+    seq = columns.Integer(primary_key=True, clustering_order='DESC')
+    body = columns.Text()
+
+
+class PaginateByClusteringTest(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = MemoryConnection()
+        for day in range(3):
+            for seq in range(4):
+                Message.create(self.conn, channel=1, day=day, seq=seq)
+        Message.create(self.conn, channel=2, day=0, seq=0)
+        self.order = [(day, seq) for day in range(3)
+                      for seq in reversed(range(4))]
+
+    def _read(self, queryset, page_size, token=False):
+        pages = []
+        after = None
+        while True:
+            page = queryset.paginate_by_clustering(
+                self.conn,
+                page_size,
+                after=after,
+            )
+            pages.append([(m.day, m.seq) for m in page])
+            if not page.has_more:
+                return pages
+            after = page.token if token else page.cursor
+
+    def test_pages_follow_clustering_order(self):
+        pages = self._read(Message.objects(channel=1), 5)
+        self.assertEqual([len(p) for p in pages], [5, 5, 2])
+        self.assertEqual(sum(pages, []), self.order)
+
+    def test_reversed_order(self):
+        queryset = Message.objects(channel=1).order_by('-day')
+        pages = self._read(queryset, 5, token=True)
+        self.assertEqual(sum(pages, []), list(reversed(self.order)))
+
+    def test_cursor_prefix(self):
+        page = Message.objects(channel=1).paginate_by_clustering(
+            self.conn,
+            10,
+            after=(0,),
+        )
+        self.assertEqual([(m.day, m.seq) for m in page], self.order[4:])
+        self.assertFalse(page.has_more)
+        self.assertEqual(page.cursor, (2, 0))
+
+    def test_empty_page_keeps_the_cursor(self):
+        page = Message.objects(channel=1).paginate_by_clustering(
+            self.conn,
+            10,
+            after=(2, 0),
+        )
+        self.assertEqual((len(page), page.has_more), (0, False))
+        self.assertEqual(page.cursor, (2, 0))
+
+    def test_cursor_encoding(self):
+        token = encode_cursor(Message, (2, 3))
+        self.assertEqual(decode_cursor(Message, token), (2, 3))
+        self.assertEqual(decode_cursor(Message, encode_cursor(Message, (1,))),
+                         (1,))
+        with self.assertRaises(QueryException):
+            decode_cursor(Message, 'not a cursor')
+
+    def test_invalid_pagination(self):
+        queryset = Message.objects(channel=1)
+        with self.assertRaises(QueryException):
+            queryset.paginate_by_clustering(self.conn, 0)
+        with self.assertRaises(QueryException):
+            queryset.filter(day=1).paginate_by_clustering(self.conn, 5)
+        with self.assertRaises(QueryException):
+            queryset.paginate_by_clustering(self.conn, 5, after=(1, 2, 3))
+        with self.assertRaises(QueryException):
+            Reading.objects(sensor=1).values_list('seq').paginate_by_clustering(
+                self.conn,
+                5,
+            )
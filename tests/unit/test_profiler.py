@@ -0,0 +1,107 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest  # noqa
+
+import threading
+
+from cassandra.encoder import Encoder
+
+import cqlmapper
+from cqlmapper import columns
+from cqlmapper.connection import Connection
+from cqlmapper.models import Model
+
+
+class FakeCluster(object):
+    protocol_version = 4
+
+
+class FakeSession(object):
+
+    keyspace = 'ks'
+
+    def __init__(self):
+        self.cluster = FakeCluster()
+        self.encoder = Encoder()
+
+    def execute(self, statement, params=None, timeout=None):
+        if statement.query_string.startswith('SELECT'):
+            return [{'id': 1, 'author': 2, 'title': 't'}]
+        return []
+
+
+class Post(Model):
+    id = columns.Integer(primary_key=True)
+    author = columns.Integer(db_field='author_id')
+    title = columns.Text()
+
+
+class ProfileTest(unittest.TestCase):
+
+    def setUp(self):
+        self.conn = Connection(FakeSession())
+
+    def test_counts_phases_and_duplicates(self):
+        with cqlmapper.profile() as p:
+            list(Post.objects(id=1).iter(self.conn))
+            list(Post.objects(id=1).iter(self.conn))
+            Post(id=1, title='a').save(self.conn)
+        self.assertEqual(p.count, 3)
+        self.assertEqual(p.rows, 2)
+        timings = p.timings()
+        self.assertEqual(len(timings), 7)
+        self.assertGreater(timings['hydrate'], 0)
+        self.assertEqual(list(p.duplicates().values()), [2])
+        self.assertEqual(p.n_plus_one(), [])
+        p.assert_no_n_plus_one()
+        self.assertIn('3 statements in', p.report())
+
+    def test_n_plus_one(self):
+        with cqlmapper.profile() as p:
+            for i in range(4):
+                Post.objects(id=i).get(self.conn)
+            Post.objects(author=1).allow_filtering().get(self.conn)
+        pattern, = p.n_plus_one()
+        self.assertEqual(pattern.count, 4)
+        self.assertEqual(pattern.table, Post.column_family_name())
+        self.assertIn('Post.objects(id__in=[...])', pattern.suggestion)
+        with self.assertRaises(AssertionError) as cm:
+            p.assert_no_n_plus_one()
+        self.assertIn('4 lookups on', str(cm.exception))
+
+    def test_same_key_is_not_n_plus_one(self):
+        with cqlmapper.profile() as p:
+            for _ in range(4):
+                Post.objects(id=1).get(self.conn)
+        self.assertEqual(p.n_plus_one(), [])
+        self.assertEqual(list(p.duplicates().values()), [4])
+
+    def test_scope(self):
+        other_thread = threading.Thread(
+            target=lambda: self.conn.execute('SELECT * FROM t'),
+        )
+        with cqlmapper.profile() as p:
+            other_thread.start()
+            other_thread.join()
+        self.conn.execute('SELECT * FROM t')
+        self.assertEqual(p.count, 0)
+
+        with cqlmapper.profile(self.conn) as p:
+            self.conn.execute('SELECT * FROM t')
+        self.assertEqual(p.count, 1)
+        self.assertEqual(self.conn.middleware, [])
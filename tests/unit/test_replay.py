@@ -0,0 +1,140 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest  # noqa
+
+import os
+import shutil
+import tempfile
+from uuid import UUID
+
+from cassandra import ConsistencyLevel
+from cassandra.encoder import Encoder
+
+from cqlmapper import columns
+from cqlmapper.connection import Connection
+from cqlmapper.models import Model
+from cqlmapper.replay import (
+    read_recording,
+    RecordedStatement,
+    replay,
+    StatementRecorder,
+)
+
+
+class FakeCluster(object):
+    protocol_version = 4
+
+
+class FakeSession(object):
+
+    keyspace = 'ks'
+    default_consistency_level = ConsistencyLevel.LOCAL_ONE
+
+    def __init__(self):
+        self.cluster = FakeCluster()
+        self.encoder = Encoder()
+        self.executed = []
+
+    def execute(self, statement, params=None, timeout=None, trace=False):
+        self.executed.append((
+            statement.query_string,
+            params,
+            statement.consistency_level,
+        ))
+        return []
+
+
+class Item(Model):
+    id = columns.UUID(primary_key=True)
+    tags = columns.Set(columns.Text)
+
+
+def record(recorder):
+    conn = Connection(FakeSession())
+    conn.add_middleware(recorder)
+    for i in range(3):
+        Item.create(conn, id=UUID(int=i), tags={'a'})
+    list(Item.objects(id=UUID(int=1)).iter(conn))
+    recorder.close()
+
+
+class RecorderTest(unittest.TestCase):
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        self.path = os.path.join(directory, 'statements.rec')
+
+    def test_records_executions(self):
+        recorder = StatementRecorder(self.path)
+        record(recorder)
+        # appending after a close starts a new query table
+        record(recorder)
+        statements = list(read_recording(self.path))
+        self.assertEqual(len(statements), 8)
+        self.assertEqual(recorder.recorded, 8)
+        insert = statements[0]
+        self.assertEqual(insert.operation, 'insert')
+        self.assertEqual(insert.model, 'Item')
+        self.assertIn('VALUES (?, ?)', insert.fingerprint)
+        self.assertEqual(
+            sorted(insert.params.values(), key=str),
+            [UUID(int=0), set(['a'])],
+        )
+        self.assertEqual(statements[3].operation, 'select')
+        self.assertEqual(statements[7].operation, 'select')
+        self.assertTrue(all(s.error is None for s in statements))
+
+    def test_operation_filter(self):
+        recorder = StatementRecorder(self.path, operations=['select'])
+        record(recorder)
+        self.assertEqual(
+            [s.operation for s in read_recording(self.path)],
+            ['select'],
+        )
+
+
+class ReplayTest(unittest.TestCase):
+
+    def test_replays_recording(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'statements.rec')
+        recorder = StatementRecorder(path)
+        record(recorder)
+        session = FakeSession()
+        result = replay(path, Connection(session), speed=None, concurrency=1)
+        self.assertEqual(result.operations, 4)
+        self.assertEqual(len(session.executed), 4)
+        recorded = list(read_recording(path))
+        self.assertEqual(
+            [e[:2] for e in session.executed],
+            [(s.query_string, s.params) for s in recorded],
+        )
+        self.assertIn('insert', result.report())
+
+    def test_paces_statements(self):
+        statements = [
+            RecordedStatement('SELECT 1', 'SELECT ?', 'select', None,
+                              1000.0 + i * 0.05, 0.001, None, None, None)
+            for i in range(3)
+        ]
+        session = FakeSession()
+        result = replay(statements, Connection(session), speed=2)
+        self.assertGreaterEqual(result.elapsed, 0.05)
+        self.assertEqual(result.summary()['operations'], 3)
@@ -0,0 +1,120 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest  # noqa
+
+import threading
+
+from cqlmapper import columns, ConnectionInterface
+from cqlmapper.models import Model
+from cqlmapper.session import Session, SessionException
+from cqlmapper.statements import SelectStatement
+
+
+class FakeConnection(ConnectionInterface):
+
+    def __init__(self, rows=None):
+        self.rows = rows or []
+        self.executed = []
+        self.lock = threading.Lock()
+
+    def execute(self, statement, *args, **kwargs):
+        with self.lock:
+            self.executed.append(statement)
+        if isinstance(statement, SelectStatement):
+            return [dict(r) for r in self.rows]
+        return []
+
+    @property
+    def writes(self):
+        return [
+            s for s in self.executed if not isinstance(s, SelectStatement)
+        ]
+
+
+class SessionUser(Model):
+    org = columns.Integer(partition_key=True)
+    id = columns.Integer(primary_key=True)
+    name = columns.Text()
+
+
+class SessionTest(unittest.TestCase):
+
+    def test_identity_map(self):
+        conn = FakeConnection([{'name': 'jon'}])
+        session = Session(conn)
+        first = session.get(SessionUser, org=1, id=1)
+        second = session.get(SessionUser, org=1, id=1)
+        self.assertIs(first, second)
+        self.assertEqual(len(conn.executed), 1)
+        self.assertIn(first, session)
+
+    def test_find_all_returns_session_instances(self):
+        conn = FakeConnection([{'id': 1, 'name': 'jon'}])
+        session = Session(conn)
+        user = session.get(SessionUser, org=1, id=1)
+        found = session.find_all(SessionUser.objects(org=1))
+        self.assertIs(found[0], user)
+
+    def test_flush_writes_dirty_instances_once(self):
+        conn = FakeConnection([{'name': 'jon'}])
+        session = Session(conn)
+        user = session.get(SessionUser, org=1, id=1)
+        user.name = 'steve'
+        user.name = 'bob'
+        session.get(SessionUser, org=1, id=1).name = 'tim'
+        self.assertEqual(session.dirty, [user])
+        session.flush()
+        self.assertEqual(len(conn.writes), 1)
+        self.assertIn('UPDATE', conn.writes[0])
+        self.assertEqual(session.dirty, [])
+        session.flush()
+        self.assertEqual(len(conn.writes), 1)
+
+    def test_flush_groups_by_partition(self):
+        conn = FakeConnection()
+        with Session(conn) as session:
+            for org in range(3):
+                for i in range(2):
+                    session.add(SessionUser(org=org, id=i, name='x'))
+        self.assertEqual(len(conn.writes), 3)
+        for batch in conn.writes:
+            self.assertEqual(batch.count('INSERT'), 2)
+
+    def test_delete(self):
+        conn = FakeConnection([{'name': 'jon'}])
+        session = Session(conn)
+        user = session.get(SessionUser, org=1, id=1)
+        session.delete(user)
+        self.assertNotIn(user, session)
+        session.flush()
+        self.assertEqual(len(conn.writes), 1)
+        self.assertIn('DELETE', conn.writes[0])
+
+    def test_duplicate_identity(self):
+        session = Session(FakeConnection())
+        session.add(SessionUser(org=1, id=1))
+        with self.assertRaises(SessionException):
+            session.add(SessionUser(org=1, id=1))
+
+    def test_no_flush_on_error(self):
+        conn = FakeConnection()
+        with self.assertRaises(ValueError):
+            with Session(conn) as session:
+                session.add(SessionUser(org=1, id=1))
+                raise ValueError()
+        self.assertEqual(conn.writes, [])
@@ -0,0 +1,204 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest  # noqa
+
+import threading
+
+from cassandra.encoder import Encoder
+
+from cqlmapper import columns
+from cqlmapper.connection import Connection
+from cqlmapper.models import Model
+from cqlmapper.singleflight import SingleFlight
+
+
+class FakeCluster(object):
+    protocol_version = 4
+
+
+class BlockingSession(object):
+    """Driver session stand-in blocking every request on an event."""
+
+    keyspace = 'ks'
+
+    def __init__(self, rows):
+        self.cluster = FakeCluster()
+        self.encoder = Encoder()
+        self.rows = rows
+        self.release = threading.Event()
+        self.calls = 0
+
+    def execute(self, statement, params=None, timeout=None):
+        self.calls += 1
+        self.release.wait(5)
+        return [dict(r) for r in self.rows]
+
+
+class PagedResult(list):
+    """A first page of rows followed by other pages."""
+
+    has_more_pages = True
+
+    @property
+    def current_rows(self):
+        return self
+
+
+class PagedSession(BlockingSession):
+
+    def execute(self, statement, params=None, timeout=None):
+        rows = super(PagedSession, self).execute(statement, params, timeout)
+        return PagedResult(rows)
+
+
+class Coalesced(Model):
+    key = columns.Integer(primary_key=True)
+    value = columns.Text()
+
+
+def run_threads(count, target):
+    threads = [threading.Thread(target=target) for _ in range(count)]
+    for t in threads:
+        t.start()
+    return threads
+
+
+class SingleFlightTest(unittest.TestCase):
+
+    def test_concurrent_calls_are_shared(self):
+        group = SingleFlight()
+        release = threading.Event()
+        calls = []
+        results = []
+
+        def fn():
+            calls.append(1)
+            release.wait(5)
+            return 'result'
+
+        def worker():
+            results.append(group.do('key', fn))
+
+        threads = run_threads(5, worker)
+        while group.coalesced < 4:
+            release.wait(0.01)
+        release.set()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(len(calls), 1)
+        self.assertEqual([r for r, _ in results], ['result'] * 5)
+        self.assertTrue(all(shared for _, shared in results))
+        self.assertEqual(group.in_flight(), 0)
+
+    def test_exceptions_are_shared(self):
+        group = SingleFlight()
+        release = threading.Event()
+        errors = []
+
+        def fn():
+            release.wait(5)
+            raise ValueError('boom')
+
+        def worker():
+            try:
+                group.do('key', fn)
+            except ValueError as e:
+                errors.append(e)
+
+        threads = run_threads(3, worker)
+        while group.coalesced < 2:
+            release.wait(0.01)
+        release.set()
+        for t in threads:
+            t.join()
+        self.assertEqual(len(errors), 3)
+
+    def test_sequential_calls_are_not_shared(self):
+        group = SingleFlight()
+        self.assertEqual(group.do('key', lambda: 1), (1, False))
+        self.assertEqual(group.do('key', lambda: 2), (2, False))
+
+
+class ConnectionCoalescingTest(unittest.TestCase):
+
+    def test_identical_reads_share_one_request(self):
+        session = BlockingSession([{'value': 'one'}])
+        conn = Connection(session, coalesce_reads=True)
+        results = []
+
+        def worker():
+            results.append(Coalesced.get(conn, key=1))
+
+        threads = run_threads(4, worker)
+        while conn._inflight.coalesced < 3:
+            session.release.wait(0.01)
+        session.release.set()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(session.calls, 1)
+        self.assertEqual(len(results), 4)
+        self.assertTrue(all(r.value == 'one' and r.key == 1 for r in results))
+
+    def test_different_values_are_not_coalesced(self):
+        session = BlockingSession([{'value': 'one'}])
+        session.release.set()
+        conn = Connection(session, coalesce_reads=True)
+        Coalesced.get(conn, key=1)
+        Coalesced.get(conn, key=2)
+        self.assertEqual(session.calls, 2)
+
+    def test_callers_get_their_own_rows(self):
+        session = BlockingSession([{'value': 'one', 'tags': ['a']}])
+        conn = Connection(session, coalesce_reads=True)
+        results = []
+
+        def worker():
+            results.append(conn.execute('SELECT * FROM t'))
+
+        threads = run_threads(3, worker)
+        while conn._inflight.coalesced < 2:
+            session.release.wait(0.01)
+        session.release.set()
+        for t in threads:
+            t.join()
+
+        self.assertEqual(session.calls, 1)
+        tags = [r[0]['tags'] for r in results]
+        self.assertEqual(tags, [['a']] * 3)
+        self.assertEqual(len(set(id(t) for t in tags)), 3)
+
+    def test_paged_results_are_not_shared(self):
+        session = PagedSession([{'value': 'one'}])
+        conn = Connection(session, coalesce_reads=True)
+        results = []
+
+        def worker():
+            results.append(conn.execute('SELECT * FROM t'))
+
+        threads = run_threads(3, worker)
+        while conn._inflight.coalesced < 2:
+            session.release.wait(0.01)
+        session.release.set()
+        for t in threads:
+            t.join()
+
+        # the waiting callers executed the statement themselves
+        self.assertEqual(session.calls, 3)
+        self.assertTrue(all(isinstance(r, PagedResult) for r in results))
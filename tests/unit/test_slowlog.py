@@ -0,0 +1,135 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest  # noqa
+
+import datetime
+import json
+import os
+import shutil
+import tempfile
+import uuid
+
+from cassandra import ConsistencyLevel
+from cassandra.encoder import Encoder
+from mock import Mock
+
+from cqlmapper import columns
+from cqlmapper.connection import Connection
+from cqlmapper.models import Model
+from cqlmapper.slowlog import JsonLinesSink, SlowQueryLog
+
+
+class FakeCluster(object):
+    protocol_version = 4
+
+
+class FakeResult(list):
+
+    def __init__(self, rows, trace=None):
+        super(FakeResult, self).__init__(rows)
+        self.response_future = Mock(coordinator_host='10.0.0.1:9042')
+        self.trace = trace
+
+    def get_query_trace(self, max_wait_sec=None):
+        return self.trace
+
+
+class FakeSession(object):
+
+    keyspace = 'ks'
+    default_consistency_level = ConsistencyLevel.LOCAL_ONE
+
+    def __init__(self):
+        self.cluster = FakeCluster()
+        self.encoder = Encoder()
+        self.traced = []
+
+    def execute(self, statement, params=None, timeout=None, trace=False):
+        self.traced.append(trace)
+        trace = Mock(
+            trace_id=uuid.UUID(int=1),
+            coordinator='10.0.0.1',
+            duration=datetime.timedelta(microseconds=1500),
+            started_at=datetime.datetime(2016, 1, 1),
+            request_type='Execute CQL3 query',
+            parameters={},
+            events=[Mock(
+                description='Parsing',
+                source='10.0.0.1',
+                source_elapsed=datetime.timedelta(microseconds=20),
+                thread_name='Native-Transport-Requests-1',
+                datetime=datetime.datetime(2016, 1, 1),
+            )],
+        )
+        return FakeResult([], trace)
+
+
+class Event(Model):
+    id = columns.Integer(primary_key=True)
+    payload = columns.Text()
+
+
+class SlowQueryLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.logger = Mock()
+        self.session = FakeSession()
+
+    def test_logs_statements_over_threshold(self):
+        slow_log = SlowQueryLog(
+            threshold=None,
+            thresholds={'insert': 0},
+            logger=self.logger,
+        )
+        conn = Connection(self.session, slow_query_log=slow_log)
+        Event(id=1, payload='abcd').save(conn)
+        list(Event.objects(id=1).iter(conn))
+        self.assertEqual(slow_log.slow_count, 1)
+        args = self.logger.warning.call_args[0]
+        self.assertIn('INSERT INTO', args[3])
+        self.assertIn('VALUES (?, ?)', args[3])
+        self.assertEqual(
+            args[4:],
+            ('Event', 'LOCAL_ONE', '10.0.0.1:9042', {'0': 8, '1': 4}),
+        )
+        self.assertEqual(self.session.traced, [False, False])
+
+    def test_sampled_traces_are_saved(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'traces.jsonl')
+        slow_log = SlowQueryLog(
+            threshold=None,
+            trace_sample_rate=1.0,
+            trace_sink=JsonLinesSink(path),
+            logger=self.logger,
+        )
+        conn = Connection(self.session, slow_query_log=slow_log)
+        Event(id=1).save(conn)
+        conn.execute('SELECT * FROM event')
+        slow_log.flush()
+        self.assertEqual(self.session.traced, [True, True])
+        with open(path) as f:
+            records = [json.loads(line) for line in f]
+        self.assertEqual(len(records), 2)
+        record = records[0]
+        self.assertEqual(record['model'], 'Event')
+        self.assertEqual(record['coordinator'], '10.0.0.1')
+        self.assertEqual(record['events'][0]['description'], 'Parsing')
+        self.assertEqual(records[1]['fingerprint'], 'SELECT * FROM event')
+        self.assertFalse(self.logger.exception.called)
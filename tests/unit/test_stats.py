@@ -0,0 +1,148 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest  # noqa
+
+import os
+import shutil
+import tempfile
+
+from cassandra import OperationTimedOut
+from cassandra.encoder import Encoder
+
+from cqlmapper import columns, LWTException
+from cqlmapper.connection import Connection
+from cqlmapper.models import Model
+from cqlmapper.stats import StatementRegistry, fingerprint
+
+
+class FakeCluster(object):
+    protocol_version = 4
+
+
+class FakeSession(object):
+
+    keyspace = 'ks'
+
+    def __init__(self):
+        self.cluster = FakeCluster()
+        self.encoder = Encoder()
+        self.error = None
+        self.result = None
+
+    def execute(self, statement, params=None, timeout=None):
+        if self.error is not None:
+            raise self.error
+        if self.result is not None:
+            return self.result
+        if statement.query_string.startswith('SELECT'):
+            return [{'id': 1, 'name': u'caf\xe9'}, {'id': 2, 'name': None}]
+        return []
+
+
+class NotApplied(list):
+    was_applied = False
+
+
+class Player(Model):
+    id = columns.Integer(primary_key=True)
+    name = columns.Text()
+
+
+class FingerprintTest(unittest.TestCase):
+
+    def test_values_are_stripped(self):
+        self.assertEqual(
+            fingerprint(
+                "SELECT * FROM \"t\" WHERE \"id\" IN (1,2, 3) "
+                "AND name = 'it''s'  LIMIT %(0)s"
+            ),
+            'SELECT * FROM "t" WHERE "id" IN (?) AND name = ? LIMIT ?',
+        )
+        self.assertEqual(
+            fingerprint('UPDATE t SET a = 0x01 WHERE k = -1.5'),
+            'UPDATE t SET a = ? WHERE k = ?',
+        )
+
+
+class StatementRegistryTest(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = StatementRegistry(percentiles=(0.5, 1.0))
+        self.session = FakeSession()
+        self.conn = Connection(self.session, middleware=[self.registry])
+
+    def test_aggregates_per_fingerprint(self):
+        for i in range(3):
+            list(Player.objects(id=i).iter(self.conn))
+        Player(id=1, name='a').save(self.conn)
+        snapshot = self.registry.snapshot()
+        self.assertEqual(len(snapshot), 2)
+        select = [s for s in snapshot.values() if s['operation'] == 'select']
+        select, = select
+        self.assertEqual(select['calls'], 3)
+        self.assertEqual(select['rows'], 6)
+        # 8 bytes per id, 5 bytes of utf-8 name per row
+        self.assertEqual(select['bytes'], 3 * (8 + 5 + 8))
+        self.assertEqual(select['table'], Player.column_family_name())
+        self.assertEqual(select['max_time'], select['percentiles'][1.0])
+        self.assertLessEqual(select['min_time'], select['percentiles'][0.5])
+
+    def test_timeouts_and_lwt_rejections(self):
+        self.session.error = OperationTimedOut()
+        with self.assertRaises(OperationTimedOut):
+            self.conn.execute('SELECT * FROM t')
+        self.session.error = None
+        self.session.result = NotApplied([{'a': 3}])
+        with self.assertRaises(LWTException):
+            self.conn.execute(
+                'UPDATE t SET a = 1 WHERE k = 1 IF a = 2',
+                verify_applied=True,
+            )
+        snapshot = self.registry.snapshot(reset=True)
+        timeouts = snapshot['SELECT * FROM t']
+        self.assertEqual((timeouts['timeouts'], timeouts['errors']), (1, 1))
+        lwt = snapshot['UPDATE t SET a = ? WHERE k = ? IF a = ?']
+        self.assertEqual((lwt['lwt_rejections'], lwt['errors']), (1, 0))
+        self.assertEqual(self.registry.snapshot(), {})
+
+    def test_max_fingerprints(self):
+        registry = StatementRegistry(max_fingerprints=1)
+        conn = Connection(FakeSession(), middleware=[registry])
+        conn.execute('SELECT * FROM a')
+        conn.execute('SELECT * FROM b')
+        self.assertEqual(list(registry.snapshot()), ['SELECT * FROM a'])
+        self.assertEqual(registry.dropped, 1)
+
+    def test_prometheus_file(self):
+        self.conn.execute('SELECT * FROM "t" WHERE k = \'a"b\'')
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        path = os.path.join(directory, 'cql.prom')
+        self.registry.write_prometheus(path)
+        with open(path) as f:
+            text = f.read()
+        labels = 'fingerprint="SELECT * FROM \\"t\\" WHERE k = ?"'
+        self.assertIn('# TYPE cqlmapper_statement_calls_total counter', text)
+        self.assertIn(
+            'cqlmapper_statement_calls_total{%s,operation="select",'
+            'table=""} 1' % labels,
+            text,
+        )
+        self.assertIn('cqlmapper_statement_rows_total{%s' % labels, text)
+        self.assertIn('quantile="0.5"}', text)
+        self.assertEqual(os.listdir(directory), ['cql.prom'])
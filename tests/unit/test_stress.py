@@ -0,0 +1,158 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest  # noqa
+
+import random
+
+from mock import patch
+import six
+
+from cqlmapper import columns
+from cqlmapper.memory import MemoryConnection
+from cqlmapper.models import Model
+from cqlmapper.stress import (
+    generate_value,
+    main,
+    RowGenerator,
+    run,
+    StressException,
+    Workload,
+)
+
+
+class Everything(Model):
+    id = columns.UUID(primary_key=True)
+    created = columns.TimeUUID(primary_key=True)
+    name = columns.Text(max_length=4)
+    code = columns.Ascii()
+    small = columns.SmallInt()
+    big = columns.BigInt()
+    score = columns.Double()
+    price = columns.Decimal()
+    active = columns.Boolean()
+    at = columns.DateTime()
+    day = columns.Date()
+    data = columns.Blob()
+    address = columns.Inet()
+    tags = columns.Set(columns.Text)
+    history = columns.List(columns.Integer)
+    attrs = columns.Map(columns.Text, columns.Integer)
+
+
+class Hits(Model):
+    page = columns.Integer(primary_key=True)
+    count = columns.Counter()
+
+
+class Key(Model):
+    id = columns.Integer(primary_key=True)
+
+
+class GenerateTest(unittest.TestCase):
+
+    def test_values_validate(self):
+        rng = random.Random(1)
+        for name, column in Everything._columns.items():
+            value = generate_value(column, rng)
+            column.validate(value)
+        self.assertLessEqual(
+            len(generate_value(Everything._columns['name'], rng)),
+            4,
+        )
+
+    def test_keys_are_deterministic(self):
+        generator = RowGenerator(
+            Everything,
+            partitions=10,
+            rows_per_partition=3,
+            seed='s',
+        )
+        self.assertEqual(generator.population, 30)
+        self.assertEqual(generator.primary_key(4), generator.primary_key(4))
+        self.assertEqual(
+            generator.primary_key(3)['id'],
+            generator.primary_key(5)['id'],
+        )
+        self.assertNotEqual(
+            generator.primary_key(3)['created'],
+            generator.primary_key(5)['created'],
+        )
+        self.assertNotEqual(
+            generator.primary_key(2)['id'],
+            generator.primary_key(3)['id'],
+        )
+
+
+class WorkloadTest(unittest.TestCase):
+
+    def test_mix_validation(self):
+        with self.assertRaises(StressException):
+            Workload(Key, {'delete': 1})
+        with self.assertRaises(StressException):
+            Workload(Key, {'update': 1})
+        with self.assertRaises(StressException):
+            Workload(Key, {'write': 0})
+
+    def test_run_against_memory(self):
+        conn = MemoryConnection()
+        workload = Workload(
+            Everything,
+            {'write': 2, 'read': 1, 'update': 1},
+            RowGenerator(Everything, partitions=20, rows_per_partition=2),
+        )
+        result = run(workload, conn, operations=200, concurrency=4, seed=1)
+        summary = result.summary()
+        self.assertEqual(summary['operations'], 200)
+        self.assertEqual(summary['errors'], {})
+        self.assertEqual(
+            set(summary['by_operation']),
+            set(['write', 'read', 'update']),
+        )
+        self.assertGreater(Everything.objects.count(conn), 0)
+        self.assertIn('p99', result.report())
+
+    def test_counters_are_incremented(self):
+        conn = MemoryConnection()
+        workload = Workload(Hits, {'write': 1})
+        result = run(workload, conn, operations=50, concurrency=2)
+        self.assertEqual(result.errors, {})
+        total = sum(h.count for h in Hits.objects.all().iter(conn))
+        self.assertGreaterEqual(total, 50)
+
+    def test_rate_limits_the_run(self):
+        result = run(
+            Workload(Key, {'write': 1}),
+            MemoryConnection(),
+            operations=10,
+            rate=200,
+        )
+        self.assertGreaterEqual(result.elapsed, 9 / 200.0)
+
+
+class MainTest(unittest.TestCase):
+
+    def test_memory_run(self):
+        with patch('sys.stdout', new_callable=six.StringIO) as stdout:
+            code = main([
+                __name__ + ':Everything',
+                '--memory',
+                '--operations', '20',
+                '--mix', 'write=1,read=1',
+            ])
+        self.assertEqual(code, 0)
+        self.assertIn('20 operations', stdout.getvalue())
@@ -0,0 +1,154 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest  # noqa
+
+from cassandra.encoder import Encoder
+
+from cqlmapper import columns
+from cqlmapper.batch import Batch
+from cqlmapper.connection import Connection
+from cqlmapper.models import Model
+from cqlmapper.operators import EqualsOperator
+from cqlmapper.statements import DeleteStatement, UpdateStatement
+from cqlmapper.tombstones import TombstoneStats, count_tombstones
+
+
+class FakeCluster(object):
+    protocol_version = 4
+
+
+class RecordingSession(object):
+
+    keyspace = 'ks'
+
+    def __init__(self):
+        self.cluster = FakeCluster()
+        self.encoder = Encoder()
+        self.statements = []
+
+    def execute(self, statement, params=None, timeout=None):
+        self.statements.append(statement)
+        return []
+
+
+class Timeline(Model):
+    user = columns.Integer(partition_key=True)
+    time = columns.Integer(primary_key=True)
+    text = columns.Text()
+    tags = columns.Set(columns.Text)
+    frozen_tags = columns.Set(columns.Text, db_field='frozen')
+    attrs = columns.Map(columns.Text, columns.Text)
+
+
+Timeline._columns['frozen_tags']._freeze_db_type()
+
+
+class CountTombstonesTest(unittest.TestCase):
+
+    def test_deletes(self):
+        table = Timeline.column_family_name()
+        user = Timeline._columns['user']
+        time = Timeline._columns['time']
+
+        partition = DeleteStatement(table)
+        partition.add_where(user, EqualsOperator(), 1)
+        self.assertEqual(
+            count_tombstones(partition, Timeline),
+            [(None, 'partition', 1)],
+        )
+        self.assertEqual(count_tombstones(partition), [(None, 'row', 1)])
+
+        row = DeleteStatement(table, fields=['text', 'tags'])
+        row.add_where(user, EqualsOperator(), 1)
+        row.add_where(time, EqualsOperator(), 1)
+        self.assertEqual(
+            count_tombstones(row, Timeline),
+            [('text', 'cell', 1), ('tags', 'cell', 1)],
+        )
+
+    def test_collection_overwrites(self):
+        update = UpdateStatement(Timeline.column_family_name())
+        update.add_update(Timeline._columns['tags'], set(['a']))
+        update.add_update(
+            Timeline._columns['tags'],
+            set(['a']),
+            previous=set(['b']),
+        )
+        update.add_update(Timeline._columns['text'], 'text')
+        self.assertEqual(
+            count_tombstones(update, Timeline),
+            [('tags', 'collection', 1), ('tags', 'cell', 1)],
+        )
+
+    def test_frozen_collections(self):
+        conn = Connection(RecordingSession(), tombstone_stats=TombstoneStats())
+        Timeline(user=1, time=1, tags=['a'], frozen_tags=['a']).save(conn)
+        self.assertEqual(
+            conn.tombstone_stats.stats(),
+            {Timeline.column_family_name(): {'tags': {'collection': 1}}},
+        )
+
+
+class TombstoneStatsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.exceeded = []
+        self.stats = TombstoneStats(
+            budget=2,
+            on_budget_exceeded=lambda n, s: self.exceeded.append(n),
+        )
+        self.conn = Connection(RecordingSession(), tombstone_stats=self.stats)
+        self.table = Timeline.column_family_name()
+
+    def test_model_and_queryset_writes(self):
+        instance = Timeline(user=1, time=1, text='a')
+        instance.save(self.conn)
+        self.assertEqual(self.stats.totals(), {})
+        instance.text = None
+        instance.save(self.conn)
+        Timeline.objects(user=1, time__in=[1, 2]).update(
+            self.conn,
+            text=None,
+        )
+        Timeline.objects(user=1).delete(self.conn)
+        # empty collections of a persisted instance are deleted on save
+        self.assertEqual(self.stats.stats(), {
+            self.table: {
+                'text': {'cell': 3},
+                'tags': {'cell': 1},
+                'frozen': {'cell': 1},
+                'attrs': {'cell': 1},
+                None: {'partition': 1},
+            },
+        })
+        self.assertEqual(self.stats.totals(), {self.table: 7})
+        self.assertEqual(self.stats.writes, 3)
+        self.assertEqual(self.exceeded, [4])
+
+    def test_batches_and_budget(self):
+        with Batch(self.conn) as batch:
+            for time in range(3):
+                Timeline(user=1, time=time).delete(batch)
+        self.assertEqual(self.stats.totals(), {self.table: 3})
+        self.assertEqual(self.exceeded, [3])
+
+    def test_reset(self):
+        Timeline(user=1, time=1).delete(self.conn)
+        self.stats.reset()
+        self.assertEqual(self.stats.stats(), {})
+        self.assertEqual(self.stats.writes, 0)
@@ -0,0 +1,190 @@
+# Copyright 2013-2016 DataStax, Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+# http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+try:
+    import unittest2 as unittest
+except ImportError:
+    import unittest  # noqa
+
+import copy
+import pickle
+
+from cqlmapper import columns, ConnectionInterface
+from cqlmapper.columns import TrackedList, TrackedMap, TrackedSet
+from cqlmapper.models import Model
+
+
+class FakeConnection(ConnectionInterface):
+
+    def __init__(self):
+        self.statements = []
+
+    def execute(self, query, *args, **kwargs):
+        for statement in (query.statement, query.cleanup_statement):
+            if statement is not None:
+                self.statements.append(
+                    (str(statement), statement.get_context())
+                )
+        return []
+
+
+class Tracked(Model):
+    id = columns.Integer(primary_key=True)
+    tags = columns.Set(columns.Text)
+    events = columns.List(columns.Integer)
+    attrs = columns.Map(columns.Text, columns.Integer)
+    nested = columns.List(columns.Set(columns.Integer))
+
+
+def loaded(**values):
+    values.setdefault('id', 1)
+    return Tracked._construct_instance(values)
+
+
+class TrackedSetTest(unittest.TestCase):
+
+    def test_net_changes(self):
+        s = TrackedSet([1, 2, 3])
+        s.add(4)
+        s.discard(1)
+        s.add(1)
+        s -= set([2])
+        s |= set([5])
+        s.discard(5)
+        self.assertEqual(s._mutations(), (set([4]), set([2])))
+        self.assertEqual(s._original(), set([1, 2, 3]))
+        s.clear()
+        self.assertEqual(s._mutations(), (set(), set([1, 2, 3])))
+
+    def test_copy_and_pickle(self):
+        s = TrackedSet([1])
+        s.add(2)
+        for other in (copy.deepcopy(s), pickle.loads(pickle.dumps(s))):
+            self.assertIsInstance(other, TrackedSet)
+            self.assertEqual(other, set([1, 2]))
+            self.assertEqual(other._mutations(), (set([2]), set()))
+
+
+class TrackedListTest(unittest.TestCase):
+
+    def test_prepend_and_append(self):
+        l = TrackedList([2, 3])
+        l.append(4)
+        l.insert(0, 1)
+        l.insert(0, 0)
+        l += [5]
+        self.assertEqual(l._mutations(), ([0, 1], [4, 5]))
+        self.assertEqual(l._original(), [2, 3])
+
+    def test_other_changes_snapshot(self):
+        l = TrackedList([1, 2])
+        l.append(3)
+        l[0] = 9
+        l.append(4)
+        self.assertIsNone(l._mutations())
+        self.assertEqual(l._original(), [1, 2])
+        self.assertTrue(l._changed())
+
+    def test_copy_and_pickle(self):
+        l = TrackedList([1])
+        l.append(2)
+        for other in (copy.deepcopy(l), pickle.loads(pickle.dumps(l))):
+            self.assertEqual(other, [1, 2])
+            self.assertEqual(other._mutations(), ([], [2]))
+
+
+class TrackedMapTest(unittest.TestCase):
+
+    def test_net_changes(self):
+        m = TrackedMap({'a': 1, 'b': 2, 'c': 3})
+        m['a'] = 10
+        m['d'] = 4
+        del m['b']
+        m.pop('c')
+        m['c'] = 3
+        m.update(e=5)
+        m.pop('e')
+        self.assertEqual(m._mutations(), ({'a': 10, 'd': 4}, set(['b'])))
+        self.assertEqual(m._original(), {'a': 1, 'b': 2, 'c': 3})
+
+    def test_copy_and_pickle(self):
+        m = TrackedMap({'a': 1})
+        m['b'] = 2
+        for other in (copy.deepcopy(m), pickle.loads(pickle.dumps(m))):
+            self.assertEqual(other, {'a': 1, 'b': 2})
+            self.assertEqual(other._mutations(), ({'b': 2}, set()))
+
+
+class ModelTrackingTest(unittest.TestCase):
+
+    def test_hydration(self):
+        instance = loaded(tags=['a'], events=[1], attrs={'a': 1})
+        self.assertIsInstance(instance.tags, TrackedSet)
+        self.assertIsInstance(instance.events, TrackedList)
+        self.assertIsInstance(instance.attrs, TrackedMap)
+        self.assertNotIsInstance(instance.nested, TrackedList)
+        self.assertEqual(instance.get_changed_columns(), [])
+
+    def test_update_uses_recorded_changes(self):
+        conn = FakeConnection()
+        instance = loaded(
+            tags=['a', 'b'],
+            events=[1, 2],
+            attrs={'a': 1, 'b': 2},
+        )
+        instance.tags.add('c')
+        instance.tags.discard('a')
+        instance.events.append(3)
+        instance.attrs['a'] = 10
+        del instance.attrs['b']
+        self.assertEqual(
+            sorted(instance.get_changed_columns()),
+            ['attrs', 'events', 'tags'],
+        )
+        instance.save(conn)
+
+        update, update_ctx = conn.statements[0]
+        self.assertIn('"tags" = "tags" + %', update)
+        self.assertIn('"tags" = "tags" - %', update)
+        self.assertIn('"events" = "events" + %', update)
+        self.assertIn('"attrs"[%', update)
+        self.assertIn(set(['c']), update_ctx.values())
+        self.assertIn(set(['a']), update_ctx.values())
+        self.assertIn([3], update_ctx.values())
+        delete, delete_ctx = conn.statements[1]
+        self.assertTrue(delete.startswith('DELETE "attrs"[%'))
+        self.assertIn('b', delete_ctx.values())
+
+        self.assertEqual(instance.get_changed_columns(), [])
+        self.assertIsInstance(instance.tags, TrackedSet)
+
+    def test_validation_keeps_tracking(self):
+        instance = loaded(tags=['a'])
+        instance.tags.add('b')
+        instance.validate()
+        self.assertEqual(
+            instance._values['tags'].mutations,
+            (set(['b']), set()),
+        )
+
+    def test_reassignment_falls_back_to_diff(self):
+        conn = FakeConnection()
+        instance = loaded(events=[1, 2, 3])
+        instance.events = [0, 1, 2, 3]
+        self.assertIsNone(instance._values['events'].mutations)
+        self.assertEqual(instance._values['events'].previous_value, [1, 2, 3])
+        instance.save(conn)
+        update, update_ctx = conn.statements[0]
+        self.assertIn('"events" = %(0)s + "events"', update)
+        self.assertEqual(update_ctx['0'], [0])